@@ -0,0 +1,158 @@
+"""Admission control for password checks (login, registration and legacy WebSocket auth)."""
+
+import time
+import asyncio
+import logging
+from typing import Any, Callable, Dict, Optional, TypeVar
+from core.config import AUTH_CONFIG, EXECUTOR_CONFIG
+from core.executors import run_cpu
+from core.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+class AdmissionRejected(Exception):
+    """Raised when a credential check is refused; retry_after is in seconds."""
+    
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class TokenBucket:
+    """Allows bursts of up to `burst` attempts, refilled at `rate` per second."""
+    
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+    
+    def take(self) -> float:
+        """Spend one token. Returns 0 on success, otherwise seconds until one is available."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+class CredentialAdmissionController:
+    """
+    Decides whether a password check may run, before any bcrypt work starts.
+
+    Each attempt costs a token from its account's bucket and its client
+    IP's bucket, so one account or one script cannot monopolize hashing.
+    Admitted checks run at most max_concurrent at a time in the CPU
+    executor; once max_queued checks are already waiting, further ones are
+    rejected immediately instead of queueing, so a login spike sheds load
+    rather than building latency.
+    """
+    
+    def __init__(self, max_concurrent: int, max_queued: int,
+                 account_per_minute: float, account_burst: int,
+                 ip_per_minute: float, ip_burst: int, max_tracked_keys: int):
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.account_rate = account_per_minute / 60
+        self.account_burst = account_burst
+        self.ip_rate = ip_per_minute / 60
+        self.ip_burst = ip_burst
+        # An idle bucket is full again after burst / rate seconds, so it can be forgotten then
+        self.account_buckets: TTLCache[TokenBucket] = TTLCache(max_tracked_keys, account_burst / self.account_rate)
+        self.ip_buckets: TTLCache[TokenBucket] = TTLCache(max_tracked_keys, ip_burst / self.ip_rate)
+        self.semaphore: Optional[asyncio.Semaphore] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.waiting = 0
+        self.running = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.stats = {
+            "admitted": 0,
+            "rejected_account_rate": 0,
+            "rejected_ip_rate": 0,
+            "rejected_queue_full": 0,
+        }
+    
+    def _semaphore(self) -> asyncio.Semaphore:
+        """Get the concurrency semaphore, bound to the running loop."""
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            self.loop = loop
+            self.semaphore = asyncio.Semaphore(self.max_concurrent)
+        return self.semaphore
+    
+    @staticmethod
+    def _take(buckets: TTLCache[TokenBucket], key: str, rate: float, burst: int) -> float:
+        """Spend a token from the bucket for a key, creating it if needed."""
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(rate, burst)
+        retry_after = bucket.take()
+        # Re-storing extends the bucket's lifetime from its latest use
+        buckets.set(key, bucket)
+        return retry_after
+    
+    def check_rate(self, account: Optional[str], ip: Optional[str]) -> None:
+        """Charge an attempt to its account and IP. Raises AdmissionRejected if either is over its rate."""
+        if ip:
+            retry_after = self._take(self.ip_buckets, ip, self.ip_rate, self.ip_burst)
+            if retry_after:
+                self.stats["rejected_ip_rate"] += 1
+                raise AdmissionRejected("Too many attempts from this address, please try again later", retry_after)
+        if account:
+            retry_after = self._take(self.account_buckets, account.lower(), self.account_rate, self.account_burst)
+            if retry_after:
+                self.stats["rejected_account_rate"] += 1
+                logger.warning(f"Throttling login attempts for {account}")
+                raise AdmissionRejected("Too many attempts for this account, please try again later", retry_after)
+    
+    async def run(self, func: Callable[..., T], *args: Any) -> T:
+        """Run a password hash or check in the CPU executor, or raise AdmissionRejected if the queue is full."""
+        semaphore = self._semaphore()
+        if semaphore.locked() and self.waiting >= self.max_queued:
+            self.stats["rejected_queue_full"] += 1
+            raise AdmissionRejected("Server is busy, please try again shortly", 1.0)
+        
+        started = time.monotonic()
+        self.waiting += 1
+        try:
+            await semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        
+        waited = time.monotonic() - started
+        self.wait_total += waited
+        self.wait_max = max(self.wait_max, waited)
+        self.stats["admitted"] += 1
+        self.running += 1
+        try:
+            return await run_cpu(func, *args)
+        finally:
+            self.running -= 1
+            semaphore.release()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get queue depth, wait times and rejection counters."""
+        admitted = self.stats["admitted"]
+        return {
+            **self.stats,
+            "queue_depth": self.waiting,
+            "running": self.running,
+            "avg_wait_ms": round(self.wait_total / admitted * 1000, 1) if admitted else 0.0,
+            "max_wait_ms": round(self.wait_max * 1000, 1),
+            "tracked_accounts": len(self.account_buckets),
+            "tracked_ips": len(self.ip_buckets)
+        }
+
+# Global credential admission controller instance
+credential_admission = CredentialAdmissionController(
+    EXECUTOR_CONFIG["cpu_workers"],
+    AUTH_CONFIG["max_queued_password_checks"],
+    AUTH_CONFIG["account_attempts_per_minute"],
+    AUTH_CONFIG["account_attempt_burst"],
+    AUTH_CONFIG["ip_attempts_per_minute"],
+    AUTH_CONFIG["ip_attempt_burst"],
+    AUTH_CONFIG["rate_limit_tracked_keys"]
+)
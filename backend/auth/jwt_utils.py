@@ -1,6 +1,7 @@
 """JWT utility functions and dependencies for FastAPI authentication."""
 
 import os
+import hashlib
 from datetime import datetime, timedelta, timezone
 from typing import Optional, Dict, Any
 
@@ -8,10 +9,23 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from jose import JWTError, jwt
 
+from auth.local_auth import LocalAuthService
+from core.ttl_cache import TTLCache
+
 # Configuration
 JWT_SECRET_KEY = os.environ.get("JWT_SECRET_KEY", "dev-insecure-secret-change-me")
 JWT_ALGORITHM = os.environ.get("JWT_ALGORITHM", "HS256")
 JWT_EXPIRE_MINUTES = int(os.environ.get("JWT_EXPIRE_MINUTES", "60"))
+JWT_CACHE_SIZE = int(os.environ.get("JWT_CACHE_SIZE", "4096"))
+USER_PRINCIPAL_CACHE_SIZE = int(os.environ.get("USER_PRINCIPAL_CACHE_SIZE", "4096"))
+USER_PRINCIPAL_TTL_SECONDS = float(os.environ.get("USER_PRINCIPAL_TTL_SECONDS", "30"))
+
+# Claims of tokens whose signature has already been verified, keyed by token digest.
+# Entries expire with the token itself, so an expired token is always re-verified (and rejected).
+verified_tokens: TTLCache[Dict[str, Any]] = TTLCache(JWT_CACHE_SIZE)
+
+# User profiles by email, so authorization checks do not query the users table every time
+user_principals: TTLCache[Dict[str, Any]] = TTLCache(USER_PRINCIPAL_CACHE_SIZE, USER_PRINCIPAL_TTL_SECONDS)
 
 
 def create_access_token(subject: str, additional_claims: Optional[Dict[str, Any]] = None,
@@ -27,11 +41,23 @@ def create_access_token(subject: str, additional_claims: Optional[Dict[str, Any]
     return encoded_jwt
 
 
+def _token_digest(token: str) -> bytes:
+    """Cache key for a token (the token itself is never kept in memory)."""
+    return hashlib.sha256(token.encode("utf-8")).digest()
+
+
 def decode_access_token(token: str) -> Dict[str, Any]:
     """Decode and validate a JWT, returning its claims if valid."""
+    digest = _token_digest(token)
+    claims = verified_tokens.get(digest)
+    if claims is not None:
+        return dict(claims)
+
     try:
         payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
-        return payload
+        if "exp" in payload:
+            verified_tokens.set(digest, payload, expires_at=float(payload["exp"]))
+        return dict(payload)
     except JWTError as exc:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -40,6 +66,29 @@ def decode_access_token(token: str) -> Dict[str, Any]:
         ) from exc
 
 
+def get_user_principal(email: str) -> Optional[Dict[str, Any]]:
+    """Get a user's profile, served from a short-lived cache. Blocking on a miss."""
+    principal = user_principals.get(email)
+    if principal is None:
+        principal = LocalAuthService.get_user_by_email(email)
+        if principal is not None:
+            user_principals.set(email, principal)
+    return principal
+
+
+def invalidate_user_principal(email: str) -> None:
+    """Drop a cached user profile, e.g. after the user record changes."""
+    user_principals.pop(email)
+
+
+def get_auth_cache_stats() -> Dict[str, Any]:
+    """Get hit/miss statistics for the token and principal caches."""
+    return {
+        "verified_tokens": verified_tokens.get_stats(),
+        "user_principals": user_principals.get_stats(),
+    }
+
+
 # FastAPI dependency using HTTP Bearer auth
 bearer_scheme = HTTPBearer(auto_error=True)
 
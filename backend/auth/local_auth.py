@@ -3,7 +3,10 @@
 import bcrypt
 import logging
 from typing import Optional, Dict, Any
-from database.operations import get_database_connection
+from database.operations import db_connection
+from core.executors import run_db
+from auth.login_activity import login_activity
+from auth.admission import credential_admission, AdmissionRejected
 
 logger = logging.getLogger(__name__)
 
@@ -23,13 +26,20 @@ class LocalAuthService:
         return bcrypt.checkpw(password.encode('utf-8'), hashed_password.encode('utf-8'))
     
     @staticmethod
-    def create_user(email: str, password: str) -> bool:
-        """
-        Create a new user account.
-        Returns True if successful, False if email already exists.
-        """
+    async def hash_password_async(password: str) -> str:
+        """Hash a password in the CPU executor, subject to admission control."""
+        return await credential_admission.run(LocalAuthService.hash_password, password)
+    
+    @staticmethod
+    async def verify_password_async(password: str, hashed_password: str) -> bool:
+        """Verify a password in the CPU executor, subject to admission control."""
+        return await credential_admission.run(LocalAuthService.verify_password, password, hashed_password)
+    
+    @staticmethod
+    def _insert_user(email: str, hashed_password: str) -> bool:
+        """Insert a user row. Returns False if the email already exists."""
         try:
-            with get_database_connection() as conn:
+            with db_connection() as conn:
                 cursor = conn.cursor()
                 
                 # Check if email already exists
@@ -38,8 +48,6 @@ class LocalAuthService:
                     logger.warning(f"Attempt to create user with existing email: {email}")
                     return False
                 
-                # Hash the password and create user
-                hashed_password = LocalAuthService.hash_password(password)
                 cursor.execute("""
                     INSERT INTO users (email, password_hash, created_at)
                     VALUES (?, ?, CURRENT_TIMESTAMP)
@@ -54,16 +62,11 @@ class LocalAuthService:
             return False
     
     @staticmethod
-    def authenticate_user(email: str, password: str) -> Optional[Dict[str, Any]]:
-        """
-        Authenticate user with email and password.
-        Returns user profile if successful, None if failed.
-        """
+    def _get_user_credentials(email: str) -> Optional[Dict[str, Any]]:
+        """Get a user row including the password hash, or None if not found."""
         try:
-            with get_database_connection() as conn:
+            with db_connection() as conn:
                 cursor = conn.cursor()
-                
-                # Get user by email
                 cursor.execute("""
                     SELECT id, email, password_hash, created_at, last_login
                     FROM users 
@@ -71,43 +74,118 @@ class LocalAuthService:
                 """, (email,))
                 
                 user = cursor.fetchone()
-                if not user:
-                    logger.warning(f"Authentication failed - user not found: {email}")
-                    return None
+                return dict(user) if user else None
                 
-                # Verify password
-                if not LocalAuthService.verify_password(password, user["password_hash"]):
-                    logger.warning(f"Authentication failed - invalid password: {email}")
-                    return None
-                
-                # Update last login timestamp
-                cursor.execute("""
-                    UPDATE users 
-                    SET last_login = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
-                    WHERE id = ?
-                """, (user["id"],))
-                conn.commit()
-                
-                # Return user profile (without password hash)
-                profile = {
-                    "id": user["id"],
-                    "email": user["email"],
-                    "created_at": user["created_at"],
-                    "last_login": user["last_login"]
-                }
-                
-                logger.info(f"Successfully authenticated user: {email}")
-                return profile
+        except Exception as e:
+            logger.error(f"Error loading credentials for {email}: {e}")
+            return None
+    
+    @staticmethod
+    def _record_login(user_id: int) -> None:
+        """
+        Record the last login timestamp for a user. It is written in the next
+        batch, or immediately (blocking) when no background flusher is running.
+        """
+        try:
+            login_activity.record(user_id)
+            if not login_activity.running:
+                login_activity.flush()
+        except Exception as e:
+            logger.error(f"Error recording login for user {user_id}: {e}")
+    
+    @staticmethod
+    def _build_profile(user: Dict[str, Any]) -> Dict[str, Any]:
+        """Build a user profile (without password hash)."""
+        return {
+            "id": user["id"],
+            "email": user["email"],
+            "created_at": user["created_at"],
+            "last_login": user["last_login"]
+        }
+    
+    @staticmethod
+    def create_user(email: str, password: str) -> bool:
+        """
+        Create a new user account.
+        Returns True if successful, False if email already exists.
+        """
+        try:
+            hashed_password = LocalAuthService.hash_password(password)
+        except Exception as e:
+            logger.error(f"Error hashing password for {email}: {e}")
+            return False
+        return LocalAuthService._insert_user(email, hashed_password)
+    
+    @staticmethod
+    async def create_user_async(email: str, password: str) -> bool:
+        """Create a new user account without blocking the event loop."""
+        try:
+            hashed_password = await LocalAuthService.hash_password_async(password)
+        except AdmissionRejected:
+            raise
+        except Exception as e:
+            logger.error(f"Error hashing password for {email}: {e}")
+            return False
+        return await run_db(LocalAuthService._insert_user, email, hashed_password)
+    
+    @staticmethod
+    def authenticate_user(email: str, password: str) -> Optional[Dict[str, Any]]:
+        """
+        Authenticate user with email and password.
+        Returns user profile if successful, None if failed.
+        """
+        try:
+            user = LocalAuthService._get_user_credentials(email)
+            if not user:
+                logger.warning(f"Authentication failed - user not found: {email}")
+                return None
+            
+            if not LocalAuthService.verify_password(password, user["password_hash"]):
+                logger.warning(f"Authentication failed - invalid password: {email}")
+                return None
+            
+            LocalAuthService._record_login(user["id"])
+            logger.info(f"Successfully authenticated user: {email}")
+            return LocalAuthService._build_profile(user)
                 
         except Exception as e:
             logger.error(f"Error authenticating user {email}: {e}")
             return None
     
+    @staticmethod
+    async def authenticate_user_async(email: str, password: str) -> Optional[Dict[str, Any]]:
+        """
+        Authenticate user without blocking the event loop.
+        Database access runs in the DB executor and bcrypt in the CPU executor.
+        """
+        try:
+            user = await run_db(LocalAuthService._get_user_credentials, email)
+            if not user:
+                logger.warning(f"Authentication failed - user not found: {email}")
+                return None
+            
+            if not await LocalAuthService.verify_password_async(password, user["password_hash"]):
+                logger.warning(f"Authentication failed - invalid password: {email}")
+                return None
+            
+            if login_activity.running:
+                LocalAuthService._record_login(user["id"])
+            else:
+                await run_db(LocalAuthService._record_login, user["id"])
+            logger.info(f"Successfully authenticated user: {email}")
+            return LocalAuthService._build_profile(user)
+                
+        except AdmissionRejected:
+            raise
+        except Exception as e:
+            logger.error(f"Error authenticating user {email}: {e}")
+            return None
+    
     @staticmethod
     def get_user_by_email(email: str) -> Optional[Dict[str, Any]]:
         """Get user profile by email (without password hash)."""
         try:
-            with get_database_connection() as conn:
+            with db_connection() as conn:
                 cursor = conn.cursor()
                 
                 cursor.execute("""
@@ -122,7 +200,7 @@ class LocalAuthService:
                         "id": user["id"],
                         "email": user["email"],
                         "created_at": user["created_at"],
-                        "last_login": user["last_login"],
+                        "last_login": login_activity.pending(user["id"]) or user["last_login"],
                         "updated_at": user["updated_at"]
                     }
                 return None
@@ -135,7 +213,7 @@ class LocalAuthService:
     def get_user_by_id(user_id: int) -> Optional[Dict[str, Any]]:
         """Get user profile by ID (without password hash)."""
         try:
-            with get_database_connection() as conn:
+            with db_connection() as conn:
                 cursor = conn.cursor()
                 
                 cursor.execute("""
@@ -150,7 +228,7 @@ class LocalAuthService:
                         "id": user["id"],
                         "email": user["email"],
                         "created_at": user["created_at"],
-                        "last_login": user["last_login"],
+                        "last_login": login_activity.pending(user["id"]) or user["last_login"],
                         "updated_at": user["updated_at"]
                     }
                 return None
@@ -159,12 +237,13 @@ class LocalAuthService:
             logger.error(f"Error getting user by ID {user_id}: {e}")
             return None
 
-async def validate_user_credentials(email: str, password: str) -> Optional[str]:
+async def validate_user_credentials(email: str, password: str, ip: Optional[str] = None) -> Optional[str]:
     """
     Validate user credentials and return user email if successful.
-    Returns None if authentication fails.
+    Returns None if authentication fails; raises AdmissionRejected if throttled.
     """
-    profile = LocalAuthService.authenticate_user(email, password)
+    credential_admission.check_rate(email, ip)
+    profile = await LocalAuthService.authenticate_user_async(email, password)
     if profile:
         return profile.get("email")
     return None
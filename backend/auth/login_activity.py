@@ -0,0 +1,107 @@
+"""Write-behind buffer for user last_login timestamps."""
+
+import asyncio
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Optional
+from core.config import AUTH_CONFIG
+from core.executors import run_db
+from database.operations import record_user_logins
+
+logger = logging.getLogger(__name__)
+
+class LoginActivityRecorder:
+    """
+    Collects login timestamps in memory and writes them in batches.
+
+    Logins only record the time in a dict, so the login path never takes
+    the SQLite write lock. A background task flushes everything collected
+    with a single executemany every few seconds, and once more on
+    shutdown; repeated logins by one user between flushes become one row
+    update. Until a flush has run, pending() lets readers see the latest
+    timestamp anyway.
+    """
+    
+    def __init__(self, flush_interval: float):
+        self.flush_interval = flush_interval
+        self.pending_logins: Dict[int, str] = {}
+        self.lock = threading.Lock()
+        self.task: Optional[asyncio.Task] = None
+        self.stats = {
+            "recorded": 0,
+            "flushes": 0,
+            "rows_written": 0,
+            "failed_flushes": 0,
+        }
+    
+    @property
+    def running(self) -> bool:
+        """Whether the background flush task is active."""
+        return self.task is not None and not self.task.done()
+    
+    def record(self, user_id: int) -> None:
+        """Note that a user just logged in."""
+        logged_in_at = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        with self.lock:
+            self.pending_logins[user_id] = logged_in_at
+            self.stats["recorded"] += 1
+    
+    def pending(self, user_id: int) -> Optional[str]:
+        """Get a login timestamp that has not been written yet."""
+        with self.lock:
+            return self.pending_logins.get(user_id)
+    
+    def flush(self) -> int:
+        """Write every pending timestamp. Blocking; returns the number of rows written."""
+        with self.lock:
+            logins, self.pending_logins = self.pending_logins, {}
+        if not logins:
+            return 0
+        
+        if not record_user_logins(logins):
+            # Put them back unless a newer login arrived in the meantime
+            with self.lock:
+                for user_id, logged_in_at in logins.items():
+                    self.pending_logins.setdefault(user_id, logged_in_at)
+                self.stats["failed_flushes"] += 1
+            return 0
+        
+        with self.lock:
+            self.stats["flushes"] += 1
+            self.stats["rows_written"] += len(logins)
+        return len(logins)
+    
+    async def _flush_loop(self) -> None:
+        """Flush pending logins at the configured interval."""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await run_db(self.flush)
+            except Exception as e:
+                logger.error(f"Error flushing login activity: {e}")
+    
+    def start(self) -> None:
+        """Start the background flush task."""
+        if self.running:
+            return
+        self.task = asyncio.create_task(self._flush_loop(), name="login-activity-flush")
+        logger.info(f"Login activity recorder started (flush every {self.flush_interval}s)")
+    
+    async def stop(self) -> None:
+        """Stop the flush task and write whatever is still pending."""
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        written = await run_db(self.flush)
+        if written:
+            logger.info(f"Flushed {written} pending logins on shutdown")
+    
+    def get_stats(self) -> Dict[str, int]:
+        """Get flush counters and the number of pending timestamps."""
+        with self.lock:
+            return {**self.stats, "pending": len(self.pending_logins)}
+
+# Global login activity recorder instance
+login_activity = LoginActivityRecorder(AUTH_CONFIG["last_login_flush_seconds"])
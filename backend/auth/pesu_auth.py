@@ -1,20 +1,37 @@
 """PESU authentication service using external API."""
 
+import asyncio
+import hashlib
 import httpx
 import logging
 from typing import Optional, Dict, Any
-from datetime import datetime, timedelta
+from core.ttl_cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
-# In-memory cache for login details
-login_cache: Dict[str, Dict[str, Any]] = {}
 CACHE_DURATION_MINUTES = 30
+CACHE_MAX_ENTRIES = 1024
+CACHE_SWEEP_INTERVAL_SECONDS = 60
+
+# Successful logins by credential digest; least recently used entries go first when full
+login_cache: TTLCache[Dict[str, Any]] = TTLCache(CACHE_MAX_ENTRIES, CACHE_DURATION_MINUTES * 60)
 
 class PESUAuthService:
-    """Service for authenticating PESU users."""
+    """
+    Service for authenticating PESU users.
+
+    Upstream requests share one keep-alive client, and concurrent logins
+    with the same credentials wait on a single upstream request. Expired
+    cache entries are swept in the background.
+    """
     
     PESU_AUTH_URL = "http://localhost:5000/authenticate"
+    REQUEST_TIMEOUT_SECONDS = 10.0
+    MAX_CONNECTIONS = 20
+    
+    _client: Optional[httpx.AsyncClient] = None
+    _sweeper: Optional[asyncio.Task] = None
+    _in_flight: Dict[str, asyncio.Task] = {}
     
     @staticmethod
     async def authenticate_user(username: str, password: str) -> Optional[Dict[str, Any]]:
@@ -22,39 +39,54 @@ class PESUAuthService:
         Authenticate user with PESU API.
         Returns user profile if successful, None if failed.
         """
+        cache_key = PESUAuthService._get_cache_key(username, password)
+        
+        # Check cache first
+        cached_data = login_cache.get(cache_key)
+        if cached_data:
+            logger.info(f"Using cached authentication for user: {username}")
+            return cached_data
+        
+        # Join an identical login that is already in progress
+        task = PESUAuthService._in_flight.get(cache_key)
+        if task is None:
+            task = asyncio.create_task(PESUAuthService._authenticate_upstream(username, password, cache_key))
+            PESUAuthService._in_flight[cache_key] = task
+            task.add_done_callback(lambda _: PESUAuthService._in_flight.pop(cache_key, None))
+        else:
+            logger.info(f"Waiting for in-flight authentication for user: {username}")
+        
+        # Shielded so one caller giving up does not cancel the request for the others
+        return await asyncio.shield(task)
+    
+    @staticmethod
+    async def _authenticate_upstream(username: str, password: str, cache_key: str) -> Optional[Dict[str, Any]]:
+        """Make the API request and cache a successful result."""
         try:
-            # Check cache first
-            cached_data = PESUAuthService._get_from_cache(username, password)
-            if cached_data:
-                logger.info(f"Using cached authentication for user: {username}")
-                return cached_data
+            client = PESUAuthService._get_client()
+            response = await client.post(
+                PESUAuthService.PESU_AUTH_URL,
+                json={
+                    "username": username,
+                    "password": password,
+                    "profile": True
+                }
+            )
             
-            # Make API request
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    PESUAuthService.PESU_AUTH_URL,
-                    json={
-                        "username": username,
-                        "password": password,
-                        "profile": True
-                    },
-                    timeout=10.0
-                )
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    if data.get("status") and "profile" in data:
-                        # Cache the successful authentication
-                        PESUAuthService._store_in_cache(username, password, data["profile"])
-                        logger.info(f"Successfully authenticated user: {username}")
-                        return data["profile"]
-                    else:
-                        logger.warning(f"Authentication failed for user: {username}")
-                        return None
+            if response.status_code == 200:
+                data = response.json()
+                if data.get("status") and "profile" in data:
+                    # Cache the successful authentication
+                    login_cache.set(cache_key, data["profile"])
+                    logger.info(f"Successfully authenticated user: {username}")
+                    return data["profile"]
                 else:
-                    logger.error(f"PESU API returned status {response.status_code} for user: {username}")
+                    logger.warning(f"Authentication failed for user: {username}")
                     return None
-                    
+            else:
+                logger.error(f"PESU API returned status {response.status_code} for user: {username}")
+                return None
+        
         except httpx.TimeoutException:
             logger.error(f"Timeout while authenticating user: {username}")
             return None
@@ -63,57 +95,50 @@ class PESUAuthService:
             return None
     
     @staticmethod
-    def _get_cache_key(username: str, password: str) -> str:
-        """Generate cache key for user credentials."""
-        import hashlib
-        key_data = f"{username}:{password}"
-        return hashlib.sha256(key_data.encode()).hexdigest()
+    def _get_client() -> httpx.AsyncClient:
+        """Get the shared HTTP client, creating it (and the cache sweeper) on first use."""
+        if PESUAuthService._client is None or PESUAuthService._client.is_closed:
+            PESUAuthService._client = httpx.AsyncClient(
+                timeout=PESUAuthService.REQUEST_TIMEOUT_SECONDS,
+                limits=httpx.Limits(
+                    max_connections=PESUAuthService.MAX_CONNECTIONS,
+                    max_keepalive_connections=PESUAuthService.MAX_CONNECTIONS
+                )
+            )
+        if PESUAuthService._sweeper is None or PESUAuthService._sweeper.done():
+            PESUAuthService._sweeper = asyncio.create_task(PESUAuthService._sweep_cache())
+        return PESUAuthService._client
     
     @staticmethod
-    def _get_from_cache(username: str, password: str) -> Optional[Dict[str, Any]]:
-        """Get user data from cache if valid."""
-        cache_key = PESUAuthService._get_cache_key(username, password)
-        
-        if cache_key in login_cache:
-            cached_data = login_cache[cache_key]
-            cache_time = cached_data["cached_at"]
-            
-            # Check if cache is still valid
-            if datetime.now() - cache_time < timedelta(minutes=CACHE_DURATION_MINUTES):
-                return cached_data["profile"]
-            else:
-                # Remove expired cache entry
-                del login_cache[cache_key]
-        
-        return None
+    async def _sweep_cache() -> None:
+        """Periodically remove expired entries from cache."""
+        while True:
+            await asyncio.sleep(CACHE_SWEEP_INTERVAL_SECONDS)
+            removed = login_cache.sweep()
+            if removed:
+                logger.info(f"Cleaned up {removed} expired cache entries")
     
     @staticmethod
-    def _store_in_cache(username: str, password: str, profile: Dict[str, Any]) -> None:
-        """Store user profile in cache."""
-        cache_key = PESUAuthService._get_cache_key(username, password)
-        login_cache[cache_key] = {
-            "profile": profile,
-            "cached_at": datetime.now()
-        }
-        
-        # Clean up old cache entries (simple cleanup)
-        PESUAuthService._cleanup_cache()
+    async def shutdown() -> None:
+        """Stop the cache sweeper and close the shared HTTP client."""
+        if PESUAuthService._sweeper is not None:
+            PESUAuthService._sweeper.cancel()
+            await asyncio.gather(PESUAuthService._sweeper, return_exceptions=True)
+            PESUAuthService._sweeper = None
+        if PESUAuthService._client is not None:
+            await PESUAuthService._client.aclose()
+            PESUAuthService._client = None
     
     @staticmethod
-    def _cleanup_cache() -> None:
-        """Remove expired entries from cache."""
-        current_time = datetime.now()
-        expired_keys = []
-        
-        for key, data in login_cache.items():
-            if current_time - data["cached_at"] >= timedelta(minutes=CACHE_DURATION_MINUTES):
-                expired_keys.append(key)
-        
-        for key in expired_keys:
-            del login_cache[key]
-        
-        if expired_keys:
-            logger.info(f"Cleaned up {len(expired_keys)} expired cache entries")
+    def _get_cache_key(username: str, password: str) -> str:
+        """Generate cache key for user credentials."""
+        key_data = f"{username}:{password}"
+        return hashlib.sha256(key_data.encode()).hexdigest()
+    
+    @staticmethod
+    def get_stats() -> Dict[str, Any]:
+        """Get cache statistics and the number of upstream requests in flight."""
+        return {**login_cache.get_stats(), "in_flight": len(PESUAuthService._in_flight)}
 
 async def validate_user_credentials(username: str, password: str) -> Optional[str]:
     """
@@ -24,6 +24,71 @@ SLOT_CONFIG: Dict[str, Any] = {
     "start_hour": 0,  # 12:00 AM (midnight)
     "end_hour": 24,   # 12:00 AM next day (exclusive)
     "slot_duration_hours": 1,
+    "change_log_size": 256,  # Slot deltas kept for client resync
+}
+
+# Database configuration
+DATABASE_CONFIG: Dict[str, Any] = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size_kib": 8192,   # Page cache per connection
+    "busy_timeout_ms": 5000,  # Wait for the writer lock instead of failing
+}
+
+# Executor configuration for blocking work kept off the event loop
+EXECUTOR_CONFIG: Dict[str, Any] = {
+    "db_workers": 4,    # SQLite access (one pooled connection per worker)
+    "cpu_workers": 2,   # bcrypt hashing and verification
+}
+
+# Serial device configuration
+SERIAL_CONFIG: Dict[str, Any] = {
+    "output_buffer_bytes": 64 * 1024,  # Ring buffer capacity per device
+    "max_pending_bytes": 256 * 1024,   # Output awaiting the event loop before old chunks are dropped
+    "scan_interval_seconds": 1.0,          # How often to check /dev for hot-plug changes
+    "full_rescan_interval_seconds": 30.0,  # Enumerate ports at least this often regardless
+}
+
+# arduino-cli toolchain configuration
+TOOLCHAIN_CONFIG: Dict[str, Any] = {
+    "max_concurrent_compiles": 2,    # Compiles are CPU heavy; extra requests wait their turn
+    "max_concurrent_uploads": 4,     # Uploads are mostly waiting on the serial bootloader
+    "compile_timeout_seconds": 30,
+    "upload_timeout_seconds": 60,
+    "max_concurrent_queries": 2,      # Short metadata calls (core/library listings)
+    "fingerprint_ttl_seconds": 300,   # How long installed core/library versions are trusted
+}
+
+# Authentication configuration
+AUTH_CONFIG: Dict[str, Any] = {
+    "last_login_flush_seconds": 5,  # Login timestamps are written in one batch at this interval
+    "max_queued_password_checks": 16,   # bcrypt checks waiting beyond this are rejected with 429
+    "account_attempts_per_minute": 5,   # Sustained login attempts allowed per account...
+    "account_attempt_burst": 5,         # ...and how many may arrive at once
+    "ip_attempts_per_minute": 30,       # Same for each client address (login and register)
+    "ip_attempt_burst": 20,
+    "rate_limit_tracked_keys": 10000,   # Accounts/addresses with live buckets before LRU eviction
+}
+
+# Background compile/upload job queue configuration
+JOB_CONFIG: Dict[str, Any] = {
+    "workers": 2,                  # Jobs run at once (each still bounded by the toolchain limits)
+    "max_queued_per_user": 5,
+    "max_log_bytes": 64 * 1024,    # Toolchain output kept per job
+    "subscriber_queue_size": 256,  # Events buffered per log stream before it is told to resync
+}
+
+# Compiled artifact cache configuration
+BUILD_CACHE_CONFIG: Dict[str, Any] = {
+    "directory": "./data/build_cache",
+    "max_bytes": 512 * 1024 * 1024,  # Least recently used builds are evicted past this
+    "toolchain_cache_max_bytes": 2 * 1024 ** 3,  # Shared arduino-cli core and build directories
+}
+
+# WebSocket fan-out configuration
+WEBSOCKET_CONFIG: Dict[str, Any] = {
+    "send_queue_size": 64,               # Outbound frames buffered per client
+    "slow_consumer_policy": "coalesce",  # "drop_oldest", "coalesce" or "disconnect"
 }
 
 # Server configuration
@@ -0,0 +1,40 @@
+"""Bounded executors for running blocking work off the asyncio event loop."""
+
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
+from core.config import EXECUTOR_CONFIG
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# SQLite calls run here; each worker thread keeps its own pooled connection
+db_executor = ThreadPoolExecutor(
+    max_workers=EXECUTOR_CONFIG["db_workers"],
+    thread_name_prefix="db"
+)
+
+# bcrypt releases the GIL, so a small thread pool gives real parallelism
+cpu_executor = ThreadPoolExecutor(
+    max_workers=EXECUTOR_CONFIG["cpu_workers"],
+    thread_name_prefix="cpu"
+)
+
+async def run_db(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run a blocking database call in the database executor."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(db_executor, functools.partial(func, *args, **kwargs))
+
+async def run_cpu(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run a CPU-bound call (e.g. password hashing) in the CPU executor."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(cpu_executor, functools.partial(func, *args, **kwargs))
+
+def shutdown_executors() -> None:
+    """Shut down the executors, waiting for running work to finish."""
+    db_executor.shutdown(wait=True)
+    cpu_executor.shutdown(wait=True)
+    logger.info("Executors shut down")
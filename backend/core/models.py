@@ -1,9 +1,25 @@
 """Data models and type definitions for the Slot Booking API."""
 
+from enum import Enum
 from typing import Dict, Any, List
 from datetime import datetime
 from pydantic import BaseModel
 
+class SlotOutcome(str, Enum):
+    """Result of a booking or cancellation attempt."""
+    BOOKED = "booked"
+    CANCELLED = "cancelled"
+    ALREADY_TAKEN = "already_taken"
+    NOT_BOOKED = "not_booked"
+    NOT_OWNER = "not_owner"
+    NOT_FOUND = "not_found"
+    ERROR = "error"
+
+    @property
+    def success(self) -> bool:
+        """Whether the attempt changed the slot."""
+        return self in (SlotOutcome.BOOKED, SlotOutcome.CANCELLED)
+
 class LoginRequest(BaseModel):
     """Model for login request."""
     email: str
@@ -50,10 +66,12 @@ def create_slot_model(slot_id: int, start_time: str, end_time: str, is_booked: b
         "booked_by": booked_by
     }
 
-def create_slots_message(slots: List[Dict], available_slots: List[int], booked_slots: List[int]) -> Dict[str, Any]:
-    """Create a slots update message model."""
+def create_slots_snapshot_message(slots: List[Dict], available_slots: List[int], booked_slots: List[int],
+                                  version: int) -> Dict[str, Any]:
+    """Create a full slots snapshot message model."""
     return {
-        "type": "slots_update",
+        "type": "slots_snapshot",
+        "version": version,
         "data": {
             "slots": slots,
             "available_slots": available_slots,
@@ -62,22 +80,68 @@ def create_slots_message(slots: List[Dict], available_slots: List[int], booked_s
         "timestamp": datetime.now().isoformat()
     }
 
-def create_booking_response(success: bool, message: str, slot_id: int) -> Dict[str, Any]:
+def create_slot_changed_message(slot: Dict, version: int) -> Dict[str, Any]:
+    """Create a single slot change (delta) message model."""
+    return {
+        "type": "slot_changed",
+        "version": version,
+        "slot": {
+            "id": slot["id"],
+            "is_booked": slot["is_booked"],
+            "booked_by": slot["booked_by"],
+            "booked_at": slot["booked_at"]
+        },
+        "timestamp": datetime.now().isoformat()
+    }
+
+def create_booking_response(success: bool, message: str, slot_id: int, outcome: str | None = None) -> Dict[str, Any]:
     """Create a booking response message model."""
     return {
         "type": "booking_response",
         "success": success,
         "message": message,
-        "slot_id": slot_id
+        "slot_id": slot_id,
+        "outcome": outcome
     }
 
-def create_cancellation_response(success: bool, message: str, slot_id: int) -> Dict[str, Any]:
+def create_cancellation_response(success: bool, message: str, slot_id: int, outcome: str | None = None) -> Dict[str, Any]:
     """Create a cancellation response message model."""
     return {
         "type": "cancellation_response",
         "success": success,
         "message": message,
-        "slot_id": slot_id
+        "slot_id": slot_id,
+        "outcome": outcome
+    }
+
+def describe_slot_outcome(outcome: SlotOutcome, slot_id: int) -> str:
+    """Create a user-facing message for a booking or cancellation outcome."""
+    messages = {
+        SlotOutcome.BOOKED: f"Slot {slot_id} booked successfully",
+        SlotOutcome.CANCELLED: f"Slot {slot_id} booking cancelled successfully",
+        SlotOutcome.ALREADY_TAKEN: f"Slot {slot_id} is already booked",
+        SlotOutcome.NOT_BOOKED: f"Slot {slot_id} is not booked",
+        SlotOutcome.NOT_OWNER: f"Slot {slot_id} was not booked by you",
+        SlotOutcome.NOT_FOUND: f"Slot {slot_id} does not exist",
+        SlotOutcome.ERROR: f"Could not update slot {slot_id}, please try again",
+    }
+    return messages[outcome]
+
+def create_session_message(email: str, my_slots: List[int]) -> Dict[str, Any]:
+    """Create the reply to a successful WebSocket session handshake."""
+    return {
+        "type": "session",
+        "authenticated": True,
+        "email": email,
+        "my_slots": my_slots
+    }
+
+def create_my_slots_message(my_slots: List[int]) -> Dict[str, Any]:
+    """Create a message telling a user which slots they now hold."""
+    return {
+        "type": "my_slots",
+        "my_slots": my_slots,
+        "timestamp": datetime.now().isoformat()
     }
 
 def create_error_response(message: str) -> Dict[str, Any]:
@@ -0,0 +1,56 @@
+"""Guard that keeps the backend to a single server process."""
+
+import os
+import fcntl
+import logging
+from typing import Optional, TextIO
+from database.operations import DATABASE_DIR
+
+logger = logging.getLogger(__name__)
+
+class ProcessLock:
+    """
+    Exclusive lock file held for the lifetime of the server process.
+
+    Slot state, WebSocket sessions, device leases, the job queue and the
+    serial readers all live in process memory, so they are only correct
+    while one process serves the data directory. A second worker started
+    against the same directory fails at startup instead of serving stale
+    slot reads or flashing a board another worker is using.
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        self.handle: Optional[TextIO] = None
+    
+    def acquire(self) -> None:
+        """Take the lock, or raise RuntimeError if another server process holds it."""
+        if self.handle is not None:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        handle = open(self.path, "a+")
+        try:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            handle.close()
+            raise RuntimeError(
+                f"Another backend process already holds {self.path}; "
+                "the backend keeps its state in memory and must run as a single worker"
+            )
+        handle.seek(0)
+        handle.truncate()
+        handle.write(f"{os.getpid()}\n")
+        handle.flush()
+        self.handle = handle
+        logger.info(f"Acquired server process lock {self.path}")
+    
+    def release(self) -> None:
+        """Release the lock on shutdown."""
+        if self.handle is None:
+            return
+        fcntl.flock(self.handle.fileno(), fcntl.LOCK_UN)
+        self.handle.close()
+        self.handle = None
+
+# Global server process lock instance
+process_lock = ProcessLock(os.path.join(DATABASE_DIR, "server.lock"))
@@ -1,30 +1,28 @@
 """Slot management functions for the Slot Booking API."""
 
-from typing import List, Dict
+from typing import List, Dict, Optional
 import logging
 from core.config import SLOT_CONFIG
-from database.operations import (
-    get_all_slots, 
-    book_slot_in_db, 
-    cancel_slot_in_db, 
-    is_slot_available_in_db
-)
+from core.models import SlotOutcome
+from core.slot_state import slot_state
 
 logger = logging.getLogger(__name__)
 
+def load_slot_state() -> None:
+    """Load slot state from the database into memory. Call once at startup."""
+    slot_state.load()
+
 def generate_time_slots() -> List[Dict]:
-    """Generate time slots from database."""
-    return get_all_slots()
+    """Generate time slots from the in-memory slot state."""
+    return slot_state.get_slots()
 
 def get_available_slots() -> List[int]:
-    """Get list of available slot IDs from database."""
-    slots = get_all_slots()
-    return [slot["id"] for slot in slots if not slot["is_booked"]]
+    """Get list of available slot IDs."""
+    return slot_state.get_available_ids()
 
 def get_booked_slots_list() -> List[int]:
-    """Get list of booked slot IDs from database."""
-    slots = get_all_slots()
-    return [slot["id"] for slot in slots if slot["is_booked"]]
+    """Get list of booked slot IDs."""
+    return slot_state.get_booked_ids()
 
 def is_slot_available(slot_id: int) -> bool:
     """Check if a slot is available for booking."""
@@ -33,23 +31,42 @@ def is_slot_available(slot_id: int) -> bool:
     if not valid_range:
         return False
     
-    return is_slot_available_in_db(slot_id)
+    return slot_state.is_available(slot_id)
 
-def book_slot(slot_id: int, booked_by: str) -> bool:
-    """Book a slot if available. Returns True if successful, False otherwise."""
-    if not is_slot_available(slot_id):
-        return False
-    
-    return book_slot_in_db(slot_id, booked_by)
+def is_slot_booked_by(slot_id: int, user_email: str) -> bool:
+    """Check if a slot is booked by the given user."""
+    return slot_state.is_booked_by(slot_id, user_email)
+
+def get_user_slot_ids(user_email: str) -> List[int]:
+    """Get IDs of the slots a user has booked."""
+    return slot_state.get_owned_ids(user_email)
+
+def book_slot(slot_id: int, booked_by: str) -> SlotOutcome:
+    """Book a slot if available. Returns the outcome of the attempt."""
+    return slot_state.book(slot_id, booked_by)
+
+def cancel_slot_booking(slot_id: int, user_email: str = None) -> SlotOutcome:
+    """Cancel a slot booking. Returns the outcome of the attempt."""
+    return slot_state.cancel(slot_id, user_email)
+
+def get_current_version() -> int:
+    """Get the current slot state version."""
+    return slot_state.get_version()
+
+def get_loaded_version() -> int:
+    """Get the slot state version as of the last load from the database."""
+    return slot_state.loaded_version
 
-def cancel_slot_booking(slot_id: int, user_email: str = None) -> bool:
-    """Cancel a slot booking. Returns True if successful, False otherwise."""
-    return cancel_slot_in_db(slot_id, user_email)
+def get_slot_changes_since(version: int) -> Optional[List[Dict]]:
+    """Get slot changes newer than a version, or None if a full snapshot is needed."""
+    return slot_state.get_changes_since(version)
 
 def get_slot_summary() -> Dict:
-    """Get a summary of all slots."""
-    return {
-        "slots": generate_time_slots(),
-        "available_slots": get_available_slots(),
-        "booked_slots": get_booked_slots_list()
-    }
+    """Get a summary of all slots with the state version it reflects."""
+    with slot_state.lock:
+        return {
+            "slots": generate_time_slots(),
+            "available_slots": get_available_slots(),
+            "booked_slots": get_booked_slots_list(),
+            "version": slot_state.get_version()
+        }
@@ -0,0 +1,244 @@
+"""In-memory authoritative slot state for the Slot Booking API."""
+
+import threading
+import logging
+from collections import deque
+from datetime import datetime, timezone
+from typing import Deque, List, Dict, Optional
+from core.config import SLOT_CONFIG
+from core.models import SlotOutcome
+from database.operations import get_all_slots, book_slot_in_db, cancel_slot_in_db
+
+logger = logging.getLogger(__name__)
+
+class SlotStateEngine:
+    """
+    Holds the slot table in memory and writes changes through to SQLite.
+
+    Booked slots are tracked as a bitmap (bit ``i`` set means slot
+    ``start_hour + i`` is booked) alongside per-slot owner and timestamp
+    arrays, so reads never touch the database once loaded.
+
+    Every change bumps a monotonically increasing version and is kept in a
+    bounded change log, so clients can be sent small deltas instead of the
+    full slot list.
+
+    Because reads never go back to the database, another process writing
+    the same database would go unnoticed. The server therefore runs as a
+    single worker, which core.process_lock enforces at startup.
+    """
+
+    def __init__(self, start_hour: int, end_hour: int, change_log_size: int = 256):
+        self.start_hour = start_hour
+        self.end_hour = end_hour
+        size = end_hour - start_hour
+        self.booked_mask = 0
+        self.start_times: List[Optional[str]] = [None] * size
+        self.end_times: List[Optional[str]] = [None] * size
+        self.owners: List[Optional[str]] = [None] * size
+        self.booked_at: List[Optional[str]] = [None] * size
+        self.loaded = False
+        self.version = 0
+        self.loaded_version = 0
+        self.changes: Deque[Dict] = deque(maxlen=change_log_size)
+        # Guards the in-memory state; held only briefly so event-loop readers never wait on SQLite
+        self.lock = threading.RLock()
+        # Serializes bookings and cancellations, including their database writes
+        self.write_lock = threading.Lock()
+
+    def load(self) -> None:
+        """Load the slots table from the database into memory."""
+        slots = get_all_slots()
+        with self.lock:
+            self.booked_mask = 0
+            for slot in slots:
+                index = self._index(slot["id"])
+                if index is None:
+                    logger.warning(f"Ignoring slot {slot['id']} outside configured range")
+                    continue
+                self.start_times[index] = slot["start_time"]
+                self.end_times[index] = slot["end_time"]
+                self.owners[index] = slot["booked_by"] if slot["is_booked"] else None
+                self.booked_at[index] = slot["booked_at"] if slot["is_booked"] else None
+                if slot["is_booked"]:
+                    self.booked_mask |= 1 << index
+            # A reload may change anything, so deltas before it are no longer valid
+            self.version += 1
+            self.loaded_version = self.version
+            self.changes.clear()
+            self.loaded = True
+        logger.info(f"Loaded {len(slots)} slots into memory ({self.booked_count()} booked)")
+
+    def _ensure_loaded(self) -> None:
+        """Load state lazily for callers that bypass application startup."""
+        if not self.loaded:
+            self.load()
+
+    def _index(self, slot_id: int) -> Optional[int]:
+        """Map a slot ID to its array index, or None if out of range."""
+        if not isinstance(slot_id, int) or not (self.start_hour <= slot_id < self.end_hour):
+            return None
+        index = slot_id - self.start_hour
+        return index
+
+    def _exists(self, index: Optional[int]) -> bool:
+        """Check whether an index refers to a slot present in the database."""
+        return index is not None and self.start_times[index] is not None
+
+    def _is_booked(self, index: int) -> bool:
+        """Check the booked bit for an index."""
+        return bool(self.booked_mask >> index & 1)
+
+    def _slot_dict(self, index: int) -> Dict:
+        """Build the dictionary for a single slot."""
+        return {
+            "id": self.start_hour + index,
+            "start_time": self.start_times[index],
+            "end_time": self.end_times[index],
+            "is_booked": self._is_booked(index),
+            "booked_by": self.owners[index],
+            "booked_at": self.booked_at[index]
+        }
+
+    def _record_change(self, index: int) -> None:
+        """Bump the version and log the new state of a slot."""
+        self.version += 1
+        self.changes.append({"version": self.version, "slot": self._slot_dict(index)})
+
+    def get_slots(self) -> List[Dict]:
+        """Get all slots as dictionaries, ordered by ID."""
+        self._ensure_loaded()
+        with self.lock:
+            return [
+                self._slot_dict(index)
+                for index in range(len(self.start_times))
+                if self.start_times[index] is not None
+            ]
+
+    def get_version(self) -> int:
+        """Get the current state version."""
+        self._ensure_loaded()
+        return self.version
+
+    def get_changes_since(self, version: int) -> Optional[List[Dict]]:
+        """
+        Get logged changes newer than the given version, oldest first.
+        Returns None if the log no longer reaches back that far.
+        """
+        self._ensure_loaded()
+        with self.lock:
+            if version > self.version:
+                return None
+            if version == self.version:
+                return []
+            if not self.changes or self.changes[0]["version"] > version + 1:
+                return None
+            return [change for change in self.changes if change["version"] > version]
+
+    def get_available_ids(self) -> List[int]:
+        """Get IDs of slots that are not booked."""
+        self._ensure_loaded()
+        with self.lock:
+            return [
+                self.start_hour + index
+                for index in range(len(self.start_times))
+                if self.start_times[index] is not None and not self._is_booked(index)
+            ]
+
+    def get_booked_ids(self) -> List[int]:
+        """Get IDs of slots that are booked."""
+        self._ensure_loaded()
+        with self.lock:
+            return [
+                self.start_hour + index
+                for index in range(len(self.start_times))
+                if self._is_booked(index)
+            ]
+
+    def booked_count(self) -> int:
+        """Get the number of booked slots."""
+        self._ensure_loaded()
+        return bin(self.booked_mask).count("1")
+
+    def total_count(self) -> int:
+        """Get the number of slots known to the engine."""
+        self._ensure_loaded()
+        return sum(1 for start_time in self.start_times if start_time is not None)
+
+    def is_available(self, slot_id: int) -> bool:
+        """Check if a slot exists and is not booked."""
+        self._ensure_loaded()
+        index = self._index(slot_id)
+        with self.lock:
+            return self._exists(index) and not self._is_booked(index)
+
+    def is_booked_by(self, slot_id: int, user_email: str) -> bool:
+        """Check if a slot is booked by the given user."""
+        self._ensure_loaded()
+        index = self._index(slot_id)
+        with self.lock:
+            return self._exists(index) and self._is_booked(index) and self.owners[index] == user_email
+
+    def get_owned_ids(self, user_email: str) -> List[int]:
+        """Get IDs of slots booked by the given user."""
+        self._ensure_loaded()
+        with self.lock:
+            return [
+                self.start_hour + index
+                for index in range(len(self.start_times))
+                if self._is_booked(index) and self.owners[index] == user_email
+            ]
+
+    def book(self, slot_id: int, booked_by: str) -> SlotOutcome:
+        """Book a slot, writing through to the database."""
+        self._ensure_loaded()
+        index = self._index(slot_id)
+        with self.write_lock:
+            with self.lock:
+                if not self._exists(index):
+                    return SlotOutcome.NOT_FOUND
+                if self._is_booked(index):
+                    return SlotOutcome.ALREADY_TAKEN
+            booked_at = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+            # Readers are not blocked while this waits for SQLite's writer lock
+            outcome = book_slot_in_db(slot_id, booked_by, booked_at)
+            if outcome is SlotOutcome.BOOKED:
+                with self.lock:
+                    self.booked_mask |= 1 << index
+                    self.owners[index] = booked_by
+                    self.booked_at[index] = booked_at
+                    self._record_change(index)
+            elif outcome is not SlotOutcome.ERROR:
+                # The database disagrees with memory (e.g. another process wrote it)
+                self.load()
+            return outcome
+
+    def cancel(self, slot_id: int, user_email: Optional[str] = None) -> SlotOutcome:
+        """Cancel a booking, writing through to the database."""
+        self._ensure_loaded()
+        index = self._index(slot_id)
+        with self.write_lock:
+            with self.lock:
+                if not self._exists(index):
+                    return SlotOutcome.NOT_FOUND
+                if not self._is_booked(index):
+                    return SlotOutcome.NOT_BOOKED
+                if user_email and self.owners[index] != user_email:
+                    return SlotOutcome.NOT_OWNER
+            outcome = cancel_slot_in_db(slot_id, user_email)
+            if outcome is SlotOutcome.CANCELLED:
+                with self.lock:
+                    self.booked_mask &= ~(1 << index)
+                    self.owners[index] = None
+                    self.booked_at[index] = None
+                    self._record_change(index)
+            elif outcome is not SlotOutcome.ERROR:
+                self.load()
+            return outcome
+
+# Global slot state instance
+slot_state = SlotStateEngine(
+    SLOT_CONFIG["start_hour"],
+    SLOT_CONFIG["end_hour"],
+    SLOT_CONFIG["change_log_size"]
+)
@@ -0,0 +1,65 @@
+"""Pre-encoded slot snapshot cache for the Slot Booking API."""
+
+import json
+import threading
+import logging
+from typing import Any, Optional, Tuple
+from core.models import create_slots_snapshot_message
+from core.slot_manager import get_slot_summary, get_current_version
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the standard library
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+def encode_json(data: Any) -> bytes:
+    """Encode data as compact JSON bytes, using orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(",", ":")).encode("utf-8")
+
+class SnapshotCache:
+    """
+    Caches the encoded slot summary and slots_snapshot message per state version.
+
+    The HTTP /slots route, initial WebSocket sends and get_slots replies all
+    share one encoding, which is rebuilt only after the slot state changes.
+    """
+    
+    def __init__(self):
+        self.version: Optional[int] = None
+        self.summary_bytes: bytes = b""
+        self.message_text: str = ""
+        self.lock = threading.Lock()
+        self.builds = 0
+    
+    def _get(self) -> Tuple[bytes, str]:
+        """Return the cached encodings, rebuilding them if the state moved on."""
+        version = get_current_version()
+        with self.lock:
+            if self.version != version:
+                summary = get_slot_summary()
+                message = create_slots_snapshot_message(
+                    summary["slots"],
+                    summary["available_slots"],
+                    summary["booked_slots"],
+                    summary["version"]
+                )
+                self.summary_bytes = encode_json(summary)
+                self.message_text = encode_json(message).decode("utf-8")
+                self.version = summary["version"]
+                self.builds += 1
+            return self.summary_bytes, self.message_text
+    
+    def get_summary_bytes(self) -> bytes:
+        """Get the encoded slot summary served by the /slots route."""
+        return self._get()[0]
+    
+    def get_message_text(self) -> str:
+        """Get the encoded slots_snapshot WebSocket message."""
+        return self._get()[1]
+
+# Global snapshot cache instance
+snapshot_cache = SnapshotCache()
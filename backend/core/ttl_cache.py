@@ -0,0 +1,93 @@
+"""Bounded LRU cache with per-entry expiry."""
+
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Generic, Hashable, Optional, Tuple, TypeVar
+
+V = TypeVar("V")
+
+class TTLCache(Generic[V]):
+    """
+    Thread-safe LRU cache whose entries also expire.
+
+    Entries expire after the cache's default TTL unless an explicit expiry
+    time is given when they are stored. When full, the least recently used
+    entry is evicted.
+    """
+    
+    def __init__(self, max_size: int, ttl_seconds: Optional[float] = None):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.entries: "OrderedDict[Hashable, Tuple[V, float]]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+    
+    def get(self, key: Hashable) -> Optional[V]:
+        """Get a live entry, or None if missing or expired."""
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at <= now:
+                del self.entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def set(self, key: Hashable, value: V, expires_at: Optional[float] = None) -> None:
+        """Store an entry until expires_at (a Unix timestamp) or for the default TTL."""
+        if expires_at is None:
+            expires_at = time.time() + self.ttl_seconds if self.ttl_seconds is not None else float("inf")
+        with self.lock:
+            self.entries[key] = (value, expires_at)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+    
+    def pop(self, key: Hashable) -> Optional[V]:
+        """Remove an entry, returning its value if it was present."""
+        with self.lock:
+            entry = self.entries.pop(key, None)
+        return entry[0] if entry else None
+    
+    def sweep(self) -> int:
+        """Drop every expired entry. Returns how many were removed."""
+        now = time.time()
+        with self.lock:
+            expired = [key for key, (_, expires_at) in self.entries.items() if expires_at <= now]
+            for key in expired:
+                del self.entries[key]
+            self.expirations += len(expired)
+        return len(expired)
+    
+    def clear(self) -> None:
+        """Remove every entry."""
+        with self.lock:
+            self.entries.clear()
+    
+    def __len__(self) -> int:
+        return len(self.entries)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters and current size."""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations
+        }
@@ -3,8 +3,11 @@
 import sqlite3
 import logging
 import os
-from typing import List, Set, Optional
-from core.config import SLOT_CONFIG
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Set, Optional
+from core.config import SLOT_CONFIG, DATABASE_CONFIG
+from core.models import SlotOutcome
 
 logger = logging.getLogger(__name__)
 
@@ -17,18 +20,90 @@ def ensure_database_directory() -> None:
         os.makedirs(DATABASE_DIR)
         logger.info(f"Created database directory: {DATABASE_DIR}")
 
+class ConnectionPool:
+    """
+    Per-thread pool of long-lived SQLite connections.
+
+    Each thread reuses one connection opened in WAL mode, so readers do not
+    block behind the writer and no connection is opened per query.
+    """
+    
+    def __init__(self, database_path: str):
+        self.database_path = database_path
+        self.local = threading.local()
+        self.connections: List[sqlite3.Connection] = []
+        self.lock = threading.Lock()
+        self.directory_ready = False
+    
+    def _open(self) -> sqlite3.Connection:
+        """Open and configure a new connection."""
+        if not self.directory_ready:
+            ensure_database_directory()
+            self.directory_ready = True
+        
+        # Each connection is only used by its owning thread; the flag allows
+        # close_all() to close it from the shutdown thread.
+        conn = sqlite3.connect(
+            self.database_path,
+            timeout=DATABASE_CONFIG["busy_timeout_ms"] / 1000,
+            check_same_thread=False
+        )
+        conn.row_factory = sqlite3.Row  # Enable column access by name
+        conn.execute(f"PRAGMA journal_mode={DATABASE_CONFIG['journal_mode']}")
+        conn.execute(f"PRAGMA synchronous={DATABASE_CONFIG['synchronous']}")
+        conn.execute(f"PRAGMA cache_size=-{DATABASE_CONFIG['cache_size_kib']}")
+        conn.execute(f"PRAGMA busy_timeout={DATABASE_CONFIG['busy_timeout_ms']}")
+        
+        with self.lock:
+            self.connections.append(conn)
+        logger.info(f"Opened pooled database connection for thread {threading.get_ident()}")
+        return conn
+    
+    def get(self) -> sqlite3.Connection:
+        """Get the calling thread's connection, opening it on first use."""
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self._open()
+            self.local.conn = conn
+        return conn
+    
+    def close_all(self) -> None:
+        """Close every pooled connection. Call on shutdown."""
+        with self.lock:
+            connections, self.connections = self.connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error as e:
+                logger.warning(f"Error closing database connection: {e}")
+        self.local = threading.local()
+        logger.info(f"Closed {len(connections)} pooled database connections")
+
+connection_pool = ConnectionPool(DATABASE_PATH)
+
 def get_database_connection() -> sqlite3.Connection:
-    """Get a database connection."""
-    ensure_database_directory()
-    conn = sqlite3.connect(DATABASE_PATH)
-    conn.row_factory = sqlite3.Row  # Enable column access by name
-    return conn
+    """Get the calling thread's pooled database connection."""
+    return connection_pool.get()
+
+@contextmanager
+def db_connection() -> Iterator[sqlite3.Connection]:
+    """
+    Context manager yielding a pooled connection inside a transaction.
+    Commits on success and rolls back on error; the connection stays open.
+    """
+    conn = connection_pool.get()
+    with conn:
+        yield conn
+
+def close_database_connections() -> None:
+    """Close all pooled database connections."""
+    connection_pool.close_all()
 
 def initialize_database() -> None:
     """Initialize the database with the slots and users tables."""
     ensure_database_directory()
     
-    with get_database_connection() as conn:
+    with db_connection() as conn:
         cursor = conn.cursor()
         
         # Create users table if it doesn't exist
@@ -43,6 +118,39 @@ def initialize_database() -> None:
             )
         """)
         
+        # Create devices table if it doesn't exist (stable IDs for serial devices)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS devices (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                identity TEXT UNIQUE NOT NULL,
+                vid TEXT DEFAULT NULL,
+                pid TEXT DEFAULT NULL,
+                serial_number TEXT DEFAULT NULL,
+                port TEXT DEFAULT NULL,
+                model TEXT DEFAULT NULL,
+                alias TEXT DEFAULT NULL,
+                first_seen DATETIME DEFAULT CURRENT_TIMESTAMP,
+                last_seen DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        
+        # Create jobs table if it doesn't exist (queued compile/upload work)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                user_email TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'queued',
+                result TEXT DEFAULT NULL,
+                log TEXT DEFAULT '',
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                started_at DATETIME DEFAULT NULL,
+                finished_at DATETIME DEFAULT NULL
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at)")
+        
         # Create slots table if it doesn't exist (with new booked_by column)
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS slots (
@@ -98,7 +206,7 @@ def populate_initial_slots(cursor: sqlite3.Cursor) -> None:
 
 def load_booked_slots() -> Set[int]:
     """Load booked slot IDs from the database."""
-    with get_database_connection() as conn:
+    with db_connection() as conn:
         cursor = conn.cursor()
         cursor.execute("SELECT id FROM slots WHERE is_booked = TRUE")
         booked_slots = {row[0] for row in cursor.fetchall()}
@@ -107,7 +215,7 @@ def load_booked_slots() -> Set[int]:
 
 def get_all_slots() -> List[dict]:
     """Get all slots from the database."""
-    with get_database_connection() as conn:
+    with db_connection() as conn:
         cursor = conn.cursor()
         cursor.execute("""
             SELECT id, start_time, end_time, is_booked, booked_by, booked_at 
@@ -128,107 +236,84 @@ def get_all_slots() -> List[dict]:
         
         return slots
 
-def book_slot_in_db(slot_id: int, booked_by: str) -> bool:
-    """Book a slot in the database. Returns True if successful."""
+def _classify_slot_miss(cursor: sqlite3.Cursor, slot_id: int, user_email: Optional[str] = None,
+                        expect_booked: bool = False) -> SlotOutcome:
+    """Explain why a conditional slot update matched no rows."""
+    cursor.execute("SELECT is_booked, booked_by FROM slots WHERE id = ?", (slot_id,))
+    result = cursor.fetchone()
+    
+    if result is None:
+        return SlotOutcome.NOT_FOUND
+    if not expect_booked:
+        return SlotOutcome.ALREADY_TAKEN
+    if not result["is_booked"]:
+        return SlotOutcome.NOT_BOOKED
+    if user_email and result["booked_by"] != user_email:
+        return SlotOutcome.NOT_OWNER
+    return SlotOutcome.ERROR
+
+def book_slot_in_db(slot_id: int, booked_by: str, booked_at: Optional[str] = None) -> SlotOutcome:
+    """
+    Book a slot with a single conditional UPDATE.
+    The row only changes if it is still free, so concurrent bookers cannot both win.
+    """
     try:
-        with get_database_connection() as conn:
+        with db_connection() as conn:
             cursor = conn.cursor()
-            
-            # Check if slot exists and is available
-            cursor.execute(
-                "SELECT is_booked FROM slots WHERE id = ?", 
-                (slot_id,)
-            )
-            result = cursor.fetchone()
-            
-            if result is None:
-                logger.warning(f"Slot {slot_id} does not exist")
-                return False
-            
-            if result["is_booked"]:
-                logger.warning(f"Slot {slot_id} is already booked")
-                return False
-            
-            # Book the slot
             cursor.execute("""
                 UPDATE slots 
                 SET is_booked = TRUE, 
                     booked_by = ?,
-                    booked_at = CURRENT_TIMESTAMP,
+                    booked_at = COALESCE(?, CURRENT_TIMESTAMP),
                     updated_at = CURRENT_TIMESTAMP
-                WHERE id = ?
-            """, (booked_by, slot_id))
+                WHERE id = ? AND is_booked = FALSE
+            """, (booked_by, booked_at, slot_id))
             
-            conn.commit()
-            logger.info(f"Successfully booked slot {slot_id} by {booked_by} in database")
-            return True
+            if cursor.rowcount == 1:
+                logger.info(f"Successfully booked slot {slot_id} by {booked_by} in database")
+                return SlotOutcome.BOOKED
+            
+            outcome = _classify_slot_miss(cursor, slot_id)
+            logger.warning(f"Could not book slot {slot_id}: {outcome.value}")
+            return outcome
             
     except sqlite3.Error as e:
         logger.error(f"Database error while booking slot {slot_id}: {e}")
-        return False
+        return SlotOutcome.ERROR
 
-def cancel_slot_in_db(slot_id: int, user_email: Optional[str] = None) -> bool:
-    """Cancel a slot booking in the database. Returns True if successful."""
+def cancel_slot_in_db(slot_id: int, user_email: Optional[str] = None) -> SlotOutcome:
+    """
+    Cancel a slot booking with a single conditional UPDATE.
+    When user_email is given, only that user's booking is cancelled.
+    """
     try:
-        with get_database_connection() as conn:
+        with db_connection() as conn:
             cursor = conn.cursor()
-            
-            # Check if slot exists and is booked
-            if user_email:
-                cursor.execute(
-                    "SELECT is_booked, booked_by FROM slots WHERE id = ?", 
-                    (slot_id,)
-                )
-                result = cursor.fetchone()
-                
-                if result is None:
-                    logger.warning(f"Slot {slot_id} does not exist")
-                    return False
-                
-                if not result["is_booked"]:
-                    logger.warning(f"Slot {slot_id} is not booked")
-                    return False
-                
-                if result["booked_by"] != user_email:
-                    logger.warning(f"Slot {slot_id} was not booked by user {user_email}")
-                    return False
-            else:
-                cursor.execute(
-                    "SELECT is_booked FROM slots WHERE id = ?", 
-                    (slot_id,)
-                )
-                result = cursor.fetchone()
-                
-                if result is None:
-                    logger.warning(f"Slot {slot_id} does not exist")
-                    return False
-                
-                if not result["is_booked"]:
-                    logger.warning(f"Slot {slot_id} is not booked")
-                    return False
-            
-            # Cancel the booking
             cursor.execute("""
                 UPDATE slots 
                 SET is_booked = FALSE, 
                     booked_by = NULL,
                     booked_at = NULL,
                     updated_at = CURRENT_TIMESTAMP
-                WHERE id = ?
-            """, (slot_id,))
+                WHERE id = ? AND is_booked = TRUE AND (? IS NULL OR booked_by = ?)
+            """, (slot_id, user_email, user_email))
             
-            conn.commit()
-            logger.info(f"Successfully cancelled slot {slot_id} booking in database")
-            return True
+            if cursor.rowcount == 1:
+                logger.info(f"Successfully cancelled slot {slot_id} booking in database")
+                return SlotOutcome.CANCELLED
+            
+            outcome = _classify_slot_miss(cursor, slot_id, user_email, expect_booked=True)
+            logger.warning(f"Could not cancel slot {slot_id}: {outcome.value}")
+            return outcome
             
     except sqlite3.Error as e:
         logger.error(f"Database error while cancelling slot {slot_id}: {e}")
-        return False
+        return SlotOutcome.ERROR
 
 def is_slot_available_in_db(slot_id: int) -> bool:
     """Check if a slot is available in the database."""
     try:
-        with get_database_connection() as conn:
+        with db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute(
                 "SELECT is_booked FROM slots WHERE id = ?", 
@@ -248,7 +333,7 @@ def is_slot_available_in_db(slot_id: int) -> bool:
 def get_user_bookings(user_email: str) -> List[dict]:
     """Get all bookings for a specific user."""
     try:
-        with get_database_connection() as conn:
+        with db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 SELECT id, start_time, end_time, booked_at 
@@ -272,10 +357,191 @@ def get_user_bookings(user_email: str) -> List[dict]:
         logger.error(f"Database error while getting bookings for {user_email}: {e}")
         return []
 
+def upsert_devices(devices: List[dict]) -> Dict[str, dict]:
+    """
+    Record connected devices, refreshing their port, model and last_seen.
+    Returns {identity: {"id": ..., "alias": ...}} for the given devices.
+    """
+    if not devices:
+        return {}
+    
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany("""
+                INSERT INTO devices (identity, vid, pid, serial_number, port, model)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(identity) DO UPDATE SET
+                    port = excluded.port,
+                    model = excluded.model,
+                    last_seen = CURRENT_TIMESTAMP
+            """, [
+                (device["identity"], device["vid"], device["pid"], device["serial_number"],
+                 device["port"], device["model"])
+                for device in devices
+            ])
+            
+            identities = [device["identity"] for device in devices]
+            placeholders = ",".join("?" for _ in identities)
+            cursor.execute(
+                f"SELECT id, identity, alias FROM devices WHERE identity IN ({placeholders})",
+                identities
+            )
+            return {row["identity"]: {"id": row["id"], "alias": row["alias"]} for row in cursor.fetchall()}
+            
+    except sqlite3.Error as e:
+        logger.error(f"Database error while recording devices: {e}")
+        return {}
+
+def touch_devices(identities: List[str]) -> None:
+    """Refresh last_seen for devices that are (or were until just now) connected."""
+    if not identities:
+        return
+    
+    try:
+        with db_connection() as conn:
+            placeholders = ",".join("?" for _ in identities)
+            conn.execute(
+                f"UPDATE devices SET last_seen = CURRENT_TIMESTAMP WHERE identity IN ({placeholders})",
+                identities
+            )
+            
+    except sqlite3.Error as e:
+        logger.error(f"Database error while refreshing device last_seen: {e}")
+
+def set_device_alias(device_id: int, alias: Optional[str]) -> bool:
+    """Set or clear the alias for a device. Returns True if the device exists."""
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("UPDATE devices SET alias = ? WHERE id = ?", (alias, device_id))
+            return cursor.rowcount == 1
+            
+    except sqlite3.Error as e:
+        logger.error(f"Database error while setting alias for device {device_id}: {e}")
+        return False
+
+def get_known_devices() -> List[dict]:
+    """Get every device ever seen, including disconnected ones."""
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id, vid, pid, serial_number, port, model, alias, first_seen, last_seen
+                FROM devices
+                ORDER BY id
+            """)
+            return [dict(row) for row in cursor.fetchall()]
+            
+    except sqlite3.Error as e:
+        logger.error(f"Database error while getting known devices: {e}")
+        return []
+
+def record_user_logins(logins: Dict[int, str]) -> bool:
+    """Write last_login timestamps for many users in one transaction."""
+    if not logins:
+        return True
+    
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany("""
+                UPDATE users SET last_login = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            """, [(logged_in_at, user_id) for user_id, logged_in_at in logins.items()])
+            return True
+            
+    except sqlite3.Error as e:
+        logger.error(f"Database error while recording {len(logins)} logins: {e}")
+        return False
+
+def create_job(job_id: str, kind: str, user_email: str, payload: str) -> bool:
+    """Persist a newly queued job."""
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "INSERT INTO jobs (id, kind, user_email, payload) VALUES (?, ?, ?, ?)",
+                (job_id, kind, user_email, payload)
+            )
+            return True
+            
+    except sqlite3.Error as e:
+        logger.error(f"Database error while creating job {job_id}: {e}")
+        return False
+
+def get_job(job_id: str) -> Optional[dict]:
+    """Get a job by ID."""
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+            row = cursor.fetchone()
+            return dict(row) if row else None
+            
+    except sqlite3.Error as e:
+        logger.error(f"Database error while getting job {job_id}: {e}")
+        return None
+
+def requeue_interrupted_jobs() -> List[dict]:
+    """
+    Put jobs that were running when the server stopped back in the queue,
+    then return every queued job, oldest first. Any 'running' job is taken
+    to be interrupted, which holds because core.process_lock allows only one
+    server process.
+    """
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("UPDATE jobs SET status = 'queued', started_at = NULL WHERE status = 'running'")
+            if cursor.rowcount:
+                logger.info(f"Requeued {cursor.rowcount} interrupted jobs")
+            cursor.execute("""
+                SELECT id, kind, user_email, payload, created_at
+                FROM jobs
+                WHERE status = 'queued'
+                ORDER BY created_at, rowid
+            """)
+            return [dict(row) for row in cursor.fetchall()]
+            
+    except sqlite3.Error as e:
+        logger.error(f"Database error while loading queued jobs: {e}")
+        return []
+
+def mark_job_started(job_id: str) -> bool:
+    """Move a queued job to running."""
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE jobs SET status = 'running', started_at = CURRENT_TIMESTAMP
+                WHERE id = ? AND status = 'queued'
+            """, (job_id,))
+            return cursor.rowcount == 1
+            
+    except sqlite3.Error as e:
+        logger.error(f"Database error while starting job {job_id}: {e}")
+        return False
+
+def mark_job_finished(job_id: str, status: str, result: Optional[str], log: str) -> bool:
+    """Record the final status, result and log of a job."""
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE jobs SET status = ?, result = ?, log = ?, finished_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            """, (status, result, log, job_id))
+            return cursor.rowcount == 1
+            
+    except sqlite3.Error as e:
+        logger.error(f"Database error while finishing job {job_id}: {e}")
+        return False
+
 def get_database_stats() -> dict:
     """Get database statistics."""
     try:
-        with get_database_connection() as conn:
+        with db_connection() as conn:
             cursor = conn.cursor()
             
             cursor.execute("SELECT COUNT(*) FROM slots")
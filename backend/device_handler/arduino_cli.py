@@ -0,0 +1,179 @@
+"""Async arduino-cli runner with bounded concurrency and cancellation."""
+
+import os
+import time
+import codecs
+import hashlib
+import signal
+import asyncio
+import logging
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Tuple
+from core.config import TOOLCHAIN_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# Called with (stream name, text) as arduino-cli produces output
+OutputSink = Callable[[str, str], None]
+
+# Set by whoever wants live output (e.g. a queued job); inherited by child tasks
+output_sink: ContextVar[Optional[OutputSink]] = ContextVar("arduino_cli_output_sink", default=None)
+
+class ArduinoCliRunner:
+    """
+    Runs arduino-cli as asyncio subprocesses so compiles never block the event loop.
+
+    Compiles and uploads each have their own concurrency limit; requests over
+    the limit wait for a free slot. Each invocation runs in its own process
+    group, so a timeout or a cancelled request (e.g. the client disconnected)
+    kills the whole toolchain tree rather than leaving compilers running.
+    """
+    
+    def __init__(self, max_concurrent_compiles: int, max_concurrent_uploads: int, max_concurrent_queries: int):
+        self.limits = {
+            "compile": max_concurrent_compiles,
+            "upload": max_concurrent_uploads,
+            "query": max_concurrent_queries,
+        }
+        self.semaphores: Dict[str, asyncio.Semaphore] = {}
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.stats = {
+            "running": 0,
+            "waiting": 0,
+            "completed": 0,
+            "timed_out": 0,
+            "cancelled": 0,
+        }
+        self.fingerprint: Optional[str] = None
+        self.fingerprint_time = 0.0
+    
+    def _semaphore(self, kind: str) -> asyncio.Semaphore:
+        """Get the semaphore for a kind of job, bound to the running loop."""
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            self.loop = loop
+            self.semaphores = {name: asyncio.Semaphore(limit) for name, limit in self.limits.items()}
+        return self.semaphores[kind]
+    
+    @staticmethod
+    async def _kill(process: asyncio.subprocess.Process) -> None:
+        """Kill a process and its children, then reap it."""
+        if process.returncode is None:
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass  # Already exited
+        await process.wait()
+    
+    @staticmethod
+    async def _collect(process: asyncio.subprocess.Process, sink: OutputSink) -> Tuple[bytes, bytes]:
+        """Read both output pipes to the end, passing decoded text to the sink as it arrives."""
+        async def pump(stream: asyncio.StreamReader, name: str) -> bytes:
+            chunks = []
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            while True:
+                chunk = await stream.read(4096)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                text = decoder.decode(chunk)
+                if text:
+                    sink(name, text)
+            return b"".join(chunks)
+        
+        stdout, stderr, _ = await asyncio.gather(
+            pump(process.stdout, "stdout"),
+            pump(process.stderr, "stderr"),
+            process.wait()
+        )
+        return stdout, stderr
+    
+    async def run(self, kind: str, args: List[str], timeout: float) -> Dict:
+        """
+        Run arduino-cli with the given arguments.
+        Returns {"returncode", "stdout", "stderr", "timed_out"}; raises CancelledError if cancelled.
+        """
+        semaphore = self._semaphore(kind)
+        self.stats["waiting"] += 1
+        try:
+            await semaphore.acquire()
+        finally:
+            self.stats["waiting"] -= 1
+        
+        self.stats["running"] += 1
+        try:
+            process = await asyncio.create_subprocess_exec(
+                "arduino-cli", *args,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                start_new_session=True
+            )
+            try:
+                sink = output_sink.get() if kind != "query" else None
+                if sink is None:
+                    stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+                else:
+                    sink("status", f"$ arduino-cli {' '.join(args)}\n")
+                    stdout, stderr = await asyncio.wait_for(self._collect(process, sink), timeout)
+            except asyncio.TimeoutError:
+                await self._kill(process)
+                self.stats["timed_out"] += 1
+                logger.warning(f"arduino-cli {kind} timed out after {timeout} seconds")
+                return {"returncode": None, "stdout": "", "stderr": "", "timed_out": True}
+            except asyncio.CancelledError:
+                await asyncio.shield(self._kill(process))
+                self.stats["cancelled"] += 1
+                logger.info(f"arduino-cli {kind} cancelled")
+                raise
+            
+            self.stats["completed"] += 1
+            return {
+                "returncode": process.returncode,
+                "stdout": stdout.decode("utf-8", errors="replace"),
+                "stderr": stderr.decode("utf-8", errors="replace"),
+                "timed_out": False
+            }
+        finally:
+            self.stats["running"] -= 1
+            semaphore.release()
+    
+    async def compile(self, args: List[str]) -> Dict:
+        """Run `arduino-cli compile` with the compile limit and timeout."""
+        return await self.run("compile", ["compile", *args], TOOLCHAIN_CONFIG["compile_timeout_seconds"])
+    
+    async def upload(self, args: List[str]) -> Dict:
+        """Run `arduino-cli upload` with the upload limit and timeout."""
+        return await self.run("upload", ["upload", *args], TOOLCHAIN_CONFIG["upload_timeout_seconds"])
+    
+    async def get_toolchain_fingerprint(self) -> str:
+        """
+        Hash of the arduino-cli version and installed cores and libraries.
+        Changes whenever a core or library is installed or upgraded, so
+        builds made with an older toolchain stop matching.
+        """
+        if self.fingerprint is not None and time.monotonic() - self.fingerprint_time < TOOLCHAIN_CONFIG["fingerprint_ttl_seconds"]:
+            return self.fingerprint
+        
+        digest = hashlib.sha256()
+        for args in (["version"], ["core", "list", "--format", "json"], ["lib", "list", "--format", "json"]):
+            try:
+                result = await self.run("query", args, TOOLCHAIN_CONFIG["compile_timeout_seconds"])
+                digest.update(result["stdout"].encode("utf-8"))
+            except OSError as e:
+                logger.warning(f"Could not query arduino-cli {' '.join(args)}: {e}")
+            digest.update(b"\0")
+        
+        self.fingerprint = digest.hexdigest()
+        self.fingerprint_time = time.monotonic()
+        return self.fingerprint
+    
+    def get_stats(self) -> Dict[str, int]:
+        """Get toolchain job counters."""
+        return dict(self.stats)
+
+# Global arduino-cli runner instance
+arduino_cli = ArduinoCliRunner(
+    TOOLCHAIN_CONFIG["max_concurrent_compiles"],
+    TOOLCHAIN_CONFIG["max_concurrent_uploads"],
+    TOOLCHAIN_CONFIG["max_concurrent_queries"]
+)
@@ -0,0 +1,209 @@
+"""Content-addressed cache of compiled sketch artifacts."""
+
+import os
+import re
+import json
+import time
+import shutil
+import hashlib
+import threading
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from core.config import BUILD_CACHE_CONFIG
+from device_handler.utils import directory_size
+
+logger = logging.getLogger(__name__)
+
+METADATA_FILE = "build.json"
+
+BUILD_KEY_PATTERN = re.compile(r"[0-9a-f]{64}")
+
+def normalize_source(code: str) -> str:
+    """
+    Normalize sketch source so cosmetic differences share a cache entry.
+    Line endings and trailing whitespace are normalized; line numbers are
+    preserved so compiler messages still point at the right lines.
+    """
+    code = code.lstrip("\ufeff").replace("\r\n", "\n").replace("\r", "\n")
+    lines = [line.rstrip() for line in code.split("\n")]
+    return "\n".join(lines).rstrip("\n") + "\n"
+
+def is_valid_build_key(key: str) -> bool:
+    """Check that a key looks like a build key (and so is safe to use as a path)."""
+    return bool(BUILD_KEY_PATTERN.fullmatch(key))
+
+def build_key(normalized_code: str, fqbn: str, toolchain_fingerprint: str) -> str:
+    """Cache key for a normalized sketch built for a board with a given toolchain."""
+    digest = hashlib.sha256()
+    for part in (fqbn, toolchain_fingerprint, normalized_code):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+class BuildCache:
+    """
+    Stores successful build outputs on disk, one directory per build key.
+
+    Entries are tracked in LRU order and evicted once their combined size
+    exceeds the configured limit. Access times are kept as the metadata
+    file's mtime, so the LRU order survives restarts. Entries can be pinned
+    while an upload is still waiting to flash them; eviction skips pinned
+    entries until they are released.
+    """
+    
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.max_bytes = max_bytes
+        self.entries: "OrderedDict[str, int]" = OrderedDict()  # key -> size in bytes
+        self.total_bytes = 0
+        self.loaded = False
+        self.lock = threading.Lock()
+        self.pins: Dict[str, int] = {}  # key -> number of holders
+        self.pin_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+    
+    def _entry_dir(self, key: str) -> str:
+        """Directory holding the artifacts for a key."""
+        return os.path.join(self.cache_dir, key)
+    
+    def _load(self) -> None:
+        """Index existing entries on disk, oldest access first. Caller holds the lock."""
+        if self.loaded:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        
+        found = []
+        for key in os.listdir(self.cache_dir):
+            metadata_path = os.path.join(self._entry_dir(key), METADATA_FILE)
+            try:
+                with open(metadata_path, "r", encoding="utf-8") as f:
+                    size = json.load(f)["size"]
+                found.append((os.path.getmtime(metadata_path), key, size))
+            except (OSError, ValueError, KeyError):
+                # Incomplete or foreign entry, e.g. a build interrupted mid-store
+                shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+        
+        for _, key, size in sorted(found):
+            self.entries[key] = size
+            self.total_bytes += size
+        self.loaded = True
+        logger.info(f"Build cache loaded: {len(self.entries)} entries, {self.total_bytes} bytes")
+    
+    def pin(self, key: str) -> None:
+        """
+        Keep an entry from being evicted until release() is called. Pin before
+        get() or put() so an eviction running in between cannot remove it.
+        """
+        with self.pin_lock:
+            self.pins[key] = self.pins.get(key, 0) + 1
+    
+    def release(self, key: str) -> None:
+        """Drop a pin taken with pin(). The next store evicts the entry if needed."""
+        with self.pin_lock:
+            count = self.pins.get(key, 0) - 1
+            if count > 0:
+                self.pins[key] = count
+            else:
+                self.pins.pop(key, None)
+    
+    def is_pinned(self, key: str) -> bool:
+        """Check whether an upload still needs an entry."""
+        with self.pin_lock:
+            return key in self.pins
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Look up a build. Returns its metadata (with "path") or None on a miss."""
+        if not is_valid_build_key(key):
+            return None
+        
+        with self.lock:
+            self._load()
+            if key not in self.entries:
+                self.misses += 1
+                return None
+            
+            entry_dir = self._entry_dir(key)
+            metadata_path = os.path.join(entry_dir, METADATA_FILE)
+            try:
+                with open(metadata_path, "r", encoding="utf-8") as f:
+                    metadata = json.load(f)
+                os.utime(metadata_path)
+            except (OSError, ValueError):
+                # Removed from under us; treat as a miss
+                self.total_bytes -= self.entries.pop(key)
+                self.misses += 1
+                return None
+            
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return {**metadata, "path": entry_dir}
+    
+    def put(self, key: str, build_dir: str, metadata: Dict[str, Any]) -> Optional[str]:
+        """
+        Move a finished build directory into the cache under a key.
+        Returns the entry path, or None if the build could not be stored.
+        """
+        size = directory_size(build_dir)
+        if size > self.max_bytes:
+            logger.warning(f"Build {key[:12]} is larger than the whole cache, not storing")
+            return None
+        
+        with self.lock:
+            self._load()
+            entry_dir = self._entry_dir(key)
+            if key in self.entries:
+                # A concurrent compile of the same sketch got there first
+                self.entries.move_to_end(key)
+                return entry_dir
+            
+            try:
+                with open(os.path.join(build_dir, METADATA_FILE), "w", encoding="utf-8") as f:
+                    json.dump({**metadata, "size": size, "created_at": time.time()}, f)
+                shutil.move(build_dir, entry_dir)
+            except OSError as e:
+                logger.error(f"Failed to store build {key[:12]} in cache: {e}")
+                return None
+            
+            self.entries[key] = size
+            self.total_bytes += size
+            self.stores += 1
+            self._evict()
+            return entry_dir if key in self.entries else None
+    
+    def _evict(self) -> None:
+        """Remove least recently used unpinned entries until under the size limit. Caller holds the lock."""
+        for key in list(self.entries):
+            if self.total_bytes <= self.max_bytes:
+                break
+            if self.is_pinned(key):
+                continue
+            size = self.entries.pop(key)
+            self.total_bytes -= size
+            self.evictions += 1
+            shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+            logger.info(f"Evicted build {key[:12]} ({size} bytes) from cache")
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache hit/miss counters and usage."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "entries": len(self.entries),
+            "pinned": len(self.pins),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes
+        }
+
+# Global build cache instance
+build_cache = BuildCache(
+    BUILD_CACHE_CONFIG["directory"],
+    BUILD_CACHE_CONFIG["max_bytes"]
+)
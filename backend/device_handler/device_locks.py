@@ -0,0 +1,93 @@
+"""Per-device exclusive leases so uploads never fight serial readers or each other."""
+
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Set
+from device_handler.serial_manager import serial_manager
+
+logger = logging.getLogger(__name__)
+
+# Called with (device_id, state) where state is "flashing" or "ready"
+LeaseListener = Callable[[int, str], Awaitable[None]]
+
+class DeviceLeaseManager:
+    """
+    Hands out exclusive access to a device's serial port.
+
+    Uploads to the same device queue in arrival order and run one at a
+    time; uploads to different devices do not wait for each other. While a
+    lease is held the serial reader for that device is stopped, and
+    listeners are told when the device is flashing and when it is ready
+    again so they can pause and resume their streams.
+
+    Leases are asyncio locks, so they only exclude uploads within this
+    process; core.process_lock keeps the server to a single process.
+    """
+    
+    def __init__(self):
+        self.locks: Dict[int, asyncio.Lock] = {}
+        self.waiting: Dict[int, int] = {}
+        self.flashing: Set[int] = set()
+        self.listeners: List[LeaseListener] = []
+        self.leases_granted = 0
+    
+    def add_listener(self, listener: LeaseListener) -> None:
+        """Register a coroutine to be told about lease state changes."""
+        self.listeners.append(listener)
+    
+    async def _notify(self, device_id: int, state: str) -> None:
+        """Tell every listener about a state change."""
+        for listener in self.listeners:
+            try:
+                await listener(device_id, state)
+            except Exception as e:
+                logger.error(f"Error in device lease listener for device {device_id}: {e}")
+    
+    def is_flashing(self, device_id: int) -> bool:
+        """Check whether a device is currently leased for flashing."""
+        return device_id in self.flashing
+    
+    @asynccontextmanager
+    async def exclusive(self, device_id: int) -> AsyncIterator[None]:
+        """Hold a device exclusively, with its serial reader stopped, for the duration of the block."""
+        lock = self.locks.setdefault(device_id, asyncio.Lock())
+        self.waiting[device_id] = self.waiting.get(device_id, 0) + 1
+        try:
+            await lock.acquire()
+        except asyncio.CancelledError:
+            self.waiting[device_id] -= 1
+            if not lock.locked() and not self.waiting[device_id] and device_id in self.flashing:
+                # The device was handed over to us and nobody else is queued to take it
+                self.flashing.discard(device_id)
+                asyncio.ensure_future(self._notify(device_id, "ready"))
+            raise
+        self.waiting[device_id] -= 1
+        
+        try:
+            # Mark first so no reader is restarted while we wait for it to stop
+            if device_id not in self.flashing:
+                self.flashing.add(device_id)
+                await self._notify(device_id, "flashing")
+            self.leases_granted += 1
+            await asyncio.to_thread(serial_manager.stop_reading_device, device_id)
+            yield
+        finally:
+            # With another upload queued, hand the device straight over without resuming readers
+            handoff = self.waiting.get(device_id, 0) > 0
+            if not handoff:
+                self.flashing.discard(device_id)
+            lock.release()
+            if not handoff:
+                await self._notify(device_id, "ready")
+    
+    def get_stats(self) -> Dict[str, object]:
+        """Get lease counters and per-device queue depth."""
+        return {
+            "leases_granted": self.leases_granted,
+            "flashing": sorted(self.flashing),
+            "waiting": {device_id: count for device_id, count in self.waiting.items() if count}
+        }
+
+# Global device lease manager instance
+device_leases = DeviceLeaseManager()
@@ -37,6 +37,3 @@ def detect_serial_devices():
         devices.append(device_info)
 
     return devices
-
-# Initialize connected devices when module is imported
-connected_devices = detect_serial_devices()
\ No newline at end of file
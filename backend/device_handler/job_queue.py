@@ -0,0 +1,351 @@
+"""Persistent compile and upload job queue with a fair worker pool."""
+
+import json
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set
+from core.config import JOB_CONFIG
+from core.executors import run_db
+from core.slot_manager import is_slot_booked_by
+from device_handler.arduino_cli import output_sink
+from database.operations import (
+    create_job, get_job, requeue_interrupted_jobs, mark_job_started, mark_job_finished
+)
+
+logger = logging.getLogger(__name__)
+
+FINAL_JOB_STATUSES = ("succeeded", "failed", "cancelled")
+
+class Job:
+    """A queued or running job, with its live log and stream subscribers."""
+    
+    def __init__(self, job_id: str, kind: str, user_email: str, payload: Dict[str, Any],
+                 max_log_bytes: int, created_at: Optional[str] = None):
+        self.id = job_id
+        self.kind = kind
+        self.user_email = user_email
+        self.payload = payload
+        self.created_at = created_at or datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+        self.status = "queued"
+        self.result: Optional[Dict[str, Any]] = None
+        self.max_log_bytes = max_log_bytes
+        self.log_parts: List[str] = []
+        self.log_bytes = 0
+        self.log_truncated = False
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.task: Optional[asyncio.Task] = None
+    
+    def publish(self, event: Dict[str, Any]) -> None:
+        """Send an event to every stream subscriber."""
+        for queue in self.subscribers:
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Subscriber fell behind: replace its backlog with a resync marker
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"type": "resync"})
+    
+    def append_log(self, stream: str, text: str) -> None:
+        """Record toolchain output (used as the arduino-cli output sink)."""
+        if self.log_bytes < self.max_log_bytes:
+            kept = text[:self.max_log_bytes - self.log_bytes]
+            self.log_parts.append(kept)
+            self.log_bytes += len(kept)
+            if len(kept) < len(text):
+                self.log_truncated = True
+        else:
+            self.log_truncated = True
+        self.publish({"type": "log", "stream": stream, "text": text})
+    
+    def get_log(self) -> str:
+        """Get the log recorded so far."""
+        log = "".join(self.log_parts)
+        return log + "\n[log truncated]\n" if self.log_truncated else log
+    
+    @property
+    def finished(self) -> bool:
+        """Whether the job has reached its final status."""
+        return self.status in FINAL_JOB_STATUSES
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Describe the job (without its log)."""
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "created_at": self.created_at,
+            "result": self.result
+        }
+
+# Runs a job and returns its result; a result with "success": False marks the job failed
+JobHandler = Callable[[Job], Awaitable[Dict[str, Any]]]
+
+class JobQueue:
+    """
+    Runs queued jobs on a fixed number of asyncio workers.
+
+    Jobs are stored in SQLite when submitted, so queued work survives a
+    restart; jobs that were running when the server stopped are queued
+    again. Each user has their own FIFO queue. Workers pick the next user
+    by priority (users holding the current slot first) and then round
+    robin, so one user submitting many jobs cannot starve everyone else.
+    """
+    
+    def __init__(self, workers: int, max_queued_per_user: int, max_log_bytes: int, subscriber_queue_size: int):
+        self.worker_count = workers
+        self.max_queued_per_user = max_queued_per_user
+        self.max_log_bytes = max_log_bytes
+        self.subscriber_queue_size = subscriber_queue_size
+        self.handlers: Dict[str, JobHandler] = {}
+        self.jobs: Dict[str, Job] = {}  # Queued and running jobs
+        self.user_queues: Dict[str, Deque[Job]] = {}
+        self.last_served: Dict[str, int] = {}
+        self.dispatch_count = 0
+        self.condition: Optional[asyncio.Condition] = None
+        self.workers: List[asyncio.Task] = []
+        self.stopping = False
+        self.stats = {
+            "submitted": 0,
+            "succeeded": 0,
+            "failed": 0,
+            "cancelled": 0,
+        }
+    
+    def register_handler(self, kind: str, handler: JobHandler) -> None:
+        """Register the coroutine that runs jobs of a kind."""
+        self.handlers[kind] = handler
+    
+    @staticmethod
+    def get_priority(user_email: str) -> int:
+        """Higher runs first: the holder of the current slot is about to use a device."""
+        return 1 if is_slot_booked_by(datetime.now().hour, user_email) else 0
+    
+    def _enqueue(self, job: Job) -> None:
+        """Add a job to its user's queue."""
+        self.jobs[job.id] = job
+        self.user_queues.setdefault(job.user_email, deque()).append(job)
+    
+    def _dispatch_order(self) -> List[Job]:
+        """Order in which the currently queued jobs would be picked."""
+        queues = {user: list(queue) for user, queue in self.user_queues.items() if queue}
+        last_served = dict(self.last_served)
+        priorities = {user: self.get_priority(user) for user in queues}
+        order = []
+        counter = self.dispatch_count
+        while queues:
+            user = min(queues, key=lambda user: (-priorities[user], last_served.get(user, -1)))
+            order.append(queues[user].pop(0))
+            if not queues[user]:
+                del queues[user]
+            counter += 1
+            last_served[user] = counter
+        return order
+    
+    def _pick(self) -> Optional[Job]:
+        """Take the next job to run. Caller holds the condition."""
+        order = self._dispatch_order()
+        if not order:
+            return None
+        job = order[0]
+        self.user_queues[job.user_email].popleft()
+        if not self.user_queues[job.user_email]:
+            del self.user_queues[job.user_email]
+        self.dispatch_count += 1
+        self.last_served[job.user_email] = self.dispatch_count
+        return job
+    
+    def _has_queued(self) -> bool:
+        """Check whether any job is waiting."""
+        return any(self.user_queues.values())
+    
+    async def start(self) -> None:
+        """Reload queued jobs from the database and start the workers."""
+        if self.workers:
+            return
+        self.stopping = False
+        self.condition = asyncio.Condition()
+        self.jobs.clear()
+        self.user_queues.clear()
+        
+        for row in await run_db(requeue_interrupted_jobs):
+            self._enqueue(Job(row["id"], row["kind"], row["user_email"], json.loads(row["payload"]),
+                              self.max_log_bytes, row["created_at"]))
+        
+        self.workers = [
+            asyncio.create_task(self._worker(), name=f"job-worker-{index}")
+            for index in range(self.worker_count)
+        ]
+        logger.info(f"Job queue started with {self.worker_count} workers, {len(self.jobs)} jobs queued")
+    
+    async def stop(self) -> None:
+        """Stop the workers. Running jobs stay marked running and are requeued on the next start."""
+        self.stopping = True
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+    
+    async def submit(self, kind: str, user_email: str, payload: Dict[str, Any], job_id: str) -> Job:
+        """Persist and queue a job. Raises ValueError if it cannot be accepted."""
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        if len(self.user_queues.get(user_email, ())) >= self.max_queued_per_user:
+            raise ValueError(f"You already have {self.max_queued_per_user} jobs queued")
+        if not await run_db(create_job, job_id, kind, user_email, json.dumps(payload)):
+            raise ValueError("Failed to store job")
+        
+        job = Job(job_id, kind, user_email, payload, self.max_log_bytes)
+        async with self.condition:
+            self._enqueue(job)
+            self.condition.notify()
+        self.stats["submitted"] += 1
+        logger.info(f"Queued {kind} job {job_id} for {user_email}")
+        return job
+    
+    async def _worker(self) -> None:
+        """Take jobs off the queue and run them one at a time."""
+        while True:
+            async with self.condition:
+                await self.condition.wait_for(self._has_queued)
+                job = self._pick()
+            if job is None:
+                continue
+            
+            job.task = asyncio.create_task(self._execute(job))
+            try:
+                await asyncio.shield(job.task)
+            except asyncio.CancelledError:
+                if self.stopping:
+                    # Worker is being stopped; stop the job with it
+                    job.task.cancel()
+                    await asyncio.gather(job.task, return_exceptions=True)
+                    raise
+                # Only the job's task was cancelled; this worker keeps serving the queue
+                if self.jobs.pop(job.id, None) is not None:
+                    logger.warning(f"Job {job.id} was cancelled before it could finish")
+    
+    async def _execute(self, job: Job) -> None:
+        """Run one job and record its outcome."""
+        if not await run_db(mark_job_started, job.id):
+            logger.warning(f"Job {job.id} could not be started")
+            self.jobs.pop(job.id, None)
+            return
+        
+        job.status = "running"
+        job.publish({"type": "status", "status": job.status})
+        output_sink.set(job.append_log)
+        
+        try:
+            result = await self.handlers[job.kind](job)
+            status = "succeeded" if result.get("success") else "failed"
+        except asyncio.CancelledError:
+            if self.stopping:
+                raise  # Left as running in the database, requeued on restart
+            status = "cancelled"
+            result = {"success": False, "message": "Job cancelled"}
+        except Exception as e:
+            logger.error(f"Job {job.id} failed: {e}")
+            status = "failed"
+            result = {"success": False, "message": f"Job error: {str(e)}"}
+        
+        await self._finish(job, status, result)
+    
+    async def _finish(self, job: Job, status: str, result: Dict[str, Any]) -> None:
+        """Persist a finished job and notify its subscribers."""
+        job.status = status
+        job.result = result
+        # The job is final from here on, so a cancel arriving now must not lose the write
+        await asyncio.shield(run_db(mark_job_finished, job.id, status, json.dumps(result), job.get_log()))
+        self.jobs.pop(job.id, None)
+        self.stats[status] += 1
+        job.publish({"type": "status", "status": status, "result": result})
+        logger.info(f"Job {job.id} {status}")
+    
+    async def cancel(self, job_id: str) -> bool:
+        """Cancel a queued or running job. Returns False if it is not active."""
+        job = self.jobs.get(job_id)
+        if job is None or job.finished:
+            return False
+        
+        if job.status == "queued":
+            async with self.condition:
+                queue = self.user_queues.get(job.user_email)
+                if queue is None or job not in queue:
+                    return False
+                queue.remove(job)
+                if not queue:
+                    del self.user_queues[job.user_email]
+            await self._finish(job, "cancelled", {"success": False, "message": "Job cancelled"})
+            return True
+        
+        if job.task is not None:
+            job.task.cancel()
+        return True
+    
+    def get_active_job(self, job_id: str) -> Optional[Job]:
+        """Get a queued or running job."""
+        return self.jobs.get(job_id)
+    
+    def get_position(self, job_id: str) -> Optional[int]:
+        """Number of jobs that will be dispatched before a queued job, or None."""
+        for position, job in enumerate(self._dispatch_order()):
+            if job.id == job_id:
+                return position
+        return None
+    
+    async def get_job_info(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Describe a job, whether active or finished, including its log."""
+        job = self.jobs.get(job_id)
+        if job is not None:
+            return {
+                **job.to_dict(),
+                "user_email": job.user_email,
+                "position": self.get_position(job_id) if job.status == "queued" else None,
+                "log": job.get_log()
+            }
+        
+        row = await run_db(get_job, job_id)
+        if row is None:
+            return None
+        return {
+            "id": row["id"],
+            "kind": row["kind"],
+            "status": row["status"],
+            "created_at": row["created_at"],
+            "started_at": row["started_at"],
+            "finished_at": row["finished_at"],
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "user_email": row["user_email"],
+            "position": None,
+            "log": row["log"] or ""
+        }
+    
+    def subscribe(self, job: Job) -> asyncio.Queue:
+        """Subscribe to a job's log and status events."""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.subscriber_queue_size)
+        job.subscribers.add(queue)
+        return queue
+    
+    def unsubscribe(self, job: Job, queue: asyncio.Queue) -> None:
+        """Stop receiving a job's events."""
+        job.subscribers.discard(queue)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get queue counters."""
+        return {
+            **self.stats,
+            "queued": sum(len(queue) for queue in self.user_queues.values()),
+            "running": sum(1 for job in self.jobs.values() if job.status == "running"),
+            "workers": len(self.workers)
+        }
+
+# Global job queue instance
+job_queue = JobQueue(
+    JOB_CONFIG["workers"],
+    JOB_CONFIG["max_queued_per_user"],
+    JOB_CONFIG["max_log_bytes"],
+    JOB_CONFIG["subscriber_queue_size"]
+)
@@ -0,0 +1,200 @@
+"""Cached registry of connected serial devices with background hot-plug scanning."""
+
+import os
+import threading
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from core.config import SERIAL_CONFIG
+from device_handler.get_devices import detect_serial_devices
+from database.operations import upsert_devices, set_device_alias, touch_devices
+
+logger = logging.getLogger(__name__)
+
+# Called with the new device list whenever the set of connected devices changes
+DeviceSubscriber = Callable[[List[Dict[str, Any]]], None]
+
+def device_identity(device: Dict[str, Any]) -> str:
+    """
+    Stable identity for a device: vid:pid:serial when the board reports a USB
+    serial number, otherwise the port path (clones without serial numbers
+    can only be told apart by where they are plugged in).
+    """
+    if device.get("serial_number") and device.get("vid") and device.get("pid"):
+        return f"{device['vid']}:{device['pid']}:{device['serial_number']}"
+    return f"port:{device['port']}"
+
+class DeviceRegistry:
+    """
+    Keeps an in-memory snapshot of connected serial devices.
+
+    A background thread rescans periodically, but only enumerates USB ports
+    when the /dev directory changed (device nodes were added or removed) or
+    a full rescan interval has passed. Request paths read the snapshot
+    without touching sysfs.
+
+    Every device is recorded in the devices table and addressed by its
+    stable database ID, so replugging a board or enumerating ports in a
+    different order does not change which device a client is talking to.
+    """
+    
+    def __init__(self, scan_interval: float, full_rescan_interval: float, watch_dir: str = "/dev"):
+        self.scan_interval = scan_interval
+        self.full_rescan_interval = full_rescan_interval
+        self.watch_dir = watch_dir
+        # Replaced atomically on change, so readers need no lock
+        self.detected: Tuple[Dict[str, Any], ...] = ()
+        self.devices: Tuple[Dict[str, Any], ...] = ()
+        self.devices_by_id: Dict[int, Dict[str, Any]] = {}
+        self.devices_by_port: Dict[str, Dict[str, Any]] = {}
+        self.subscribers: List[DeviceSubscriber] = []
+        self.scanned = False
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+        self.last_dir_mtime: Optional[int] = None
+    
+    def _dir_mtime(self) -> Optional[int]:
+        """Modification time of the watched directory, or None if unavailable."""
+        try:
+            return os.stat(self.watch_dir).st_mtime_ns
+        except OSError:
+            return None
+    
+    def _identify(self, detected: Tuple[Dict[str, Any], ...]) -> Tuple[Dict[str, Any], ...]:
+        """Attach identities, then stable IDs and aliases from the database."""
+        devices = []
+        seen = set()
+        for device in detected:
+            identity = device_identity(device)
+            if identity in seen:
+                # Clones sometimes share a serial number; fall back to the port
+                identity = f"port:{device['port']}"
+            seen.add(identity)
+            devices.append({**device, "identity": identity})
+        
+        records = upsert_devices(devices)
+        for device in devices:
+            record = records.get(device["identity"], {})
+            device["id"] = record.get("id")
+            device["alias"] = record.get("alias")
+        return tuple(devices)
+    
+    def _publish(self, devices: Tuple[Dict[str, Any], ...]) -> None:
+        """Replace the snapshot and its lookup tables. Caller holds the lock."""
+        self.devices = devices
+        self.devices_by_id = {device["id"]: device for device in devices if device["id"] is not None}
+        self.devices_by_port = {device["port"]: device for device in devices}
+    
+    def scan(self) -> bool:
+        """Enumerate devices now. Returns True if the device list changed."""
+        with self.lock:
+            self.last_dir_mtime = self._dir_mtime()
+            detected = tuple(detect_serial_devices())
+            changed = detected != self.detected
+            previous = {device["identity"] for device in self.devices}
+            if changed:
+                self.detected = detected
+                self._publish(self._identify(detected))
+                # Devices that just disappeared were last seen now, not at the previous change
+                touch_devices(sorted(previous - {device["identity"] for device in self.devices}))
+            else:
+                # Keep last_seen current for devices that stay plugged in
+                touch_devices(sorted(previous))
+            devices = self.devices
+            self.scanned = True
+            subscribers = list(self.subscribers)
+        
+        if changed:
+            logger.info(f"Device list changed: {len(devices)} device(s) connected")
+            for subscriber in subscribers:
+                try:
+                    subscriber(list(devices))
+                except Exception as e:
+                    logger.error(f"Error in device registry subscriber: {e}")
+        return changed
+    
+    def _ensure_scanned(self) -> None:
+        """Scan once for callers that run before the registry is started."""
+        if not self.scanned:
+            self.scan()
+    
+    def get_devices(self) -> List[Dict[str, Any]]:
+        """Get the current device list."""
+        self._ensure_scanned()
+        return list(self.devices)
+    
+    def get_device(self, device_id: int) -> Optional[Dict[str, Any]]:
+        """Get a connected device by its stable ID, or None if not connected."""
+        self._ensure_scanned()
+        return self.devices_by_id.get(device_id)
+    
+    def get_device_by_port(self, port: str) -> Optional[Dict[str, Any]]:
+        """Get a device by its port path."""
+        self._ensure_scanned()
+        return self.devices_by_port.get(port)
+    
+    def get_count(self) -> int:
+        """Get the number of connected devices."""
+        self._ensure_scanned()
+        return len(self.devices)
+    
+    def set_alias(self, device_id: int, alias: Optional[str]) -> bool:
+        """Set or clear a device alias. Returns False if the device is unknown."""
+        if not set_device_alias(device_id, alias):
+            return False
+        
+        with self.lock:
+            if device_id in self.devices_by_id:
+                self._publish(tuple(
+                    {**device, "alias": alias} if device["id"] == device_id else device
+                    for device in self.devices
+                ))
+        return True
+    
+    def subscribe(self, subscriber: DeviceSubscriber) -> None:
+        """Register a callback for device list changes (called on the scanner thread)."""
+        with self.lock:
+            self.subscribers.append(subscriber)
+    
+    def unsubscribe(self, subscriber: DeviceSubscriber) -> None:
+        """Remove a device list change callback."""
+        with self.lock:
+            try:
+                self.subscribers.remove(subscriber)
+            except ValueError:
+                pass  # Subscriber not found
+    
+    def _scan_loop(self) -> None:
+        """Background loop: rescan on /dev changes or after the full rescan interval."""
+        since_full_scan = 0.0
+        while not self.stop_event.wait(self.scan_interval):
+            since_full_scan += self.scan_interval
+            try:
+                if self._dir_mtime() != self.last_dir_mtime or since_full_scan >= self.full_rescan_interval:
+                    since_full_scan = 0.0
+                    self.scan()
+            except Exception as e:
+                logger.error(f"Error scanning serial devices: {e}")
+    
+    def start(self) -> None:
+        """Scan immediately and start background scanning."""
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.scan()
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._scan_loop, name="device-registry", daemon=True)
+        self.thread.start()
+        logger.info("Device registry started")
+    
+    def stop(self) -> None:
+        """Stop background scanning."""
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=2.0)
+            self.thread = None
+
+# Global device registry instance
+device_registry = DeviceRegistry(
+    SERIAL_CONFIG["scan_interval_seconds"],
+    SERIAL_CONFIG["full_rescan_interval_seconds"]
+)
@@ -0,0 +1,71 @@
+"""Fixed-capacity byte ring buffer for serial output."""
+
+import threading
+from typing import Optional, Tuple
+
+class SerialRingBuffer:
+    """
+    Byte ring buffer addressed by absolute offsets.
+
+    Offsets count every byte ever written, so a reader can ask for
+    "everything after offset N" even after the buffer has wrapped. Appends
+    cost O(len(data)) regardless of capacity.
+    """
+    
+    def __init__(self, capacity: int):
+        if capacity <= 0:
+            raise ValueError("Ring buffer capacity must be positive")
+        self.capacity = capacity
+        self.buffer = bytearray(capacity)
+        self.end_offset = 0  # Absolute offset one past the last byte written
+        self.floor_offset = 0  # Nothing before this offset is readable (moved by clear)
+        self.lock = threading.Lock()
+    
+    @property
+    def start_offset(self) -> int:
+        """Absolute offset of the oldest byte still held."""
+        return max(self.floor_offset, self.end_offset - self.capacity)
+    
+    def append(self, data: bytes) -> int:
+        """Append data and return the new end offset."""
+        with self.lock:
+            if len(data) >= self.capacity:
+                # Only the tail fits; keep it aligned to its absolute position
+                self.end_offset += len(data) - self.capacity
+                data = data[-self.capacity:]
+            
+            position = self.end_offset % self.capacity
+            first = min(len(data), self.capacity - position)
+            self.buffer[position:position + first] = data[:first]
+            if first < len(data):
+                self.buffer[0:len(data) - first] = data[first:]
+            
+            self.end_offset += len(data)
+            return self.end_offset
+    
+    def read(self, since_offset: Optional[int] = None) -> Tuple[bytes, int, int]:
+        """
+        Read bytes after since_offset (or everything held).
+        Returns (data, start_offset, end_offset) where start_offset is where
+        the returned data begins; it is later than since_offset if the
+        requested bytes have already been overwritten.
+        """
+        with self.lock:
+            start = self.start_offset
+            if since_offset is not None:
+                start = min(max(since_offset, start), self.end_offset)
+            
+            length = self.end_offset - start
+            position = start % self.capacity
+            first = min(length, self.capacity - position)
+            view = memoryview(self.buffer)
+            if first == length:
+                data = bytes(view[position:position + length])
+            else:
+                data = bytes(view[position:]) + bytes(view[:length - first])
+            return data, start, self.end_offset
+    
+    def clear(self) -> None:
+        """Discard all held data; offsets keep increasing."""
+        with self.lock:
+            self.floor_offset = self.end_offset
@@ -1,64 +1,118 @@
 """Serial device manager for reading Arduino output with WebSocket integration."""
 
+import os
 import serial
+import selectors
 import threading
-import time
 import logging
-from typing import Dict, Optional, List, Callable
+from collections import deque
+from typing import Deque, Dict, Optional, List, Callable, Tuple
 from concurrent.futures import ThreadPoolExecutor
+from core.config import SERIAL_CONFIG
+from device_handler.ring_buffer import SerialRingBuffer
 
 logger = logging.getLogger(__name__)
 
+# Called with (new_output, start_offset, end_offset) for each chunk appended to a device's output
+OutputCallback = Callable[[str, int, int], None]
+
 class SerialDeviceManager:
-    """Manages serial connections and output reading for multiple devices."""
+    """
+    Manages serial connections and output reading for multiple devices.
+
+    A single reader thread multiplexes every open port with a selector and
+    sleeps until one of them has data, so idle devices cost no wakeups.
+    Ports must expose a file descriptor (POSIX serial devices and ptys).
+    """
     
-    def __init__(self):
+    def __init__(self, buffer_capacity: int = SERIAL_CONFIG["output_buffer_bytes"]):
+        self.buffer_capacity = buffer_capacity
         self.serial_connections: Dict[int, serial.Serial] = {}
-        self.serial_outputs: Dict[int, str] = {}
-        self.reading_threads: Dict[int, threading.Thread] = {}
-        self.stop_flags: Dict[int, threading.Event] = {}
-        self.output_callbacks: Dict[int, List[Callable[[str], None]]] = {}
+        self.serial_outputs: Dict[int, SerialRingBuffer] = {}
+        self.line_buffers: Dict[int, bytes] = {}
+        self.output_callbacks: Dict[int, List[OutputCallback]] = {}
         self.lock = threading.RLock()
         self.executor = ThreadPoolExecutor(max_workers=10)
+        
+        # Reader thread state; registrations are handed over via a command queue
+        self.selector: Optional[selectors.BaseSelector] = None
+        self.reader_thread: Optional[threading.Thread] = None
+        self.commands: Deque[Tuple[str, int, Optional[serial.Serial], threading.Event]] = deque()
+        self.commands_lock = threading.Lock()
+        self.wakeup_read_fd: Optional[int] = None
+        self.wakeup_write_fd: Optional[int] = None
+    
+    def _ensure_reader_thread(self) -> None:
+        """Start the shared reader thread on first use."""
+        with self.commands_lock:
+            if self.reader_thread is not None and self.reader_thread.is_alive():
+                return
+            
+            self.selector = selectors.DefaultSelector()
+            self.wakeup_read_fd, self.wakeup_write_fd = os.pipe()
+            os.set_blocking(self.wakeup_read_fd, False)
+            os.set_blocking(self.wakeup_write_fd, False)
+            self.selector.register(self.wakeup_read_fd, selectors.EVENT_READ, None)
+            
+            self.reader_thread = threading.Thread(
+                target=self._reader_loop,
+                args=(self.selector, self.wakeup_read_fd),
+                name="serial-reader",
+                daemon=True
+            )
+            self.reader_thread.start()
+            logger.info("Started serial reader thread")
+    
+    def _submit_command(self, action: str, device_index: int,
+                        serial_conn: Optional[serial.Serial] = None) -> threading.Event:
+        """Queue a registration change for the reader thread and wake it up."""
+        done = threading.Event()
+        with self.commands_lock:
+            wakeup_fd = self.wakeup_write_fd
+            if wakeup_fd is None:
+                # No reader thread, so nothing is registered
+                done.set()
+                return done
+            self.commands.append((action, device_index, serial_conn, done))
+        
+        try:
+            os.write(wakeup_fd, b"\0")
+        except BlockingIOError:
+            pass  # Pipe already full, so the reader is already going to wake up
+        return done
     
     def start_reading_device(self, device_index: int, port: str, baud_rate: int = 9600) -> bool:
         """Start reading from a serial device."""
         try:
             logger.info(f"Starting reading for device {device_index} on port {port} with baud rate {baud_rate}")
+            # Stop existing connection if any (waits for the reader, so not under the lock)
+            self.stop_reading_device(device_index)
+            self._ensure_reader_thread()
+            
             with self.lock:
-                logger.info(f"Acquired lock for device {device_index}")
-                # Stop existing connection if any
-                self.stop_reading_device(device_index)
-                logger.info(f"Stopped any existing reading for device {device_index}")
-                # Initialize device data
-                self.serial_outputs[device_index] = ""
+                # Initialize device data, keeping an existing buffer so offsets stay absolute
+                if device_index in self.serial_outputs:
+                    self.serial_outputs[device_index].clear()
+                else:
+                    self.serial_outputs[device_index] = SerialRingBuffer(self.buffer_capacity)
+                self.line_buffers[device_index] = b""
                 self.output_callbacks[device_index] = []
-                self.stop_flags[device_index] = threading.Event()
                 
                 # Create serial connection
                 serial_conn = serial.Serial(
                     port=port,
                     baudrate=baud_rate,
-                    timeout=1,
+                    timeout=0,
                     parity=serial.PARITY_NONE,
                     stopbits=serial.STOPBITS_ONE,
                     bytesize=serial.EIGHTBITS
                 )
                 
                 self.serial_connections[device_index] = serial_conn
-                
-                # Start reading thread
-                logger.info(f"Starting reading thread for device {device_index} on port {port}")
-                thread = threading.Thread(
-                    target=self._read_serial_loop,
-                    args=(device_index, serial_conn),
-                    daemon=True
-                )
-                thread.start()
-                self.reading_threads[device_index] = thread
-                
-                logger.info(f"Started reading from device {device_index} on port {port}")
-                return True
+            
+            self._submit_command("add", device_index, serial_conn)
+            logger.info(f"Started reading from device {device_index} on port {port}")
+            return True
                 
         except Exception as e:
             logger.error(f"Failed to start reading device {device_index}: {e}")
@@ -66,42 +120,35 @@ class SerialDeviceManager:
     
     def stop_reading_device(self, device_index: int) -> bool:
         """Stop reading from a serial device."""
-        thread_to_join = None
         serial_conn_to_close = None
         try:
             with self.lock:
-                logger.info(f"Acquired lock to stop reading device {device_index}")
                 if device_index not in self.serial_connections:
                     return True # Already stopped or never started
-
-                # Set stop flag
-                if device_index in self.stop_flags:
-                    self.stop_flags[device_index].set()
                 
-                # Get connection and thread to handle outside the lock
+                # Get connection to handle outside the lock
                 serial_conn_to_close = self.serial_connections.pop(device_index, None)
-                thread_to_join = self.reading_threads.pop(device_index, None)
                 
                 # Clear data
                 if device_index in self.serial_outputs:
-                    self.serial_outputs[device_index] = ""
+                    self.serial_outputs[device_index].clear()
+                
+                self.line_buffers.pop(device_index, None)
                 
                 if device_index in self.output_callbacks:
                     del self.output_callbacks[device_index]
-                
-                if device_index in self.stop_flags:
-                    del self.stop_flags[device_index]
-
-            # Perform blocking operations outside the lock
+            
+            # Unregister from the reader before closing so it never reads a closed fd
+            done = self._submit_command("remove", device_index, serial_conn_to_close)
+            if threading.current_thread() is not self.reader_thread:
+                done.wait(timeout=2.0)
+            
             if serial_conn_to_close:
                 try:
                     serial_conn_to_close.close()
                 except Exception as e:
                     logger.warning(f"Error closing serial connection {device_index}: {e}")
-
-            if thread_to_join and thread_to_join.is_alive():
-                thread_to_join.join(timeout=2.0)
-
+            
             logger.info(f"Stopped reading from device {device_index}")
             return True
                 
@@ -112,22 +159,36 @@ class SerialDeviceManager:
     def reset_device_output(self, device_index: int) -> None:
         """Reset the serial output for a device."""
         with self.lock:
-            self.serial_outputs[device_index] = ""
+            if device_index in self.serial_outputs:
+                self.serial_outputs[device_index].clear()
+            else:
+                self.serial_outputs[device_index] = SerialRingBuffer(self.buffer_capacity)
             logger.info(f"Reset output for device {device_index}")
     
+    def read_device_output(self, device_index: int, since_offset: Optional[int] = None) -> Tuple[bytes, int, int]:
+        """
+        Read raw serial output for a device after an absolute byte offset.
+        Returns (data, start_offset, end_offset); see SerialRingBuffer.read.
+        """
+        with self.lock:
+            output_buffer = self.serial_outputs.get(device_index)
+        if output_buffer is None:
+            return b"", 0, 0
+        return output_buffer.read(since_offset)
+    
     def get_device_output(self, device_index: int) -> str:
         """Get the current serial output for a device."""
-        with self.lock:
-            return self.serial_outputs.get(device_index, "")
+        data, _, _ = self.read_device_output(device_index)
+        return data.decode('utf-8', errors='ignore')
     
-    def add_output_callback(self, device_index: int, callback: Callable[[str], None]) -> None:
-        """Add a callback to be called when device output is updated."""
+    def add_output_callback(self, device_index: int, callback: OutputCallback) -> None:
+        """Add a callback to be called with each new chunk of device output."""
         with self.lock:
             if device_index not in self.output_callbacks:
                 self.output_callbacks[device_index] = []
             self.output_callbacks[device_index].append(callback)
     
-    def remove_output_callback(self, device_index: int, callback: Callable[[str], None]) -> None:
+    def remove_output_callback(self, device_index: int, callback: OutputCallback) -> None:
         """Remove an output callback for a device."""
         with self.lock:
             if device_index in self.output_callbacks:
@@ -142,59 +203,118 @@ class SerialDeviceManager:
             return (device_index in self.serial_connections and 
                     self.serial_connections[device_index].is_open)
     
-    def _read_serial_loop(self, device_index: int, serial_conn: serial.Serial) -> None:
-        """Main loop for reading serial data from a device."""
-        buffer = ""
+    def _apply_commands(self, selector: selectors.BaseSelector) -> None:
+        """Apply queued registration changes. Runs on the reader thread."""
+        with self.commands_lock:
+            commands, self.commands = self.commands, deque()
         
+        for action, device_index, serial_conn, done in commands:
+            try:
+                if action == "add" and serial_conn is not None and serial_conn.is_open:
+                    selector.register(serial_conn.fileno(), selectors.EVENT_READ, (device_index, serial_conn))
+                elif action == "remove" and serial_conn is not None:
+                    selector.unregister(serial_conn.fileno())
+            except (KeyError, ValueError, OSError) as e:
+                logger.warning(f"Could not {action} device {device_index} in serial selector: {e}")
+            finally:
+                done.set()
+    
+    def _reader_loop(self, selector: selectors.BaseSelector, wakeup_fd: int) -> None:
+        """Wait for data on any registered port and dispatch it. Runs until shutdown."""
         try:
-            while not self.stop_flags[device_index].is_set():
-                try:
-                    if serial_conn.in_waiting > 0:
-                        # Read available data
-                        data = serial_conn.read(serial_conn.in_waiting).decode('utf-8', errors='ignore')
-                        buffer += data
-                        
-                        # Process complete lines
-                        while '\n' in buffer:
-                            line, buffer = buffer.split('\n', 1)
-                            line = line.strip()
-                            
-                            if line:  # Only process non-empty lines
-                                self._update_device_output(device_index, line + '\n')
-                    
-                    # Small delay to prevent excessive CPU usage
-                    time.sleep(0.01)
+            while True:
+                for key, _ in selector.select():
+                    if key.data is None:
+                        # Wakeup pipe: drain it and apply registration changes
+                        try:
+                            while os.read(wakeup_fd, 4096):
+                                pass
+                        except BlockingIOError:
+                            pass
+                        self._apply_commands(selector)
+                        if self.wakeup_write_fd is None:
+                            return
+                        continue
                     
-                except serial.SerialException as e:
-                    logger.error(f"Serial error for device {device_index}: {e}")
-                    break
-                except Exception as e:
-                    logger.error(f"Unexpected error reading device {device_index}: {e}")
-                    break
-        
+                    device_index, serial_conn = key.data
+                    self._read_available(selector, key.fd, device_index, serial_conn)
         except Exception as e:
-            logger.error(f"Fatal error in serial reading loop for device {device_index}: {e}")
-        
+            logger.error(f"Fatal error in serial reader thread: {e}")
         finally:
-            logger.info(f"Serial reading loop ended for device {device_index}")
+            selector.close()
+            os.close(wakeup_fd)
+            logger.info("Serial reader thread ended")
     
-    def _update_device_output(self, device_index: int, new_data: str) -> None:
+    def _read_available(self, selector: selectors.BaseSelector, fd: int, device_index: int,
+                        serial_conn: serial.Serial) -> None:
+        """Read whatever a ready port has and process complete lines."""
+        with self.lock:
+            if self.serial_connections.get(device_index) is not serial_conn:
+                return  # Stopped; its removal command is already queued
+        
+        try:
+            data = os.read(fd, 4096)
+            if not data:
+                raise OSError("device closed")
+        except BlockingIOError:
+            return
+        except OSError as e:
+            logger.error(f"Serial error for device {device_index}: {e}")
+            try:
+                selector.unregister(fd)
+            except (KeyError, ValueError):
+                pass
+            self._drop_connection(device_index, serial_conn)
+            return
+        
+        with self.lock:
+            if self.serial_connections.get(device_index) is not serial_conn:
+                return  # Stopped or replaced while the data was in flight
+            buffer = self.line_buffers.get(device_index, b"") + data
+            
+            # Process complete lines
+            *lines, self.line_buffers[device_index] = buffer.split(b'\n')
+        
+        for line in lines:
+            line = line.strip()
+            if line:  # Only process non-empty lines
+                self._update_device_output(device_index, line + b'\n')
+    
+    def _drop_connection(self, device_index: int, serial_conn: serial.Serial) -> None:
+        """Forget a connection whose port failed (e.g. the board was unplugged)."""
+        with self.lock:
+            if self.serial_connections.get(device_index) is serial_conn:
+                del self.serial_connections[device_index]
+                self.line_buffers.pop(device_index, None)
+        try:
+            serial_conn.close()
+        except Exception:
+            pass
+        logger.info(f"Serial reading ended for device {device_index}")
+    
+    def _update_device_output(self, device_index: int, new_data: bytes) -> None:
         """Update device output and notify callbacks."""
         try:
             with self.lock:
-                # Append new data to output (keep last 10000 characters)
-                current_output = self.serial_outputs.get(device_index, "")
-                updated_output = (current_output + new_data)[-10000:]
-                self.serial_outputs[device_index] = updated_output
-                
+                output_buffer = self.serial_outputs.get(device_index)
                 # Get callbacks to notify
                 callbacks = self.output_callbacks.get(device_index, []).copy()
             
+            if output_buffer is None:
+                return
+            # The ring buffer has its own lock, so appends don't hold the manager lock
+            end_offset = output_buffer.append(new_data)
+            start_offset = end_offset - len(new_data)
+            
+            if not callbacks:
+                return
+            new_output = new_data.decode('utf-8', errors='ignore')
+            
             # Notify callbacks outside of lock to prevent deadlock
             for callback in callbacks:
                 try:
                     # Execute callback in thread pool to avoid blocking
-                    callback(updated_output)
+                    callback(new_output, start_offset, end_offset)
                 except Exception as e:
                     logger.error(f"Error in output callback for device {device_index}: {e}")
                     
@@ -202,11 +322,20 @@ class SerialDeviceManager:
             logger.error(f"Error updating device output for device {device_index}: {e}")
     
     def stop_all_devices(self) -> None:
-        """Stop reading from all devices."""
+        """Stop reading from all devices and shut down the reader thread."""
         device_indices = list(self.serial_connections.keys())
         for device_index in device_indices:
             self.stop_reading_device(device_index)
         
+        with self.commands_lock:
+            wakeup_fd, self.wakeup_write_fd = self.wakeup_write_fd, None
+            reader_thread = self.reader_thread
+        if wakeup_fd is not None:
+            os.write(wakeup_fd, b"\0")
+            os.close(wakeup_fd)
+        if reader_thread is not None and reader_thread is not threading.current_thread():
+            reader_thread.join(timeout=2.0)
+        
         # Shutdown executor
         self.executor.shutdown(wait=True)
 
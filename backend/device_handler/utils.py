@@ -1,12 +1,31 @@
 """Helper utilities for device management."""
 
 import os
+import re
+import time
 import shutil
+import asyncio
+import threading
 import logging
-from typing import Dict, List, Optional
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
+# Written into a core cache once a compile has populated it
+CORE_CACHE_READY_MARKER = ".ready"
+
+def directory_size(path: str) -> int:
+    """Total size in bytes of the files under a directory."""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass  # File vanished while walking
+    return total
+
 class ArduinoBoardConfig:
     """Configuration for Arduino board types."""
     
@@ -42,10 +61,139 @@ class ArduinoBoardConfig:
         return model in cls.BOARD_CONFIGS
 
 class CodeManager:
-    """Manages code compilation and file operations."""
+    """
+    Manages code compilation and file operations.
+
+    Besides throwaway project directories, it keeps persistent arduino-cli
+    caches under ``<base_data_dir>/arduino_cache/<fqbn>``: a core cache
+    (compiled core.a archives) shared by every compile for that board, and
+    a small pool of build directories that are leased to one compile at a
+    time so library and core objects are reused between requests.
+    """
     
-    def __init__(self, base_data_dir: str = "./data"):
+    def __init__(self, base_data_dir: str = "./data", cache_max_bytes: int = 2 * 1024 ** 3, build_dirs_per_fqbn: int = 2):
         self.base_data_dir = base_data_dir
+        self.cache_dir = os.path.abspath(os.path.join(base_data_dir, "arduino_cache"))
+        self.cache_max_bytes = cache_max_bytes
+        self.build_dirs_per_fqbn = build_dirs_per_fqbn
+        # All keyed by the board's cache directory name
+        self.free_build_dirs: Dict[str, List[str]] = {}
+        self.build_dir_counts: Dict[str, int] = {}
+        self.active_compiles: Dict[str, int] = {}
+        self.last_used: Dict[str, float] = {}
+        self.cache_sizes: Dict[str, int] = {}
+        self.warmup_locks: Dict[str, asyncio.Lock] = {}
+        self.lock = threading.Lock()
+    
+    @staticmethod
+    def _cache_name(fqbn: str) -> str:
+        """Filesystem-safe cache directory name for a board."""
+        return re.sub(r"[^A-Za-z0-9_.-]", "_", fqbn)
+    
+    def _lease_build_dir(self, name: str) -> Optional[str]:
+        """Take a free persistent build directory for a board, or None if all are busy."""
+        free = self.free_build_dirs.setdefault(name, [])
+        if free:
+            return free.pop()
+        count = self.build_dir_counts.get(name, 0)
+        if count >= self.build_dirs_per_fqbn:
+            return None
+        self.build_dir_counts[name] = count + 1
+        return os.path.join(self.cache_dir, name, f"build-{count}")
+    
+    @staticmethod
+    def _core_cache_ready(core_cache_dir: str) -> bool:
+        """Check whether a compile has already populated a core cache."""
+        return os.path.exists(os.path.join(core_cache_dir, CORE_CACHE_READY_MARKER))
+    
+    @asynccontextmanager
+    async def build_environment(self, fqbn: str, project_dir: str) -> AsyncIterator[Tuple[str, str]]:
+        """
+        Provide (build_path, core_cache_path) for one compile.
+
+        The first compile for a board runs alone so concurrent compiles never
+        race to write the same core archive; once the core cache is populated
+        compiles share it freely. If every pooled build directory is busy the
+        compile gets a private one inside its project directory.
+        """
+        name = self._cache_name(fqbn)
+        core_cache_dir = os.path.join(self.cache_dir, name, "core")
+        with self.lock:
+            self.active_compiles[name] = self.active_compiles.get(name, 0) + 1
+            build_dir = self._lease_build_dir(name)
+        leased = build_dir is not None
+        if not leased:
+            build_dir = os.path.join(project_dir, "build-path")
+        
+        warmup_lock = None
+        try:
+            os.makedirs(core_cache_dir, exist_ok=True)
+            if not self._core_cache_ready(core_cache_dir):
+                lock = self.warmup_locks.setdefault(name, asyncio.Lock())
+                await lock.acquire()
+                warmup_lock = lock
+                # The compile we waited behind may have just populated the cache
+                if self._core_cache_ready(core_cache_dir):
+                    warmup_lock = None
+                    lock.release()
+            
+            yield build_dir, core_cache_dir
+            
+            if warmup_lock is not None and os.listdir(core_cache_dir):
+                open(os.path.join(core_cache_dir, CORE_CACHE_READY_MARKER), "w").close()
+        finally:
+            if warmup_lock is not None:
+                warmup_lock.release()
+            with self.lock:
+                self.active_compiles[name] -= 1
+                self.last_used[name] = time.time()
+                if leased:
+                    self.free_build_dirs[name].append(build_dir)
+    
+    def enforce_cache_limit(self, fqbn: Optional[str] = None) -> int:
+        """
+        Trim the arduino-cli caches to the size cap by removing whole board
+        caches, least recently used first. Boards with a compile in progress
+        are skipped. Returns the number of bytes freed.
+
+        Board sizes are kept between calls: only the board that was just
+        compiled for (``fqbn``) is measured again, and other boards only the
+        first time they are seen, so a compile does not walk the whole cache.
+        """
+        if not os.path.isdir(self.cache_dir):
+            return 0
+        
+        names = [name for name in os.listdir(self.cache_dir) if not name.startswith(".")]
+        changed = self._cache_name(fqbn) if fqbn else None
+        measured = {
+            name: directory_size(os.path.join(self.cache_dir, name))
+            for name in names
+            if name == changed or name not in self.cache_sizes
+        }
+        with self.lock:
+            self.cache_sizes = {name: measured.get(name, self.cache_sizes.get(name, 0)) for name in names}
+            sizes = dict(self.cache_sizes)
+        total = sum(sizes.values())
+        freed = 0
+        
+        for name in sorted(sizes, key=lambda name: self.last_used.get(name, 0.0)):
+            if total <= self.cache_max_bytes:
+                break
+            trash_dir = os.path.join(self.cache_dir, f".trash-{name}-{time.time_ns()}")
+            with self.lock:
+                if self.active_compiles.get(name, 0):
+                    continue
+                # Move it aside atomically so a new compile starts from a clean directory
+                os.rename(os.path.join(self.cache_dir, name), trash_dir)
+                self.free_build_dirs.pop(name, None)
+                self.build_dir_counts.pop(name, None)
+                self.cache_sizes.pop(name, None)
+            shutil.rmtree(trash_dir, ignore_errors=True)
+            total -= sizes[name]
+            freed += sizes[name]
+            logger.info(f"Evicted arduino-cli cache for {name} ({sizes[name]} bytes)")
+        
+        return freed
     
     def create_project_directory(self, project_id: str) -> str:
         """Create a project directory and return the path."""
@@ -94,9 +242,9 @@ class DeviceValidator:
     """Validates device operations and permissions."""
     
     @staticmethod
-    def validate_device_index(device_index: int, device_count: int) -> bool:
-        """Validate that device index is within bounds."""
-        return 0 <= device_index < device_count
+    def validate_device_connected(device: Optional[Dict[str, Any]]) -> bool:
+        """Validate that a device was found in the registry."""
+        return device is not None
     
     @staticmethod
     def validate_device_model(device_model: str) -> bool:
@@ -104,11 +252,12 @@ class DeviceValidator:
         return ArduinoBoardConfig.is_supported(device_model)
     
     @staticmethod
-    def get_device_validation_error(device_index: int, device_count: int, device_model: str) -> Optional[str]:
+    def get_device_validation_error(device_id: int, device: Optional[Dict[str, Any]]) -> Optional[str]:
         """Get validation error message for device, if any."""
-        if not DeviceValidator.validate_device_index(device_index, device_count):
-            return f"Invalid device index {device_index}. Available devices: 0-{device_count-1}"
+        if not DeviceValidator.validate_device_connected(device):
+            return f"Device {device_id} is unknown or not connected"
         
+        device_model = device["model"]
         if not DeviceValidator.validate_device_model(device_model):
             supported_models = ArduinoBoardConfig.get_supported_boards()
             return f"Unsupported device model '{device_model}'. Supported models: {', '.join(supported_models)}"
@@ -16,7 +16,15 @@ from routes.auth import auth_router
 from routes.devices import devices_router
 from websocket.endpoints import websocket_endpoint
 from websocket.device_endpoints import device_read_websocket_endpoint
-from database.operations import initialize_database
+from websocket.job_endpoints import job_stream_websocket_endpoint
+from database.operations import initialize_database, close_database_connections
+from core.slot_manager import load_slot_state
+from core.executors import shutdown_executors
+from core.process_lock import process_lock
+from device_handler.registry import device_registry
+from device_handler.job_queue import job_queue
+from auth.login_activity import login_activity
+from auth.pesu_auth import PESUAuthService
 
 # Configure logging
 setup_logging()
@@ -25,6 +33,7 @@ logger = logging.getLogger(__name__)
 # Initialize database
 try:
     initialize_database()
+    load_slot_state()
     logger.info("Database initialized successfully")
 except Exception as e:
     logger.error(f"Failed to initialize database: {e}")
@@ -48,6 +57,27 @@ app.include_router(devices_router)
 # Register WebSocket endpoints
 app.websocket("/slot-booking")(websocket_endpoint)
 app.websocket("/devices/read/{device_number}")(device_read_websocket_endpoint)
+app.websocket("/devices/jobs/{job_id}/stream")(job_stream_websocket_endpoint)
+
+@app.on_event("startup")
+async def startup() -> None:
+    """Start background services."""
+    # In-memory state is per process; refuse to run beside another worker
+    process_lock.acquire()
+    device_registry.start()
+    login_activity.start()
+    await job_queue.start()
+
+@app.on_event("shutdown")
+async def shutdown() -> None:
+    """Release pooled resources on shutdown."""
+    await job_queue.stop()
+    await login_activity.stop()
+    await PESUAuthService.shutdown()
+    device_registry.stop()
+    shutdown_executors()
+    close_database_connections()
+    process_lock.release()
 
 if __name__ == "__main__":
     import uvicorn
@@ -1,17 +1,27 @@
 """Authentication routes."""
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from core.models import LoginRequest, RegisterRequest
 from auth.local_auth import LocalAuthService
-from auth.jwt_utils import create_access_token
+from auth.admission import credential_admission, AdmissionRejected
+from auth.jwt_utils import create_access_token, invalidate_user_principal
+import math
 import logging
 
 logger = logging.getLogger(__name__)
 
 auth_router = APIRouter(prefix="/auth", tags=["authentication"])
 
+def throttled(rejection: AdmissionRejected) -> HTTPException:
+    """Build the 429 response for a rejected credential check."""
+    return HTTPException(
+        status_code=429,
+        detail=str(rejection),
+        headers={"Retry-After": str(math.ceil(rejection.retry_after))}
+    )
+
 @auth_router.post("/register")
-async def register(register_data: RegisterRequest):
+async def register(register_data: RegisterRequest, request: Request):
     """Register a new user account."""
     try:
         # Validate email format
@@ -22,8 +32,10 @@ async def register(register_data: RegisterRequest):
         if len(register_data.password) < 6:
             raise HTTPException(status_code=400, detail="Password must be at least 6 characters long")
         
+        credential_admission.check_rate(None, request.client.host if request.client else None)
+        
         # Create user account
-        success = LocalAuthService.create_user(
+        success = await LocalAuthService.create_user_async(
             register_data.email, 
             register_data.password
         )
@@ -37,6 +49,8 @@ async def register(register_data: RegisterRequest):
         else:
             raise HTTPException(status_code=409, detail="Email already exists")
             
+    except AdmissionRejected as e:
+        raise throttled(e)
     except HTTPException:
         raise  # Re-raise HTTP exceptions
     except Exception as e:
@@ -44,15 +58,18 @@ async def register(register_data: RegisterRequest):
         raise HTTPException(status_code=500, detail="Internal server error during registration")
 
 @auth_router.post("/login")
-async def login(login_data: LoginRequest):
+async def login(login_data: LoginRequest, request: Request):
     """Login endpoint to authenticate users."""
     try:
-        profile = LocalAuthService.authenticate_user(
+        credential_admission.check_rate(login_data.email, request.client.host if request.client else None)
+        profile = await LocalAuthService.authenticate_user_async(
             login_data.email, 
             login_data.password
         )
         
         if profile:
+            # last_login changed; don't serve the old profile from cache
+            invalidate_user_principal(profile.get("email"))
             token = create_access_token(subject=profile.get("email"))
             return {
                 "success": True,
@@ -68,6 +85,8 @@ async def login(login_data: LoginRequest):
         else:
             raise HTTPException(status_code=401, detail="Invalid credentials")
             
+    except AdmissionRejected as e:
+        raise throttled(e)
     except HTTPException:
         raise  # Re-raise HTTP exceptions
     except Exception as e:
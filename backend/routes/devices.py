@@ -1,30 +1,67 @@
 """Device management routes for Arduino code compilation and upload."""
 
+import os
 import uuid
-import subprocess
+import asyncio
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, AsyncIterator, Awaitable, List, Literal, Optional, Tuple, TypeVar
 from datetime import datetime
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
-from device_handler.get_devices import connected_devices, detect_serial_devices
+from device_handler.registry import device_registry
 from device_handler.utils import ArduinoBoardConfig, CodeManager, DeviceValidator
+from device_handler.arduino_cli import arduino_cli
+from device_handler.job_queue import Job, job_queue
+from device_handler.build_cache import build_cache, build_key, is_valid_build_key, normalize_source
 from device_handler.serial_manager import serial_manager
-from auth.local_auth import LocalAuthService
-from auth.jwt_utils import get_current_user_email
-from database.operations import get_database_connection
+from device_handler.device_locks import device_leases
+from auth.jwt_utils import get_current_user_email, get_user_principal
+from core.slot_manager import is_slot_booked_by
+from core.executors import run_db
+from core.config import TOOLCHAIN_CONFIG, BUILD_CACHE_CONFIG
+from core.snapshot_cache import encode_json
+from database.operations import get_known_devices
 
 logger = logging.getLogger(__name__)
 
 devices_router = APIRouter(prefix="/devices", tags=["devices"])
-code_manager = CodeManager()
+code_manager = CodeManager(
+    cache_max_bytes=BUILD_CACHE_CONFIG["toolchain_cache_max_bytes"],
+    build_dirs_per_fqbn=TOOLCHAIN_CONFIG["max_concurrent_compiles"]
+)
+
+T = TypeVar("T")
+
+# How often long-running toolchain requests check whether the client is still there
+DISCONNECT_POLL_SECONDS = 0.5
 
 class CodeUploadRequest(BaseModel):
-    code: str
+    # Either source code to build, or the artifact_id returned by /devices/compile
+    code: Optional[str] = None
+    artifact_id: Optional[str] = None
 
 class CodeCompileRequest(BaseModel):
     code: str
+    mode: Literal["sequential", "parallel"] = "sequential"
+    boards: Optional[List[str]] = None  # Defaults to every supported board
+    connected_only: bool = False        # Only target models that are plugged in right now
+    stream: bool = False                # Parallel mode: stream NDJSON results as boards finish
+
+class JobRequest(BaseModel):
+    kind: Literal["compile", "upload"]
+    code: Optional[str] = None
+    # Compile jobs
+    mode: Literal["sequential", "parallel"] = "sequential"
+    boards: Optional[List[str]] = None
+    connected_only: bool = False
+    # Upload jobs
+    device_id: Optional[int] = None
+    artifact_id: Optional[str] = None
+
+class DeviceAliasRequest(BaseModel):
+    alias: Optional[str] = None
 
 def get_current_time_slot() -> int:
     """Get the current time slot based on current hour."""
@@ -33,33 +70,108 @@ def get_current_time_slot() -> int:
 
 def is_user_slot_booked(user_email: str, slot_id: int) -> bool:
     """Check if the user has booked the specified time slot."""
-    try:
-        with get_database_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "SELECT is_booked, booked_by FROM slots WHERE id = ? AND booked_by = ?",
-                (slot_id, user_email)
-            )
-            result = cursor.fetchone()
-            return result is not None and result["is_booked"]
-    except Exception as e:
-        logger.error(f"Error checking user slot booking: {e}")
-        return False
+    return is_slot_booked_by(slot_id, user_email)
 
 def authenticate_user_for_upload(email: str) -> bool:
     """Authenticate user for code upload. With JWT this is already validated, keep function for future logic."""
-    user_profile = LocalAuthService.get_user_by_email(email)
+    user_profile = get_user_principal(email)
     return user_profile is not None
 
-def compile_arduino_code(code: str, board_model: str, project_id: str) -> Dict[str, Any]:
+async def build_sketch(code: str, fqbn: str, project_dir: str, pin: bool = False) -> Dict[str, Any]:
+    """
+    Compile a sketch, reusing a cached build of identical source when one exists.
+    Returns the compiler output and the directory holding the build artifacts.
+    With pin=True a returned artifact_id stays pinned in the build cache, and
+    the caller must release it once the artifacts are no longer needed.
+    """
+    normalized_code = normalize_source(code)
+    key = build_key(normalized_code, fqbn, await arduino_cli.get_toolchain_fingerprint())
+    
+    if not pin:
+        return await compile_or_reuse(key, normalized_code, fqbn, project_dir)
+    
+    build_cache.pin(key)
+    try:
+        result = await compile_or_reuse(key, normalized_code, fqbn, project_dir)
+    except BaseException:
+        build_cache.release(key)
+        raise
+    if result["artifact_id"] != key:
+        build_cache.release(key)
+    return result
+
+async def compile_or_reuse(key: str, normalized_code: str, fqbn: str, project_dir: str) -> Dict[str, Any]:
+    """Look a build up in the cache, compiling and storing it on a miss."""
+    cached = await asyncio.to_thread(build_cache.get, key)
+    if cached:
+        return {
+            "success": True,
+            "stdout": cached["stdout"],
+            "stderr": cached["stderr"],
+            "timed_out": False,
+            "cached": True,
+            "build_path": cached["path"],
+            "artifact_id": key
+        }
+    
+    # arduino-cli wipes --build-path whenever the sketch name changes, so pooled
+    # build directories only stay warm if every compile uses the same name
+    sketch_dir = os.path.join(project_dir, "sketch")
+    os.makedirs(sketch_dir, exist_ok=True)
+    sketch_path = code_manager.save_arduino_sketch(normalized_code, sketch_dir, "sketch")
+    output_dir = os.path.join(project_dir, "build")
+    # Reuse the board's compiled core and library objects from earlier compiles
+    async with code_manager.build_environment(fqbn, project_dir) as (shared_build_path, core_cache_path):
+        result = await arduino_cli.compile([
+            "--fqbn", fqbn,
+            "--build-path", shared_build_path,
+            "--build-cache-path", core_cache_path,
+            "--output-dir", output_dir,
+            sketch_path
+        ])
+    await asyncio.to_thread(code_manager.enforce_cache_limit, fqbn)
+    success = not result["timed_out"] and result["returncode"] == 0
+    
+    build_path = None
+    artifact_id = None
+    if success:
+        metadata = {"fqbn": fqbn, "stdout": result["stdout"], "stderr": result["stderr"]}
+        stored_path = await asyncio.to_thread(build_cache.put, key, output_dir, metadata)
+        # Fall back to the project's own output if the cache could not take it
+        build_path = stored_path or output_dir
+        artifact_id = key if stored_path else None
+    
+    return {
+        "success": success,
+        "stdout": result["stdout"],
+        "stderr": result["stderr"],
+        "timed_out": result["timed_out"],
+        "cached": False,
+        "build_path": build_path,
+        "artifact_id": artifact_id
+    }
+
+async def flash_build(build_path: str, device_port: str, fqbn: str) -> Dict[str, Any]:
+    """Flash already compiled artifacts to a device."""
+    upload_result = await arduino_cli.upload(["-p", device_port, "--fqbn", fqbn, "--input-dir", build_path])
+    if upload_result["timed_out"]:
+        return {
+            "success": False,
+            "upload_output": "",
+            "error": "Upload timeout"
+        }
+    
+    return {
+        "success": upload_result["returncode"] == 0,
+        "upload_output": upload_result["stdout"] if upload_result["returncode"] == 0 else upload_result["stderr"],
+        "error": None if upload_result["returncode"] == 0 else "Upload failed"
+    }
+
+async def compile_arduino_code(code: str, board_model: str, project_id: str) -> Dict[str, Any]:
     """Compile Arduino code for a specific board."""
     project_dir = None
     
     try:
-        # Create project and save code
-        project_dir = code_manager.create_project_directory(project_id)
-        sketch_path = code_manager.save_arduino_sketch(code, project_dir, project_id)
-        
         # Get board configuration
         fqbn = ArduinoBoardConfig.get_fqbn(board_model)
         if not fqbn:
@@ -69,27 +181,26 @@ def compile_arduino_code(code: str, board_model: str, project_id: str) -> Dict[s
                 "stderr": f"Unsupported board model: {board_model}"
             }
         
-        # Compile code
-        result = subprocess.run(
-            ["arduino-cli", "compile", "--fqbn", fqbn, sketch_path],
-            capture_output=True,
-            text=True,
-            check=False,
-            timeout=30
-        )
+        # Compile code (or reuse a cached build)
+        project_dir = code_manager.create_project_directory(project_id)
+        result = await build_sketch(code, fqbn, project_dir)
+        if result["timed_out"]:
+            return {
+                "success": False,
+                "stdout": "",
+                "stderr": f"Compilation timeout ({TOOLCHAIN_CONFIG['compile_timeout_seconds']} seconds)"
+            }
         
         return {
-            "success": result.returncode == 0,
-            "stdout": result.stdout,
-            "stderr": result.stderr
+            "success": result["success"],
+            "stdout": result["stdout"],
+            "stderr": result["stderr"],
+            "cached": result["cached"],
+            "artifact_id": result["artifact_id"]
         }
         
-    except subprocess.TimeoutExpired:
-        return {
-            "success": False,
-            "stdout": "",
-            "stderr": "Compilation timeout (30 seconds)"
-        }
+    except asyncio.CancelledError:
+        raise
     except Exception as e:
         return {
             "success": False,
@@ -98,17 +209,22 @@ def compile_arduino_code(code: str, board_model: str, project_id: str) -> Dict[s
         }
     finally:
         if project_dir:
-            code_manager.cleanup_project(project_dir)
+            await asyncio.to_thread(code_manager.cleanup_project, project_dir)
 
-def upload_arduino_code(code: str, device_port: str, board_model: str, project_id: str) -> Dict[str, Any]:
-    """Upload Arduino code to a device."""
+async def flash_to_device(build_path: str, device_id: int, device_port: str, fqbn: str) -> Dict[str, Any]:
+    """Flash a build while holding the device's lease."""
+    # Uploads to this device run one at a time; the lease stops serial reading while
+    # flashing (only one process can access the serial port) and resumes it afterwards
+    async with device_leases.exclusive(device_id):
+        serial_manager.reset_device_output(device_id)
+        return await flash_build(build_path, device_port, fqbn)
+
+async def upload_arduino_code(code: str, device_id: int, device_port: str, board_model: str, project_id: str) -> Dict[str, Any]:
+    """Upload Arduino code to a device. The device is only leased once compilation is done."""
     project_dir = None
+    pinned_key = None
     
     try:
-        # Create project and save code
-        project_dir = code_manager.create_project_directory(project_id)
-        sketch_path = code_manager.save_arduino_sketch(code, project_dir, project_id)
-        
         # Get board configuration
         fqbn = ArduinoBoardConfig.get_fqbn(board_model)
         if not fqbn:
@@ -119,46 +235,94 @@ def upload_arduino_code(code: str, device_port: str, board_model: str, project_i
                 "error": f"Unsupported board model: {board_model}"
             }
         
-        # Compile first
-        compile_result = subprocess.run(
-            ["arduino-cli", "compile", "--fqbn", fqbn, sketch_path],
-            capture_output=True,
-            text=True,
-            check=False,
-            timeout=30
-        )
+        # Compile first (or reuse a cached build)
+        project_dir = code_manager.create_project_directory(project_id)
+        # Pin the cached build so eviction cannot remove it while we wait for the device
+        compile_result = await build_sketch(code, fqbn, project_dir, pin=True)
+        pinned_key = compile_result["artifact_id"]
+        if compile_result["timed_out"]:
+            return {
+                "success": False,
+                "compile_output": "",
+                "upload_output": "",
+                "error": "Compilation timeout"
+            }
         
-        if compile_result.returncode != 0:
+        if not compile_result["success"]:
             return {
                 "success": False,
-                "compile_output": compile_result.stdout,
+                "compile_output": compile_result["stdout"],
                 "upload_output": "",
                 "error": "Compilation failed"
             }
         
-        # Upload code
-        upload_result = subprocess.run(
-            ["arduino-cli", "upload", "-p", device_port, "--fqbn", fqbn, sketch_path],
-            capture_output=True,
-            text=True,
-            check=False,
-            timeout=60
-        )
+        # Flash the compiled binary
+        flash_result = await flash_to_device(compile_result["build_path"], device_id, device_port, fqbn)
         
         return {
-            "success": upload_result.returncode == 0,
-            "compile_output": compile_result.stdout,
-            "upload_output": upload_result.stdout if upload_result.returncode == 0 else upload_result.stderr,
-            "error": None if upload_result.returncode == 0 else "Upload failed"
+            **flash_result,
+            "compile_output": compile_result["stdout"],
+            "cached_build": compile_result["cached"],
+            "artifact_id": compile_result["artifact_id"]
         }
         
-    except subprocess.TimeoutExpired:
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
         return {
             "success": False,
             "compile_output": "",
             "upload_output": "",
-            "error": "Upload timeout"
+            "error": f"Upload error: {str(e)}"
         }
+    finally:
+        if pinned_key:
+            build_cache.release(pinned_key)
+        if project_dir:
+            await asyncio.to_thread(code_manager.cleanup_project, project_dir)
+
+async def upload_artifact(artifact_id: str, device_id: int, device_port: str, board_model: str) -> Dict[str, Any]:
+    """Upload a previously compiled artifact to a device without rebuilding."""
+    # Pin before the lookup so the artifact survives until it has been flashed
+    build_cache.pin(artifact_id)
+    try:
+        fqbn = ArduinoBoardConfig.get_fqbn(board_model)
+        if not fqbn:
+            return {
+                "success": False,
+                "compile_output": "",
+                "upload_output": "",
+                "error": f"Unsupported board model: {board_model}"
+            }
+        
+        artifact = await asyncio.to_thread(build_cache.get, artifact_id)
+        if not artifact:
+            return {
+                "success": False,
+                "compile_output": "",
+                "upload_output": "",
+                "error": "Artifact not found or expired, please compile again"
+            }
+        
+        if artifact["fqbn"] != fqbn:
+            return {
+                "success": False,
+                "compile_output": artifact["stdout"],
+                "upload_output": "",
+                "error": f"Artifact was built for {artifact['fqbn']}, but the device is a {board_model} ({fqbn})"
+            }
+        
+        flash_result = await flash_to_device(artifact["path"], device_id, device_port, fqbn)
+        
+        return {
+            **flash_result,
+            "compile_output": artifact["stdout"],
+            "cached_build": True,
+            "artifact_id": artifact_id
+        }
+        
+    except asyncio.CancelledError:
+        raise
     except Exception as e:
         return {
             "success": False,
@@ -167,16 +331,38 @@ def upload_arduino_code(code: str, device_port: str, board_model: str, project_i
             "error": f"Upload error: {str(e)}"
         }
     finally:
-        if project_dir:
-            code_manager.cleanup_project(project_dir)
+        build_cache.release(artifact_id)
+
+async def cancel_on_disconnect(request: Request, coro: Awaitable[T]) -> T:
+    """
+    Await a coroutine, cancelling it if the client disconnects first.
+    Cancellation kills any arduino-cli process the coroutine started.
+    """
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+                logger.info(f"Client disconnected, cancelled {request.url.path}")
+                raise HTTPException(status_code=499, detail="Client disconnected")
+    finally:
+        if not task.done():
+            task.cancel()
 
 @devices_router.get("")
-async def get_devices():
-    """Get all connected Arduino devices."""
+async def get_devices(refresh: bool = False):
+    """Get all connected Arduino devices from the registry (rescan with ?refresh=true)."""
     try:
-        # Refresh the device list
-        global connected_devices
-        connected_devices = detect_serial_devices()
+        if refresh:
+            await asyncio.to_thread(device_registry.scan)
+        connected_devices = device_registry.get_devices()
         
         return {
             "success": True,
@@ -188,104 +374,324 @@ async def get_devices():
         logger.error(f"Error getting devices: {e}")
         raise HTTPException(status_code=500, detail="Failed to get connected devices")
 
+@devices_router.get("/known")
+async def get_known_device_list():
+    """Get every device ever seen, including ones that are not connected now."""
+    try:
+        known_devices = await run_db(get_known_devices)
+        connected_ids = {device["id"] for device in device_registry.get_devices()}
+        for device in known_devices:
+            device["connected"] = device["id"] in connected_ids
+        
+        return {
+            "success": True,
+            "devices": known_devices,
+            "count": len(known_devices)
+        }
+    except Exception as e:
+        logger.error(f"Error getting known devices: {e}")
+        raise HTTPException(status_code=500, detail="Failed to get known devices")
+
+@devices_router.put("/{device_id}/alias")
+async def set_device_alias(device_id: int, request: DeviceAliasRequest, current_user_email: str = Depends(get_current_user_email)):
+    """Set or clear the human-readable alias of a device. Only the current slot holder may do this."""
+    alias = request.alias.strip() if request.alias else None
+    if alias and len(alias) > 64:
+        raise HTTPException(status_code=400, detail="Alias must be at most 64 characters")
+    
+    await check_upload_permission(current_user_email, "rename devices")
+    
+    if not await run_db(device_registry.set_alias, device_id, alias or None):
+        raise HTTPException(status_code=404, detail=f"Device {device_id} not found")
+    
+    logger.info(f"User {current_user_email} set alias of device {device_id} to {alias!r}")
+    return {
+        "success": True,
+        "device_id": device_id,
+        "alias": alias or None
+    }
+
+def resolve_compile_boards(request: CodeCompileRequest) -> List[str]:
+    """Work out which board models a compile request targets."""
+    supported_boards = ArduinoBoardConfig.get_supported_boards()
+    boards = request.boards or supported_boards
+    
+    unsupported = [board for board in boards if not ArduinoBoardConfig.is_supported(board)]
+    if unsupported:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported board models: {', '.join(unsupported)}. Supported models: {', '.join(supported_boards)}"
+        )
+    
+    if request.connected_only:
+        connected_models = {device["model"] for device in device_registry.get_devices()}
+        connected_boards = [board for board in boards if board in connected_models]
+        # The device list may be stale or hold only unknown boards; compiling for
+        # everything requested is better than failing the request
+        if connected_boards:
+            boards = connected_boards
+        else:
+            logger.info("None of the requested board models are connected, compiling for all of them")
+    
+    # Preserve order while dropping duplicates
+    return list(dict.fromkeys(boards))
+
+async def compile_boards_concurrently(code: str, boards: List[str], project_id: str) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Compile for several boards at once, yielding (board, result) as each finishes.
+    The toolchain runner's compile limit caps how many actually run together.
+    """
+    tasks = {
+        asyncio.ensure_future(compile_arduino_code(code, board, f"{project_id}_{board}")): board
+        for board in boards
+    }
+    pending = set(tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield tasks[task], task.result()
+    finally:
+        # Client went away or an error occurred: stop the remaining compiles
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+def create_compile_summary(compile_results: Dict[str, Dict[str, Any]], project_id: str) -> Dict[str, Any]:
+    """Create the response for a finished compile request."""
+    # Check if any compilation succeeded
+    any_success = any(result["success"] for result in compile_results.values())
+    
+    # Artifact IDs can be passed to /devices/upload to flash without rebuilding
+    artifacts = {
+        board: result["artifact_id"]
+        for board, result in compile_results.items()
+        if result.get("artifact_id")
+    }
+    
+    return {
+        "success": any_success,
+        "compile_results": compile_results,
+        "artifacts": artifacts,
+        "message": "Code compiled successfully" if any_success else "Code compilation failed",
+        "project_id": project_id
+    }
+
+async def stream_compile_results(code: str, boards: List[str], project_id: str) -> AsyncIterator[bytes]:
+    """Stream per-board results as NDJSON lines, followed by the summary."""
+    compile_results = {}
+    async for board, result in compile_boards_concurrently(code, boards, project_id):
+        compile_results[board] = result
+        yield encode_json({"type": "result", "board": board, **result}) + b"\n"
+    yield encode_json({"type": "summary", **create_compile_summary(compile_results, project_id)}) + b"\n"
+
+async def run_compile(request: CodeCompileRequest, project_id: str) -> Dict[str, Any]:
+    """Compile for the requested boards and summarize the results."""
+    boards = resolve_compile_boards(request)
+    
+    if request.mode == "parallel":
+        compile_results = {
+            board: result
+            async for board, result in compile_boards_concurrently(request.code, boards, project_id)
+        }
+        # Report boards in request order rather than completion order
+        return create_compile_summary({board: compile_results[board] for board in boards}, project_id)
+    
+    # Try compilation for different board types
+    compile_results = {}
+    for board in boards:
+        compile_results[board] = await compile_arduino_code(request.code, board, f"{project_id}_{board}")
+        
+        # If compilation succeeds for any board, we consider it valid
+        if compile_results[board]["success"]:
+            break
+    
+    return create_compile_summary(compile_results, project_id)
+
 @devices_router.post("/compile")
-async def compile_code(request: CodeCompileRequest):
-    """Compile Arduino code to check if it's valid."""
+async def compile_code(request: CodeCompileRequest, http_request: Request):
+    """
+    Compile Arduino code to check if it's valid.
+
+    Modes:
+    - "sequential": try each board in turn and stop at the first success
+    - "parallel": compile every targeted board concurrently; with
+      ``stream`` set, results are sent as NDJSON lines as each board finishes
+    """
     project_id = str(uuid.uuid4())
     
     try:
-        # Try compilation for different board types
-        compile_results = {}
-        supported_boards = ArduinoBoardConfig.get_supported_boards()
-        
-        for board in supported_boards:
-            compile_results[board] = compile_arduino_code(request.code, board, f"{project_id}_{board}")
-            
-            # If compilation succeeds for any board, we consider it valid
-            if compile_results[board]["success"]:
-                break
-        
-        # Check if any compilation succeeded
-        any_success = any(result["success"] for result in compile_results.values())
+        if request.mode == "parallel" and request.stream:
+            return StreamingResponse(
+                stream_compile_results(request.code, resolve_compile_boards(request), project_id),
+                media_type="application/x-ndjson"
+            )
         
-        return {
-            "success": any_success,
-            "compile_results": compile_results,
-            "message": "Code compiled successfully" if any_success else "Code compilation failed",
-            "project_id": project_id
-        }
+        return await cancel_on_disconnect(http_request, run_compile(request, project_id))
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error compiling code: {e}")
         raise HTTPException(status_code=500, detail=f"Compilation failed: {str(e)}")
 
-@devices_router.post("/upload/{device_number}")
-async def upload_code(device_number: int, request: CodeUploadRequest, current_user_email: str = Depends(get_current_user_email)):
-    """Upload Arduino code to a specific device."""
-    project_id = str(uuid.uuid4())
+def validate_upload_source(code: Optional[str], artifact_id: Optional[str]) -> None:
+    """Check that an upload names exactly one of code or a well-formed artifact ID."""
+    if (code is None) == (artifact_id is None):
+        raise HTTPException(status_code=400, detail="Provide either code or artifact_id")
+    if artifact_id is not None and not is_valid_build_key(artifact_id):
+        raise HTTPException(status_code=400, detail="Invalid artifact_id")
 
-    try:
-        # Authenticate user (redundant with JWT, kept for sanity)
-        if not authenticate_user_for_upload(current_user_email):
-            raise HTTPException(status_code=401, detail="Invalid credentials")
-
-        # Check if user has booked the current time slot
-        current_slot = get_current_time_slot()
-        if not is_user_slot_booked(current_user_email, current_slot):
-            end_hour = (current_slot + 1) % 24
-            raise HTTPException(
-                status_code=403,
-                detail=(
-                    f"You must have booked the current time slot "
-                    f"({current_slot:02d}:00-{end_hour:02d}:00) to upload code"
-                ),
-            )
+async def check_upload_permission(user_email: str, action: str = "upload code") -> None:
+    """Check that the user exists and holds the current time slot."""
+    # Authenticate user (redundant with JWT, kept for sanity)
+    if not await run_db(authenticate_user_for_upload, user_email):
+        raise HTTPException(status_code=401, detail="Invalid credentials")
 
-        # Refresh device list and validate device number
-        global connected_devices
-        connected_devices = detect_serial_devices()
-
-        validation_error = DeviceValidator.get_device_validation_error(
-            device_number,
-            len(connected_devices),
-            connected_devices[device_number]["model"] if device_number < len(connected_devices) else "unknown",
+    # Check if user has booked the current time slot
+    current_slot = get_current_time_slot()
+    if not is_user_slot_booked(user_email, current_slot):
+        end_hour = (current_slot + 1) % 24
+        raise HTTPException(
+            status_code=403,
+            detail=(
+                f"You must have booked the current time slot "
+                f"({current_slot:02d}:00-{end_hour:02d}:00) to {action}"
+            ),
         )
-        if validation_error:
-            raise HTTPException(status_code=400, detail=validation_error)
 
-        device = connected_devices[device_number]
-        device_model = device["model"]
-        device_port = device["port"]
+async def perform_upload(device_number: int, code: Optional[str], artifact_id: Optional[str], project_id: str) -> Dict[str, Any]:
+    """Flash code or an artifact to a device and build the upload response."""
+    # Look up the device by its stable ID in the registry snapshot
+    device = device_registry.get_device(device_number)
 
-        # Stop serial reading for this device (only one process can access serial port)
-        serial_manager.stop_reading_device(device_number)
-        serial_manager.reset_device_output(device_number)
+    validation_error = DeviceValidator.get_device_validation_error(device_number, device)
+    if validation_error:
+        raise HTTPException(status_code=400, detail=validation_error)
 
-        # Upload code to device
-        upload_result = upload_arduino_code(request.code, device_port, device_model, project_id)
+    device_model = device["model"]
+    device_port = device["port"]
 
-        if upload_result["success"]:
-            return {
-                "success": True,
-                "message": f"Code uploaded successfully to {device_model} on {device_port}",
-                "device": device,
-                "compile_output": upload_result["compile_output"],
-                "upload_output": upload_result["upload_output"],
-                "project_id": project_id,
-            }
+    # Upload code to device; only the flash itself holds the device
+    if artifact_id is not None:
+        upload_result = await upload_artifact(artifact_id, device_number, device_port, device_model)
+    else:
+        upload_result = await upload_arduino_code(code, device_number, device_port, device_model, project_id)
+
+    if upload_result["success"]:
         return {
-            "success": False,
-            "message": upload_result["error"],
+            "success": True,
+            "message": f"Code uploaded successfully to {device_model} on {device_port}",
             "device": device,
             "compile_output": upload_result["compile_output"],
             "upload_output": upload_result["upload_output"],
+            "cached_build": upload_result["cached_build"],
+            "artifact_id": upload_result["artifact_id"],
             "project_id": project_id,
         }
+    return {
+        "success": False,
+        "message": upload_result["error"],
+        "device": device,
+        "compile_output": upload_result["compile_output"],
+        "upload_output": upload_result["upload_output"],
+        "project_id": project_id,
+    }
+
+@devices_router.post("/upload/{device_number}")
+async def upload_code(device_number: int, request: CodeUploadRequest, http_request: Request, current_user_email: str = Depends(get_current_user_email)):
+    """Upload Arduino code, or a previously compiled artifact, to a specific device."""
+    project_id = str(uuid.uuid4())
+
+    try:
+        validate_upload_source(request.code, request.artifact_id)
+        await check_upload_permission(current_user_email)
+
+        return await cancel_on_disconnect(
+            http_request,
+            perform_upload(device_number, request.code, request.artifact_id, project_id)
+        )
 
     except HTTPException:
         raise  # Re-raise HTTP exceptions
-    except subprocess.TimeoutExpired:
-        raise HTTPException(status_code=408, detail="Upload operation timed out")
     except Exception as e:
         logger.error(f"Error uploading code: {e}")
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+
+async def run_compile_job(job: Job) -> Dict[str, Any]:
+    """Job handler: compile in the background."""
+    try:
+        return await run_compile(CodeCompileRequest(**job.payload), job.id)
+    except HTTPException as e:
+        return {"success": False, "message": e.detail}
+
+async def run_upload_job(job: Job) -> Dict[str, Any]:
+    """Job handler: upload in the background, re-checking the slot since the job may have waited."""
+    payload = job.payload
+    try:
+        await check_upload_permission(job.user_email)
+        return await perform_upload(payload["device_id"], payload.get("code"), payload.get("artifact_id"), job.id)
+    except HTTPException as e:
+        return {"success": False, "message": e.detail}
+
+job_queue.register_handler("compile", run_compile_job)
+job_queue.register_handler("upload", run_upload_job)
+
+@devices_router.post("/jobs")
+async def submit_job(request: JobRequest, current_user_email: str = Depends(get_current_user_email)):
+    """Queue a compile or upload job and return its ID immediately."""
+    if request.kind == "compile":
+        if request.code is None:
+            raise HTTPException(status_code=400, detail="Compile jobs require code")
+        payload = {
+            "code": request.code,
+            "mode": request.mode,
+            "boards": request.boards,
+            "connected_only": request.connected_only
+        }
+        # Fail fast on bad board selections
+        resolve_compile_boards(CodeCompileRequest(**payload))
+    else:
+        if request.device_id is None:
+            raise HTTPException(status_code=400, detail="Upload jobs require device_id")
+        validate_upload_source(request.code, request.artifact_id)
+        await check_upload_permission(current_user_email)
+        payload = {
+            "device_id": request.device_id,
+            "code": request.code,
+            "artifact_id": request.artifact_id
+        }
+    
+    try:
+        job = await job_queue.submit(request.kind, current_user_email, payload, str(uuid.uuid4()))
+    except ValueError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    
+    return {
+        "success": True,
+        "job_id": job.id,
+        "status": job.status,
+        "position": job_queue.get_position(job.id)
+    }
+
+async def get_owned_job_info(job_id: str, user_email: str) -> Dict[str, Any]:
+    """Get a job's details, hiding jobs that belong to other users."""
+    info = await job_queue.get_job_info(job_id)
+    if info is None or info["user_email"] != user_email:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return info
+
+@devices_router.get("/jobs/{job_id}")
+async def get_job_status(job_id: str, current_user_email: str = Depends(get_current_user_email)):
+    """Get a job's status, queue position, result and toolchain log."""
+    info = await get_owned_job_info(job_id, current_user_email)
+    return {"success": True, "job": info}
+
+@devices_router.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str, current_user_email: str = Depends(get_current_user_email)):
+    """Cancel a queued or running job."""
+    await get_owned_job_info(job_id, current_user_email)
+    if not await job_queue.cancel(job_id):
+        raise HTTPException(status_code=409, detail=f"Job {job_id} has already finished")
+    return {"success": True, "job_id": job_id}
@@ -1,12 +1,24 @@
 """Main API routes."""
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Response
 from core.models import create_root_response, create_health_response
-from websocket.manager import get_connection_count
+from websocket.manager import get_connection_count, get_connection_stats, broadcast_slot_update
+from websocket.handlers import push_user_slots
 from core.slot_manager import get_booked_slots_list
 from database.operations import get_database_stats, get_user_bookings
 from core.models import BookingRequest, CancellationRequest, TokenOnlyRequest
-from auth.jwt_utils import get_current_user_email
+from core.models import describe_slot_outcome
+from auth.jwt_utils import get_current_user_email, get_auth_cache_stats
+from core.executors import run_db
+from core.snapshot_cache import snapshot_cache
+from websocket.device_endpoints import get_device_stream_stats
+from device_handler.arduino_cli import arduino_cli
+from device_handler.build_cache import build_cache
+from device_handler.job_queue import job_queue
+from device_handler.device_locks import device_leases
+from auth.login_activity import login_activity
+from auth.admission import credential_admission
+from auth.pesu_auth import PESUAuthService
 from fastapi import HTTPException
 import logging
 
@@ -25,7 +37,7 @@ async def root():
 @main_router.get("/health")
 async def health_check():
     """Health check endpoint with system status."""
-    db_stats = get_database_stats()
+    db_stats = await run_db(get_database_stats)
     
     response = create_health_response(
         active_connections=get_connection_count(),
@@ -39,20 +51,26 @@ async def health_check():
 
 @main_router.get("/slots")
 async def get_all_slots():
-    """Get all slots with their current status."""
-    from core.slot_manager import get_slot_summary
-    return get_slot_summary()
+    """Get all slots with their current status (served from the snapshot cache)."""
+    return Response(content=snapshot_cache.get_summary_bytes(), media_type="application/json")
 
 @main_router.get("/stats")
 async def get_statistics():
     """Get detailed statistics about the slot booking system."""
-    db_stats = get_database_stats()
+    db_stats = await run_db(get_database_stats)
     
     return {
         "database": db_stats,
-        "websocket": {
-            "active_connections": get_connection_count()
-        },
+        "websocket": get_connection_stats(),
+        "serial_streams": get_device_stream_stats(),
+        "toolchain": arduino_cli.get_stats(),
+        "build_cache": build_cache.get_stats(),
+        "jobs": job_queue.get_stats(),
+        "device_leases": device_leases.get_stats(),
+        "auth_cache": get_auth_cache_stats(),
+        "pesu_login_cache": PESUAuthService.get_stats(),
+        "login_activity": login_activity.get_stats(),
+        "login_admission": credential_admission.get_stats(),
         "slots": {
             "total": db_stats.get("total_slots", 12),
             "booked": db_stats.get("booked_slots", 0),
@@ -69,16 +87,20 @@ async def book_slot_http(booking_data: BookingRequest, current_user_email: str =
     user_email = current_user_email
     
     # Attempt to book the slot
-    success = book_slot(booking_data.slot_id, user_email)
+    outcome = await run_db(book_slot, booking_data.slot_id, user_email)
+    message = describe_slot_outcome(outcome, booking_data.slot_id)
     
-    if success:
+    if outcome.success:
+        await broadcast_slot_update()
+        await push_user_slots(user_email)
         return {
             "success": True,
-            "message": f"Slot {booking_data.slot_id} booked successfully",
-            "slot_id": booking_data.slot_id
+            "message": message,
+            "slot_id": booking_data.slot_id,
+            "outcome": outcome.value
         }
     else:
-        raise HTTPException(status_code=400, detail=f"Slot {booking_data.slot_id} is not available")
+        raise HTTPException(status_code=400, detail=message)
 
 @main_router.post("/cancel-slot")
 async def cancel_slot_http(cancellation_data: CancellationRequest, current_user_email: str = Depends(get_current_user_email)):
@@ -88,23 +110,27 @@ async def cancel_slot_http(cancellation_data: CancellationRequest, current_user_
     user_email = current_user_email
     
     # Attempt to cancel the slot
-    success = cancel_slot_booking(cancellation_data.slot_id, user_email)
+    outcome = await run_db(cancel_slot_booking, cancellation_data.slot_id, user_email)
+    message = describe_slot_outcome(outcome, cancellation_data.slot_id)
     
-    if success:
+    if outcome.success:
+        await broadcast_slot_update()
+        await push_user_slots(user_email)
         return {
             "success": True,
-            "message": f"Slot {cancellation_data.slot_id} booking cancelled successfully",
-            "slot_id": cancellation_data.slot_id
+            "message": message,
+            "slot_id": cancellation_data.slot_id,
+            "outcome": outcome.value
         }
     else:
-        raise HTTPException(status_code=400, detail=f"Slot {cancellation_data.slot_id} was not booked by you or does not exist")
+        raise HTTPException(status_code=400, detail=message)
 
 @main_router.post("/my-bookings")
 async def get_my_bookings(_: TokenOnlyRequest, current_user_email: str = Depends(get_current_user_email)):
     """Get all bookings for the authenticated user."""
     user_email = current_user_email
     
-    bookings = get_user_bookings(user_email)
+    bookings = await run_db(get_user_bookings, user_email)
     return {
         "success": True,
         "bookings": bookings,
@@ -116,7 +142,7 @@ async def get_user_current_slot(_: TokenOnlyRequest, current_user_email: str = D
     """Get the current slot booked by the authenticated user."""
     user_email = current_user_email
     
-    bookings = get_user_bookings(user_email)
+    bookings = await run_db(get_user_bookings, user_email)
     print(bookings)
     
     # Return the first booking slot (assuming one booking per user)
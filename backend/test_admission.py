@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""Test script for credential admission control: rate limits, load shedding and metrics."""
+
+import os
+import sys
+import time
+import asyncio
+
+# Add the backend directory to the Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from test_helpers import use_temp_workdir
+
+use_temp_workdir()
+
+from auth.admission import CredentialAdmissionController, AdmissionRejected, TokenBucket
+from database.operations import initialize_database
+from websocket.device_endpoints import authenticate_user_for_device
+
+def attempts_until_rejected(controller: CredentialAdmissionController, account: str, ip: str, limit: int = 100):
+    """Charge attempts until one is rejected. Returns (allowed attempts, rejection)."""
+    for allowed in range(limit):
+        try:
+            controller.check_rate(account, ip)
+        except AdmissionRejected as e:
+            return allowed, e
+    return limit, None
+
+async def test_admission() -> bool:
+    """Test per-account and per-IP limits, queue-full rejection and stats."""
+    print("Testing Credential Admission Control")
+    print("=" * 40)
+    ok = True
+    
+    # Buckets allow a burst and then refill at their rate
+    print("1. Checking the token bucket...")
+    bucket = TokenBucket(rate=10, burst=2)
+    taken = [bucket.take() for _ in range(3)]
+    time.sleep(0.15)
+    if taken[0] == 0 and taken[1] == 0 and taken[2] > 0 and bucket.take() == 0:
+        print(f"✓ Burst of 2 allowed, then retry after {taken[2]:.2f}s, refilled later")
+    else:
+        print(f"✗ Unexpected bucket results: {taken}")
+        ok = False
+    
+    # One account is limited no matter which address it comes from
+    print("\n2. Checking the per-account limit...")
+    controller = CredentialAdmissionController(max_concurrent=1, max_queued=1,
+                                               account_per_minute=60, account_burst=3,
+                                               ip_per_minute=600, ip_burst=100, max_tracked_keys=100)
+    allowed, rejection = attempts_until_rejected(controller, "victim@example.com", "10.0.0.1")
+    retry_allowed, _ = attempts_until_rejected(controller, "VICTIM@example.com", "10.0.0.2", limit=1)
+    if allowed == 3 and rejection and rejection.retry_after > 0 and retry_allowed == 0:
+        print("✓ Account throttled after 3 attempts, across addresses and letter case")
+    else:
+        print(f"✗ Account allowed {allowed} attempts, then {retry_allowed} from another address")
+        ok = False
+    if attempts_until_rejected(controller, "other@example.com", "10.0.0.1", limit=1)[0] == 1:
+        print("✓ Other accounts are unaffected")
+    else:
+        print("✗ Throttling one account blocked another")
+        ok = False
+    
+    # One address is limited no matter which accounts it tries
+    print("\n3. Checking the per-IP limit...")
+    controller = CredentialAdmissionController(max_concurrent=1, max_queued=1,
+                                               account_per_minute=600, account_burst=100,
+                                               ip_per_minute=60, ip_burst=4, max_tracked_keys=100)
+    rejected_at = None
+    for index in range(10):
+        try:
+            controller.check_rate(f"user{index}@example.com", "10.0.0.9")
+        except AdmissionRejected:
+            rejected_at = index
+            break
+    if rejected_at == 4:
+        print("✓ Address throttled after 4 attempts on different accounts")
+    else:
+        print(f"✗ Address throttled at attempt {rejected_at}")
+        ok = False
+    
+    # Once the queue is full further checks are shed instead of waiting
+    print("\n4. Checking load shedding...")
+    results = await asyncio.gather(*[controller.run(time.sleep, 0.2) for _ in range(4)], return_exceptions=True)
+    rejected = [result for result in results if isinstance(result, AdmissionRejected)]
+    if len(rejected) == 2:
+        print("✓ One check running, one queued, the rest rejected immediately")
+    else:
+        print(f"✗ Expected 2 rejections, got {len(rejected)}")
+        ok = False
+    
+    stats = controller.get_stats()
+    if (stats["admitted"] == 2 and stats["rejected_queue_full"] == 2 and stats["rejected_ip_rate"] == 1
+            and stats["queue_depth"] == 0 and stats["max_wait_ms"] >= 150):
+        print(f"✓ Stats: {stats['admitted']} admitted, max wait {stats['max_wait_ms']} ms")
+    else:
+        print(f"✗ Unexpected stats: {stats}")
+        ok = False
+    
+    # Legacy device WebSocket logins go through the same limits
+    print("\n5. Checking legacy device authentication...")
+    initialize_database()
+    rejection = None
+    for _ in range(50):
+        try:
+            await authenticate_user_for_device("nobody@example.com", "wrong-password", "10.0.0.20")
+        except AdmissionRejected as e:
+            rejection = e
+            break
+    if rejection is not None:
+        print(f"✓ Repeated device logins throttled ({rejection})")
+    else:
+        print("✗ Device logins were never throttled")
+        ok = False
+    
+    print("\n" + "=" * 40)
+    print("All tests passed! 🎉" if ok else "Some tests failed.")
+    return ok
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(test_admission()) else 1)
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""Test script for per-device upload leases, using pseudo-terminals instead of boards."""
+
+import os
+import pty
+import sys
+import time
+import asyncio
+
+# Add the backend directory to the Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from test_helpers import use_temp_workdir, wait_for_async
+
+use_temp_workdir()
+
+from device_handler.device_locks import DeviceLeaseManager
+from device_handler.serial_manager import serial_manager
+
+def open_fake_device():
+    """Open a pty pair; the slave path stands in for a serial port."""
+    master_fd, slave_fd = pty.openpty()
+    return master_fd, os.ttyname(slave_fd)
+
+async def test_device_leases() -> bool:
+    """Test serialization, handoff, reader pause/resume and offset continuity."""
+    print("Testing Device Leases")
+    print("=" * 40)
+    leases = DeviceLeaseManager()
+    devices = {device_id: open_fake_device() for device_id in (1, 2)}
+    events = []
+    ok = True
+    
+    async def listener(device_id: int, state: str) -> None:
+        events.append((device_id, state))
+        if state == "ready":
+            # Resume reading, as the WebSocket layer does for its viewers
+            serial_manager.start_reading_device(device_id, devices[device_id][1])
+    
+    leases.add_listener(listener)
+    
+    # Output before the upload sets the offset the stream must continue from
+    print("1. Reading the device before an upload...")
+    master_fd, port = devices[1]
+    serial_manager.start_reading_device(1, port)
+    os.write(master_fd, b"before flash\n")
+    if await wait_for_async(lambda: serial_manager.get_device_output(1) == "before flash\n"):
+        print("✓ Output read from the fake device")
+    else:
+        print("✗ No output before the upload")
+        ok = False
+    _, _, offset_before = serial_manager.read_device_output(1)
+    
+    # Two uploads to the same device run one after the other
+    print("\n2. Running two uploads to one device...")
+    timeline = []
+    
+    async def upload(device_id: int, name: str, duration: float) -> None:
+        async with leases.exclusive(device_id):
+            timeline.append((name, "start", time.monotonic()))
+            if serial_manager.is_device_connected(device_id):
+                timeline.append((name, "reader still running", time.monotonic()))
+            await asyncio.sleep(duration)
+            timeline.append((name, "end", time.monotonic()))
+    
+    await asyncio.gather(upload(1, "first", 0.2), upload(1, "second", 0.2), upload(2, "other", 0.1))
+    steps = [(name, step) for name, step, _ in timeline]
+    if steps.index(("first", "end")) < steps.index(("second", "start")):
+        print("✓ Uploads to the same device were serialized")
+    else:
+        print(f"✗ Uploads overlapped: {steps}")
+        ok = False
+    if steps.index(("other", "start")) < steps.index(("first", "end")):
+        print("✓ Upload to another device did not wait")
+    else:
+        print("✗ Upload to device 2 waited for device 1")
+        ok = False
+    if not any(step == "reader still running" for _, step in steps):
+        print("✓ Serial reader was stopped while flashing")
+    else:
+        print("✗ Serial reader kept the port during an upload")
+        ok = False
+    if [state for device_id, state in events if device_id == 1] == ["flashing", "ready"]:
+        print("✓ Queued upload took the device over without resuming the reader in between")
+    else:
+        print(f"✗ Unexpected lease events: {events}")
+        ok = False
+    
+    # After the upload the stream resumes with offsets continuing where they were
+    print("\n3. Resuming the stream after the upload...")
+    received = []
+    serial_manager.add_output_callback(1, lambda output, start, end: received.append((start, end)))
+    os.write(master_fd, b"after flash\n")
+    await wait_for_async(lambda: received)
+    if received and received[0][0] == offset_before and serial_manager.get_device_output(1) == "after flash\n":
+        print(f"✓ Offsets continue from {offset_before}; old output was cleared")
+    else:
+        print(f"✗ Stream restarted at {received[0][0] if received else None}, expected {offset_before}")
+        ok = False
+    
+    # A cancelled waiter must not leave the device marked as flashing
+    print("\n4. Cancelling an upload that is still waiting...")
+    holder_started = asyncio.Event()
+    
+    async def holder() -> None:
+        async with leases.exclusive(1):
+            holder_started.set()
+            await asyncio.sleep(0.2)
+    
+    holding = asyncio.create_task(holder())
+    await holder_started.wait()
+    waiter = asyncio.create_task(upload(1, "cancelled", 0.1))
+    await asyncio.sleep(0.05)
+    waiter.cancel()
+    await asyncio.gather(holding, waiter, return_exceptions=True)
+    if not leases.is_flashing(1) and events[-1] == (1, "ready") and await wait_for_async(lambda: serial_manager.is_device_connected(1)):
+        print("✓ Device released and reader resumed")
+    else:
+        print(f"✗ Device left flashing={leases.is_flashing(1)}, events {events}")
+        ok = False
+    
+    serial_manager.stop_all_devices()
+    print("\n" + "=" * 40)
+    print("All tests passed! 🎉" if ok else "Some tests failed.")
+    return ok
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(test_device_leases()) else 1)
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""Shared helpers for the backend test scripts."""
+
+import os
+import time
+import asyncio
+import tempfile
+from typing import Callable
+
+def use_temp_workdir() -> str:
+    """Switch to a fresh temporary directory so databases and data files stay out of the source tree."""
+    path = tempfile.mkdtemp(prefix="rero-test-")
+    os.chdir(path)
+    return path
+
+def wait_for(condition: Callable[[], bool], timeout: float = 5.0) -> bool:
+    """Poll until condition() is true or the timeout passes."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return condition()
+
+async def wait_for_async(condition: Callable[[], bool], timeout: float = 5.0) -> bool:
+    """Like wait_for, but lets the event loop run while polling."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        await asyncio.sleep(0.02)
+    return condition()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""Test script for the compile/upload job queue: fairness, cancellation and worker survival."""
+
+import os
+import sys
+import time
+import asyncio
+
+# Add the backend directory to the Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from test_helpers import use_temp_workdir, wait_for_async
+
+use_temp_workdir()
+
+import device_handler.job_queue as job_queue_module
+from device_handler.job_queue import JobQueue
+from database.operations import initialize_database, get_job
+
+FINISH_DELAY = 0.3
+
+def slow_mark_job_finished(*args):
+    """Hold the final database write open long enough to cancel a job during it."""
+    time.sleep(FINISH_DELAY)
+    return real_mark_job_finished(*args)
+
+real_mark_job_finished = job_queue_module.mark_job_finished
+
+async def test_job_queue() -> bool:
+    """Test dispatch order, cancellation and that workers survive cancelled jobs."""
+    print("Testing Job Queue")
+    print("=" * 40)
+    initialize_database()
+    queue = JobQueue(workers=1, max_queued_per_user=10, max_log_bytes=1024, subscriber_queue_size=10)
+    queue.get_priority = lambda user_email: 0
+    started = []
+    release = asyncio.Event()
+    
+    async def handler(job):
+        started.append(job.id)
+        if job.payload.get("block"):
+            await release.wait()
+        return {"success": True}
+    
+    queue.register_handler("test", handler)
+    await queue.start()
+    ok = True
+    
+    # One user's backlog must not starve another user
+    print("1. Checking round robin between users...")
+    await queue.submit("test", "a@example.com", {"block": True}, "blocker")
+    await wait_for_async(lambda: started == ["blocker"])
+    for index in range(3):
+        await queue.submit("test", "a@example.com", {}, f"a{index}")
+    await queue.submit("test", "b@example.com", {}, "b0")
+    order = [queue.get_position(job_id) for job_id in ("a0", "a1", "a2", "b0")]
+    if order == [1, 2, 3, 0]:
+        print("✓ Second user's job goes ahead of the first user's backlog")
+    else:
+        print(f"✗ Unexpected queue positions: {order}")
+        ok = False
+    
+    # Cancelling a queued job removes it without running it
+    print("\n2. Cancelling a queued job...")
+    cancelled = await queue.cancel("a2")
+    release.set()
+    await wait_for_async(lambda: not queue.jobs)
+    if cancelled and "a2" not in started and started == ["blocker", "b0", "a0", "a1"]:
+        print("✓ Queued job cancelled, the rest ran in order")
+    else:
+        print(f"✗ Cancel returned {cancelled}, jobs ran as {started}")
+        ok = False
+    
+    # Cancelling while the final status is being written must not kill the worker
+    print("\n3. Cancelling a job while it finishes...")
+    job_queue_module.mark_job_finished = slow_mark_job_finished
+    await queue.submit("test", "a@example.com", {}, "finishing")
+    await wait_for_async(lambda: queue.jobs.get("finishing") is not None and queue.jobs["finishing"].finished)
+    cancelled = await queue.cancel("finishing")
+    job_queue_module.mark_job_finished = real_mark_job_finished
+    if not cancelled:
+        print("✓ Cancel refused for a job that already reached its final status")
+    else:
+        print("✗ Cancel accepted for a finished job")
+        ok = False
+    
+    await queue.submit("test", "b@example.com", {}, "after")
+    if await wait_for_async(lambda: "after" in started and not queue.jobs) and all(not worker.done() for worker in queue.workers):
+        print("✓ Worker kept running and served the next job")
+    else:
+        print(f"✗ Worker stopped: {[worker.done() for worker in queue.workers]}")
+        ok = False
+    
+    row = get_job("finishing")
+    if row and row["status"] == "succeeded":
+        print("✓ Final status was written to the database")
+    else:
+        print(f"✗ Database status is {row['status'] if row else None}")
+        ok = False
+    
+    # Cancelling a running job reports it as cancelled
+    print("\n4. Cancelling a running job...")
+    release.clear()
+    await queue.submit("test", "a@example.com", {"block": True}, "running")
+    await wait_for_async(lambda: "running" in started)
+    await queue.cancel("running")
+    await wait_for_async(lambda: not queue.jobs)
+    row = get_job("running")
+    if row and row["status"] == "cancelled" and queue.stats["cancelled"] == 2:
+        print("✓ Running job cancelled")
+    else:
+        print(f"✗ Running job ended as {row['status'] if row else None}")
+        ok = False
+    
+    await queue.stop()
+    print("\n" + "=" * 40)
+    print("All tests passed! 🎉" if ok else "Some tests failed.")
+    return ok
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(test_job_queue()) else 1)
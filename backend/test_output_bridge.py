@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""Test script for handing serial output from the reader thread to the event loop."""
+
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+
+# Add the backend directory to the Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from test_helpers import use_temp_workdir
+
+use_temp_workdir()
+
+from websocket.device_endpoints import DeviceOutputBridge, broadcast_queues
+
+DEVICE = 1
+
+def produce(bridge: DeviceOutputBridge, count: int) -> str:
+    """Push numbered lines from a separate thread, as the serial reader does."""
+    sent = []
+    offset = 0
+    
+    def run():
+        nonlocal offset
+        for index in range(count):
+            line = f"line {index}\n"
+            bridge.push(line, offset, offset + len(line))
+            offset += len(line)
+            sent.append(line)
+    
+    thread = threading.Thread(target=run)
+    thread.start()
+    thread.join()
+    return "".join(sent)
+
+async def collect(queue: asyncio.Queue) -> list:
+    """Take every frame currently queued."""
+    await asyncio.sleep(0.1)  # Let pending drains run
+    frames = []
+    while not queue.empty():
+        frames.append(json.loads(queue.get_nowait()))
+    return frames
+
+async def test_output_bridge() -> bool:
+    """Test ordering, coalescing and bounding of the output bridge."""
+    print("Testing Serial Output Bridge")
+    print("=" * 40)
+    loop = asyncio.get_running_loop()
+    ok = True
+    
+    # Output pushed from another thread arrives in order, merged into few frames
+    print("1. Streaming 2000 chunks from a thread...")
+    queue: asyncio.Queue = asyncio.Queue(maxsize=10000)
+    broadcast_queues[DEVICE] = queue
+    bridge = DeviceOutputBridge(DEVICE, loop, max_pending_bytes=1024 * 1024)
+    sent = await asyncio.to_thread(produce, bridge, 2000)
+    frames = await collect(queue)
+    
+    received = "".join(frame["output"] for frame in frames)
+    contiguous = all(frames[i]["end_offset"] == frames[i + 1]["offset"] for i in range(len(frames) - 1))
+    if received == sent and contiguous and frames[-1]["end_offset"] == len(sent):
+        print(f"✓ All output delivered in order ({len(frames)} frames)")
+    else:
+        print("✗ Output lost, reordered or offsets not contiguous")
+        ok = False
+    if len(frames) < 2000:
+        print(f"✓ Chunks were coalesced ({bridge.get_stats()['chunks_coalesced']} merged)")
+    else:
+        print("✗ Every chunk became its own frame")
+        ok = False
+    
+    # A stalled loop must not let pending output grow without bound
+    print("\n2. Pushing while the event loop is stalled...")
+    bridge = DeviceOutputBridge(DEVICE, loop, max_pending_bytes=1000)
+    producer = threading.Thread(target=produce, args=(bridge, 1000))
+    producer.start()
+    time.sleep(0.3)  # Blocks the loop, so no drain can run
+    producer.join()
+    if bridge.pending_bytes <= 1000 + 20:
+        print(f"✓ Pending output stayed bounded ({bridge.pending_bytes} bytes)")
+    else:
+        print(f"✗ Pending output grew to {bridge.pending_bytes} bytes")
+        ok = False
+    
+    frames = await collect(queue)
+    if frames and bridge.get_stats()["chunks_dropped"] and frames[0]["offset"] > 0:
+        print(f"✓ Oldest output dropped; the frame's offset shows the gap (starts at {frames[0]['offset']})")
+    else:
+        print("✗ Expected dropped chunks and a gap in the offsets")
+        ok = False
+    
+    broadcast_queues.pop(DEVICE, None)
+    print("\n" + "=" * 40)
+    print("All tests passed! 🎉" if ok else "Some tests failed.")
+    return ok
+
+def test_push_after_loop_closed() -> bool:
+    """Pushing after the loop is gone (server shutdown) must not raise in the reader thread."""
+    loop = asyncio.new_event_loop()
+    bridge = DeviceOutputBridge(DEVICE, loop, max_pending_bytes=1024)
+    loop.close()
+    try:
+        bridge.push("late\n", 0, 5)
+    except Exception as e:
+        print(f"✗ Push after shutdown raised {e!r}")
+        return False
+    print("✓ Push after loop shutdown is ignored")
+    return True
+
+if __name__ == "__main__":
+    passed = asyncio.run(test_output_bridge())
+    passed = test_push_after_loop_closed() and passed
+    sys.exit(0 if passed else 1)
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""Test script for the multiplexed serial reader, using pseudo-terminals instead of boards."""
+
+import os
+import pty
+import sys
+import time
+import threading
+
+# Add the backend directory to the Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from test_helpers import use_temp_workdir, wait_for
+
+use_temp_workdir()
+
+from device_handler.serial_manager import SerialDeviceManager
+
+def open_fake_device():
+    """Open a pty pair; the slave path stands in for a serial port."""
+    master_fd, slave_fd = pty.openpty()
+    return master_fd, os.ttyname(slave_fd), slave_fd
+
+def test_serial_reader() -> bool:
+    """Test the shared serial reader thread with several fake devices."""
+    print("Testing Multiplexed Serial Reader")
+    print("=" * 40)
+    manager = SerialDeviceManager(buffer_capacity=4096)
+    devices = {device_id: open_fake_device() for device_id in (1, 2, 3)}
+    received = {device_id: [] for device_id in devices}
+    ok = True
+    
+    # Start reading every device
+    print("1. Starting readers...")
+    for device_id, (_, port, _) in devices.items():
+        if not manager.start_reading_device(device_id, port):
+            print(f"✗ Could not open {port}")
+            return False
+        manager.add_output_callback(device_id, lambda output, start, end, device_id=device_id:
+                                    received[device_id].append((output, start, end)))
+    readers = [thread for thread in threading.enumerate() if thread.name == "serial-reader"]
+    if len(readers) == 1:
+        print("✓ One reader thread serves all devices")
+    else:
+        print(f"✗ Expected one reader thread, found {len(readers)}")
+        ok = False
+    
+    # Interleaved writes, including a line split across two writes
+    print("\n2. Writing interleaved output...")
+    for device_id, (master_fd, _, _) in devices.items():
+        os.write(master_fd, f"hello from {device_id}\n".encode())
+    os.write(devices[2][0], b"split ")
+    time.sleep(0.1)
+    os.write(devices[2][0], b"line\n")
+    
+    expected = {1: "hello from 1\n", 2: "hello from 2\nsplit line\n", 3: "hello from 3\n"}
+    if wait_for(lambda: all(manager.get_device_output(d) == text for d, text in expected.items())):
+        print("✓ Each device kept its own output, partial lines joined")
+    else:
+        print(f"✗ Unexpected output: {[manager.get_device_output(d) for d in devices]}")
+        ok = False
+    
+    # Callback offsets must be contiguous and match the buffer
+    print("\n3. Checking stream offsets...")
+    chunks = received[2]
+    contiguous = all(chunks[i][2] == chunks[i + 1][1] for i in range(len(chunks) - 1))
+    _, _, end_offset = manager.read_device_output(2)
+    if chunks and chunks[0][1] == 0 and contiguous and chunks[-1][2] == end_offset:
+        print(f"✓ Offsets contiguous up to {end_offset}")
+    else:
+        print(f"✗ Bad offsets: {[(start, end) for _, start, end in chunks]}")
+        ok = False
+    
+    data, _, _ = manager.read_device_output(2, since_offset=len("hello from 2\n"))
+    if data == b"split line\n":
+        print("✓ Reading after an offset returns only newer output")
+    else:
+        print(f"✗ Read after offset returned {data!r}")
+        ok = False
+    
+    # Stopping one device must not disturb the others
+    print("\n4. Stopping one device...")
+    manager.stop_reading_device(1)
+    os.write(devices[3][0], b"still here\n")
+    if wait_for(lambda: manager.get_device_output(3).endswith("still here\n")) and not manager.is_device_connected(1):
+        print("✓ Other devices keep streaming")
+    else:
+        print("✗ Stopping device 1 affected device 3")
+        ok = False
+    
+    # A closed port is dropped instead of spinning the reader
+    print("\n5. Closing a port from the device side...")
+    master_fd, _, slave_fd = devices[3]
+    os.close(master_fd)
+    os.close(slave_fd)
+    if wait_for(lambda: not manager.is_device_connected(3)):
+        print("✓ Disconnected device was dropped")
+    else:
+        print("✗ Disconnected device still registered")
+        ok = False
+    
+    manager.stop_all_devices()
+    if wait_for(lambda: not any(thread.name == "serial-reader" for thread in threading.enumerate())):
+        print("✓ Reader thread stopped")
+    else:
+        print("✗ Reader thread still running after stop_all_devices")
+        ok = False
+    
+    print("\n" + "=" * 40)
+    print("All tests passed! 🎉" if ok else "Some tests failed.")
+    return ok
+
+if __name__ == "__main__":
+    sys.exit(0 if test_serial_reader() else 1)
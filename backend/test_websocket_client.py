@@ -13,7 +13,7 @@ async def test_device_websocket():
     """Test device WebSocket connection manually."""
     
     # Configuration
-    device_number = 0  # Change this to test different devices
+    device_number = 1  # Stable device ID from GET /devices; change this to test different devices
     uri = f"ws://localhost:8000/devices/read/{device_number}"
     
     # Test credentials (change these to your test user)
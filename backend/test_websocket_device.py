@@ -124,7 +124,7 @@ class DeviceWebSocketTester:
             logger.error(f"✗ Invalid device WebSocket test failed: {e}")
             return False
     
-    async def test_device_websocket_no_auth(self, device_number: int = 0) -> bool:
+    async def test_device_websocket_no_auth(self, device_number: int = 1) -> bool:
         """Test WebSocket connection without authentication."""
         try:
             uri = f"{self.ws_url}/devices/read/{device_number}"
@@ -147,7 +147,7 @@ class DeviceWebSocketTester:
             logger.error(f"✗ No auth WebSocket test failed: {e}")
             return False
     
-    async def test_device_websocket_wrong_credentials(self, device_number: int = 0) -> bool:
+    async def test_device_websocket_wrong_credentials(self, device_number: int = 1) -> bool:
         """Test WebSocket connection with wrong credentials."""
         try:
             uri = f"{self.ws_url}/devices/read/{device_number}"
@@ -174,7 +174,7 @@ class DeviceWebSocketTester:
             logger.error(f"✗ Wrong credentials WebSocket test failed: {e}")
             return False
     
-    async def test_device_websocket_no_slot(self, device_number: int = 0) -> bool:
+    async def test_device_websocket_no_slot(self, device_number: int = 1) -> bool:
         """Test WebSocket connection without booked slot."""
         try:
             uri = f"{self.ws_url}/devices/read/{device_number}"
@@ -197,7 +197,7 @@ class DeviceWebSocketTester:
             logger.error(f"✗ No slot WebSocket test failed: {e}")
             return False
     
-    async def test_device_websocket_success(self, device_number: int = 0) -> bool:
+    async def test_device_websocket_success(self, device_number: int = 1) -> bool:
         """Test successful WebSocket connection (assuming slot is booked)."""
         try:
             uri = f"{self.ws_url}/devices/read/{device_number}"
@@ -272,7 +272,7 @@ void loop() {
             logger.error(f"✗ Code compilation test failed: {e}")
             return False
     
-    def test_code_upload_no_auth(self, device_number: int = 0) -> bool:
+    def test_code_upload_no_auth(self, device_number: int = 1) -> bool:
         """Test code upload without authentication."""
         try:
             test_code = "void setup(){} void loop(){}"
@@ -305,6 +305,8 @@ void loop() {
         logger.info("\n--- Testing Basic API ---")
         devices = await self.test_device_list()
         device_count = devices.get("count", 0)
+        # Devices are addressed by their stable ID, not their position in the list
+        device_number = devices["devices"][0]["id"] if device_count else 1
         
         if device_count == 0:
             logger.warning("No devices found. Some tests may fail.")
@@ -316,17 +318,17 @@ void loop() {
         
         # Test device upload
         logger.info("\n--- Testing Device Upload ---")
-        self.test_code_upload_no_auth()
+        self.test_code_upload_no_auth(device_number)
         
         # Test WebSocket functionality
         logger.info("\n--- Testing WebSocket Functionality ---")
         await self.test_device_websocket_invalid_device()
         
         if device_count > 0:
-            await self.test_device_websocket_no_auth()
-            await self.test_device_websocket_wrong_credentials()
-            await self.test_device_websocket_no_slot()
-            await self.test_device_websocket_success()
+            await self.test_device_websocket_no_auth(device_number)
+            await self.test_device_websocket_wrong_credentials(device_number)
+            await self.test_device_websocket_no_slot(device_number)
+            await self.test_device_websocket_success(device_number)
         else:
             logger.warning("Skipping device-specific WebSocket tests (no devices)")
         
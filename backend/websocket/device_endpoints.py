@@ -1,19 +1,24 @@
 """WebSocket endpoints for device serial communication."""
 
 import json
+import math
 import time
 import asyncio
+import threading
 import logging
 from datetime import datetime
-from typing import Dict, Set
+from typing import Dict, List, Optional, Set, Tuple
 from fastapi import WebSocket, WebSocketDisconnect, HTTPException
 from pydantic import BaseModel
 
-from device_handler.get_devices import connected_devices, detect_serial_devices
+from device_handler.registry import device_registry
 from device_handler.serial_manager import serial_manager
-from auth.local_auth import LocalAuthService
+from device_handler.device_locks import device_leases
+from auth.local_auth import validate_user_credentials
+from auth.admission import AdmissionRejected
 from auth.jwt_utils import decode_access_token
-from database.operations import get_database_connection
+from core.slot_manager import is_slot_booked_by
+from core.config import SERIAL_CONFIG
 
 logger = logging.getLogger(__name__)
 
@@ -27,6 +32,98 @@ class DeviceLoginRequest(BaseModel):
 device_connections: Dict[int, Set[WebSocket]] = {}
 broadcast_queues: Dict[int, asyncio.Queue] = {}
 
+class DeviceOutputBridge:
+    """
+    Hands serial output from the reader thread to the event loop.
+
+    The reader thread only appends to a locked list and, if no drain is
+    pending, schedules one with call_soon_threadsafe. The drain runs on the
+    loop and merges everything that arrived in the meantime into a single
+    serial_output frame.
+    """
+    
+    def __init__(self, device_number: int, loop: asyncio.AbstractEventLoop, max_pending_bytes: int):
+        self.device_number = device_number
+        self.loop = loop
+        self.max_pending_bytes = max_pending_bytes
+        self.pending: List[Tuple[str, int, int]] = []
+        self.pending_bytes = 0
+        self.drain_scheduled = False
+        self.lock = threading.Lock()
+        self.frames_sent = 0
+        self.chunks_coalesced = 0
+        self.chunks_dropped = 0
+        self.frames_dropped = 0
+    
+    def push(self, output: str, start_offset: int, end_offset: int) -> None:
+        """Accept a chunk of output. Safe to call from any thread."""
+        with self.lock:
+            self.pending.append((output, start_offset, end_offset))
+            self.pending_bytes += end_offset - start_offset
+            # Bound memory if the loop falls behind; clients see the gap via offsets
+            while self.pending_bytes > self.max_pending_bytes and len(self.pending) > 1:
+                _, dropped_start, dropped_end = self.pending.pop(0)
+                self.pending_bytes -= dropped_end - dropped_start
+                self.chunks_dropped += 1
+            if self.drain_scheduled:
+                return
+            self.drain_scheduled = True
+        
+        try:
+            self.loop.call_soon_threadsafe(self._drain)
+        except RuntimeError:
+            # Event loop is closed (shutting down)
+            with self.lock:
+                self.drain_scheduled = False
+    
+    def _drain(self) -> None:
+        """Merge pending chunks into one frame and queue it. Runs on the event loop."""
+        with self.lock:
+            chunks, self.pending = self.pending, []
+            self.pending_bytes = 0
+            self.drain_scheduled = False
+        
+        queue = broadcast_queues.get(self.device_number)
+        if not chunks or queue is None:
+            return
+        
+        self.chunks_coalesced += len(chunks) - 1
+        message = json.dumps({
+            "type": "serial_output",
+            "device_number": self.device_number,
+            "output": "".join(chunk[0] for chunk in chunks),
+            "offset": chunks[0][1],
+            "end_offset": chunks[-1][2],
+            "timestamp": datetime.now().isoformat()
+        })
+        
+        if queue.full():
+            # Prefer fresh output over stale frames
+            queue.get_nowait()
+            queue.task_done()
+            self.frames_dropped += 1
+        queue.put_nowait(message)
+        self.frames_sent += 1
+    
+    def get_stats(self) -> Dict[str, int]:
+        """Get counters for monitoring."""
+        return {
+            "frames_sent": self.frames_sent,
+            "chunks_coalesced": self.chunks_coalesced,
+            "chunks_dropped": self.chunks_dropped,
+            "frames_dropped": self.frames_dropped
+        }
+
+# Output bridges per device, created when reading starts
+output_bridges: Dict[int, DeviceOutputBridge] = {}
+
+# Per-device locks serializing serial reader starts
+stream_start_locks: Dict[int, asyncio.Lock] = {}
+
+def get_device_stream_stats() -> Dict[int, Dict[str, int]]:
+    """Get serial streaming counters for every device that has been read."""
+    return {device_number: bridge.get_stats() for device_number, bridge in output_bridges.items()}
+
 def get_current_time_slot() -> int:
     """Get the current time slot based on current hour."""
     current_hour = datetime.now().hour
@@ -34,23 +131,14 @@ def get_current_time_slot() -> int:
 
 def is_user_slot_booked(user_email: str, slot_id: int) -> bool:
     """Check if the user has booked the specified time slot."""
-    try:
-        with get_database_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "SELECT is_booked, booked_by FROM slots WHERE id = ? AND booked_by = ?",
-                (slot_id, user_email)
-            )
-            result = cursor.fetchone()
-            return result is not None and result["is_booked"]
-    except Exception as e:
-        logger.error(f"Error checking user slot booking: {e}")
-        return False
+    return is_slot_booked_by(slot_id, user_email)
 
-def authenticate_user_for_device(email: str, password: str) -> bool:
-    """Authenticate user for device access."""
-    user_profile = LocalAuthService.authenticate_user(email, password)
-    return user_profile is not None
+async def authenticate_user_for_device(email: str, password: str, ip: Optional[str]) -> Optional[str]:
+    """
+    Authenticate user for device access and return their email.
+    Returns None if authentication fails; raises AdmissionRejected if throttled.
+    """
+    return await validate_user_credentials(email, password, ip)
 
 async def add_device_connection(device_number: int, websocket: WebSocket) -> None:
     """Add a WebSocket connection for a device."""
@@ -113,29 +201,59 @@ async def broadcast_to_device_connections(device_number: int, message: str) -> N
         device_connections[device_number].discard(websocket)
 
 def setup_device_output_callback(device_number: int) -> None:
-    """Set up callback for when device output is updated."""
-    def output_callback(output: str):
-        message = {
-            "type": "serial_output",
-            "device_number": device_number,
-            "output": output,
-            "timestamp": datetime.now().isoformat()
-        }
-        
-        # Queue the message for broadcasting
-        if device_number in broadcast_queues:
-            try:
-                broadcast_queues[device_number].put_nowait(json.dumps(message))
-            except asyncio.QueueFull:
-                logger.warning(f"Broadcast queue full for device {device_number}")
+    """Set up callback that streams each new chunk of device output via the loop bridge."""
+    bridge = output_bridges.get(device_number)
+    loop = asyncio.get_running_loop()
+    if bridge is None or bridge.loop is not loop:
+        bridge = DeviceOutputBridge(device_number, loop, SERIAL_CONFIG["max_pending_bytes"])
+        output_bridges[device_number] = bridge
     
-    serial_manager.add_output_callback(device_number, output_callback)
+    serial_manager.add_output_callback(device_number, bridge.push)
+
+async def start_device_stream(device_number: int, device_port: str) -> bool:
+    """Start the serial reader for a device and stream its output to the loop bridge."""
+    # Opening the port blocks, so it runs in a thread; the lock keeps two viewers
+    # from starting the reader twice and lets a new lease wait for the start to finish
+    async with stream_start_locks.setdefault(device_number, asyncio.Lock()):
+        if serial_manager.is_device_connected(device_number):
+            return True
+        if device_leases.is_flashing(device_number):
+            # An upload took the device meanwhile; the reader resumes when it is done
+            return True
+        logger.info(f"Device {device_number} not connected, starting connection")
+        success = await asyncio.to_thread(serial_manager.start_reading_device, device_number, device_port)
+        logger.info(f"Device {device_number} connection status: {success}")
+        if success:
+            # Set up callback for this device
+            setup_device_output_callback(device_number)
+        return success
+
+async def handle_device_lease_change(device_number: int, state: str) -> None:
+    """Pause streaming while a device is flashed and resume it for remaining viewers afterwards."""
+    if device_number not in device_connections:
+        return
+    
+    if state == "flashing":
+        # Let a reader start that is already in progress finish before the lease stops it
+        async with stream_start_locks.setdefault(device_number, asyncio.Lock()):
+            pass
+    elif state == "ready":
+        device = device_registry.get_device(device_number)
+        if device is None or not await start_device_stream(device_number, device["port"]):
+            state = "unavailable"
+    
+    await broadcast_to_device_connections(device_number, json.dumps({
+        "type": "device_status",
+        "device_number": device_number,
+        "status": state,
+        "timestamp": datetime.now().isoformat()
+    }))
+
+device_leases.add_listener(handle_device_lease_change)
 
 def validate_device_number(device_number: int) -> bool:
     """Validate that the device number exists."""
-    global connected_devices
-    connected_devices = detect_serial_devices()  # Refresh device list
-    return 0 <= device_number < len(connected_devices)
+    return device_registry.get_device(device_number) is not None
 
 async def device_read_websocket_endpoint(websocket: WebSocket, device_number: int):
     """WebSocket endpoint for reading device serial output."""
@@ -167,9 +285,19 @@ async def device_read_websocket_endpoint(websocket: WebSocket, device_number: in
                 except Exception:
                     email = None
             elif isinstance(auth_message, dict) and auth_message.get("email") and auth_message.get("password"):
-                # Fallback legacy authentication
-                if authenticate_user_for_device(auth_message["email"], auth_message["password"]):
-                    email = auth_message["email"]
+                # Fallback legacy authentication, rate limited like the login route
+                client_host = websocket.client.host if websocket.client else None
+                try:
+                    email = await authenticate_user_for_device(auth_message["email"], auth_message["password"], client_host)
+                except AdmissionRejected as e:
+                    error_msg = {
+                        "type": "error",
+                        "message": str(e),
+                        "retry_after": math.ceil(e.retry_after)
+                    }
+                    await websocket.send_text(json.dumps(error_msg))
+                    await websocket.close()
+                    return
             
             if not email:
                 error_msg = {
@@ -197,31 +325,44 @@ async def device_read_websocket_endpoint(websocket: WebSocket, device_number: in
             await add_device_connection(device_number, websocket)
             
             # Start reading from device if not already started
-            device = connected_devices[device_number]
+            device = device_registry.get_device(device_number)
+            if device is None:
+                error_msg = {
+                    "type": "error",
+                    "message": f"Device {device_number} was disconnected"
+                }
+                await websocket.send_text(json.dumps(error_msg))
+                await websocket.close()
+                return
             device_port = device["port"]
             logger.info(f"Attempting to connect to device {device_number} ({device['model']} on {device_port})")
-            if not serial_manager.is_device_connected(device_number):
-                logger.info(f"Device {device_number} not connected, starting connection")
-                success = serial_manager.start_reading_device(device_number, device_port)
-                logger.info(f"Device {device_number} connection status: {success}")
-                if not success:
-                    error_msg = {
-                        "type": "error",
-                        "message": f"Failed to start reading from device {device_number}"
-                    }
-                    await websocket.send_text(json.dumps(error_msg))
-                    await websocket.close()
-                    return
-                
-                # Set up callback for this device
-                setup_device_output_callback(device_number)
-            logger.info(f"Started reading from device {device_number} ({device['model']} on {device_port})")
-            # Send current output to new connection
-            current_output = serial_manager.get_device_output(device_number)
+            if device_leases.is_flashing(device_number):
+                # The upload owns the port; the reader is resumed when the lease ends
+                await websocket.send_text(json.dumps({
+                    "type": "device_status",
+                    "device_number": device_number,
+                    "status": "flashing",
+                    "timestamp": datetime.now().isoformat()
+                }))
+            elif not await start_device_stream(device_number, device_port):
+                error_msg = {
+                    "type": "error",
+                    "message": f"Failed to start reading from device {device_number}"
+                }
+                await websocket.send_text(json.dumps(error_msg))
+                await websocket.close()
+                return
+            else:
+                logger.info(f"Started reading from device {device_number} ({device['model']} on {device_port})")
+            # Send the buffered backlog once; later messages carry only new output
+            backlog, start_offset, end_offset = serial_manager.read_device_output(device_number)
             initial_msg = {
                 "type": "serial_output",
                 "device_number": device_number,
-                "output": current_output,
+                "output": backlog.decode('utf-8', errors='ignore'),
+                "offset": start_offset,
+                "end_offset": end_offset,
+                "backlog": True,
                 "timestamp": datetime.now().isoformat()
             }
             await websocket.send_text(json.dumps(initial_msg))
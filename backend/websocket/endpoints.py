@@ -3,20 +3,30 @@
 import json
 import logging
 from fastapi import WebSocket, WebSocketDisconnect
-from websocket.manager import add_connection, remove_connection, send_initial_slots
-from websocket.handlers import process_client_message
+from websocket.manager import add_connection, remove_connection, send_initial_slots, send_to_connection
+from websocket.handlers import process_client_message, handle_authenticate
 from core.models import create_error_response
 
 logger = logging.getLogger(__name__)
 
 async def websocket_endpoint(websocket: WebSocket):
-    """WebSocket endpoint for slot booking."""
+    """
+    WebSocket endpoint for slot booking.
+
+    Clients authenticate once per connection, either with a ?token= query
+    parameter or an {"type": "authenticate", "token": "..."} message;
+    booking and cancellation messages then carry no credentials.
+    """
     await websocket.accept()
     await add_connection(websocket)
     
     # Send initial slot information
     await send_initial_slots(websocket)
     
+    token = websocket.query_params.get("token")
+    if token:
+        await handle_authenticate(websocket, token)
+    
     try:
         while True:
             # Wait for messages from client
@@ -28,7 +38,7 @@ async def websocket_endpoint(websocket: WebSocket):
                 
             except json.JSONDecodeError:
                 error_response = create_error_response("Invalid JSON format")
-                await websocket.send_text(json.dumps(error_response))
+                await send_to_connection(websocket, error_response)
                 
     except WebSocketDisconnect:
         logger.info("Client disconnected")
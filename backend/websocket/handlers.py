@@ -1,6 +1,5 @@
 """WebSocket message handlers for the Slot Booking API."""
 
-import json
 import logging
 from typing import Dict
 from fastapi import WebSocket
@@ -8,27 +7,83 @@ from core.models import (
     create_booking_response, 
     create_cancellation_response, 
     create_error_response,
-    create_slots_message
+    create_slot_changed_message,
+    create_session_message,
+    create_my_slots_message,
+    describe_slot_outcome
+)
+from core.slot_manager import book_slot, cancel_slot_booking, get_slot_changes_since, get_user_slot_ids
+from websocket.manager import (
+    broadcast_slot_update, send_snapshot, send_to_connection, send_to_user,
+    bind_session, unbind_session, expire_session, get_session_email
 )
-from core.slot_manager import book_slot, cancel_slot_booking, get_slot_summary
-from websocket.manager import broadcast_slot_update
 from auth.local_auth import validate_user_credentials
+from auth.admission import AdmissionRejected
 from auth.jwt_utils import decode_access_token
+from core.executors import run_db
 
 logger = logging.getLogger(__name__)
 
-async def handle_slot_booking(slot_id: int, email: str | None = None, password: str | None = None, token: str | None = None) -> Dict:
-    """Handle slot booking request with authentication and return response message."""
-    # Resolve user via token or legacy credentials
+def has_message_auth(websocket: WebSocket, message_data: Dict) -> bool:
+    """Check whether a message can be attributed to a user at all."""
+    return bool(
+        get_session_email(websocket)
+        or message_data.get("token")
+        or (message_data.get("email") and message_data.get("password"))
+    )
+
+async def resolve_message_user(websocket: WebSocket, message_data: Dict) -> str | None:
+    """
+    Get the user a booking message acts for.
+    Uses the connection's session; credentials in the message are only
+    consulted for legacy clients that never completed the handshake.
+    """
+    user_email = get_session_email(websocket)
+    if user_email:
+        return user_email
+    
+    token = message_data.get("token")
+    email = message_data.get("email")
+    password = message_data.get("password")
+    if token:
+        try:
+            claims = decode_access_token(token)
+            return claims.get("sub")
+        except Exception:
+            return None
+    if email and password:
+        # Raises AdmissionRejected when this client or account is throttled
+        client_host = websocket.client.host if websocket.client else None
+        return await validate_user_credentials(email, password, client_host)
+    return None
+
+async def handle_authenticate(websocket: WebSocket, token: str | None) -> bool:
+    """Bind the connection to the token's user and send them their session state."""
     user_email = None
+    expires_at = None
     if token:
         try:
             claims = decode_access_token(token)
             user_email = claims.get("sub")
+            expires_at = float(claims["exp"]) if "exp" in claims else None
         except Exception:
             user_email = None
-    elif email and password:
-        user_email = await validate_user_credentials(email, password)
+    if not user_email:
+        # A failed re-authentication must not leave the previous user bound
+        unbind_session(websocket)
+        await send_to_connection(websocket, create_error_response("Authentication failed. Invalid token."))
+        return False
+    
+    bind_session(websocket, user_email, expires_at)
+    await send_to_connection(websocket, create_session_message(user_email, get_user_slot_ids(user_email)))
+    return True
+
+async def push_user_slots(user_email: str) -> None:
+    """Tell every session of a user which slots they now hold."""
+    await send_to_user(user_email, create_my_slots_message(get_user_slot_ids(user_email)))
+
+async def handle_slot_booking(slot_id: int, user_email: str | None) -> Dict:
+    """Handle slot booking request for an authenticated user and return response message."""
     if not user_email:
         return create_booking_response(
             success=False,
@@ -36,33 +91,21 @@ async def handle_slot_booking(slot_id: int, email: str | None = None, password:
             slot_id=slot_id
         )
     
-    if book_slot(slot_id, user_email):
+    outcome = await run_db(book_slot, slot_id, user_email)
+    if outcome.success:
         # Broadcast update to all connections
         await broadcast_slot_update()
-        
-        return create_booking_response(
-            success=True,
-            message=f"Slot {slot_id} booked successfully",
-            slot_id=slot_id
-        )
-    else:
-        return create_booking_response(
-            success=False,
-            message=f"Slot {slot_id} is not available",
-            slot_id=slot_id
-        )
+        await push_user_slots(user_email)
+    
+    return create_booking_response(
+        success=outcome.success,
+        message=describe_slot_outcome(outcome, slot_id),
+        slot_id=slot_id,
+        outcome=outcome.value
+    )
 
-async def handle_slot_cancellation(slot_id: int, email: str | None = None, password: str | None = None, token: str | None = None) -> Dict:
-    """Handle slot cancellation request with authentication and return response message."""
-    user_email = None
-    if token:
-        try:
-            claims = decode_access_token(token)
-            user_email = claims.get("sub")
-        except Exception:
-            user_email = None
-    elif email and password:
-        user_email = await validate_user_credentials(email, password)
+async def handle_slot_cancellation(slot_id: int, user_email: str | None) -> Dict:
+    """Handle slot cancellation request for an authenticated user and return response message."""
     if not user_email:
         return create_cancellation_response(
             success=False,
@@ -70,65 +113,83 @@ async def handle_slot_cancellation(slot_id: int, email: str | None = None, passw
             slot_id=slot_id
         )
     
-    if cancel_slot_booking(slot_id, user_email):
+    outcome = await run_db(cancel_slot_booking, slot_id, user_email)
+    if outcome.success:
         # Broadcast update to all connections
         await broadcast_slot_update()
-        
-        return create_cancellation_response(
-            success=True,
-            message=f"Slot {slot_id} booking cancelled successfully",
-            slot_id=slot_id
-        )
-    else:
-        return create_cancellation_response(
-            success=False,
-            message=f"Slot {slot_id} was not booked by you or does not exist",
-            slot_id=slot_id
-        )
-
-async def handle_get_slots() -> Dict:
-    """Handle get slots request and return current slots."""
-    slot_summary = get_slot_summary()
-    return create_slots_message(
-        slot_summary["slots"],
-        slot_summary["available_slots"],
-        slot_summary["booked_slots"]
+        await push_user_slots(user_email)
+    
+    return create_cancellation_response(
+        success=outcome.success,
+        message=describe_slot_outcome(outcome, slot_id),
+        slot_id=slot_id,
+        outcome=outcome.value
     )
 
+async def handle_get_slots(websocket: WebSocket) -> None:
+    """Handle get slots request by sending the cached full snapshot."""
+    await send_snapshot(websocket)
+
+async def handle_resync(websocket: WebSocket, version) -> None:
+    """
+    Bring a client that detected a version gap up to date.
+    Sends the missing deltas when the change log still has them, otherwise a snapshot.
+    """
+    changes = get_slot_changes_since(version) if isinstance(version, int) else None
+    
+    if changes is None:
+        await send_snapshot(websocket)
+        return
+    
+    for change in changes:
+        await send_to_connection(websocket, create_slot_changed_message(change["slot"], change["version"]))
+
 async def process_client_message(websocket: WebSocket, message_data: Dict) -> None:
     """Process incoming message from client."""
+    try:
+        await dispatch_client_message(websocket, message_data)
+    except AdmissionRejected as e:
+        await send_to_connection(websocket, create_error_response(str(e)))
+
+async def dispatch_client_message(websocket: WebSocket, message_data: Dict) -> None:
+    """Route a client message to its handler."""
     message_type = message_data.get("type")
     
-    if message_type == "book_slot":
+    if message_type in ("book_slot", "cancel_slot") and expire_session(websocket):
+        await send_to_connection(websocket, create_error_response("Session expired. Please authenticate again."))
+        return
+    
+    if message_type == "authenticate":
+        await handle_authenticate(websocket, message_data.get("token"))
+    
+    elif message_type == "book_slot":
         slot_id = message_data.get("slot_id")
-        email = message_data.get("email")
-        password = message_data.get("password")
-        token = message_data.get("token")
         
-        if slot_id is not None and (token or (email and password)):
-            response = await handle_slot_booking(slot_id, email, password, token)
-            await websocket.send_text(json.dumps(response))
+        if slot_id is not None and has_message_auth(websocket, message_data):
+            user_email = await resolve_message_user(websocket, message_data)
+            response = await handle_slot_booking(slot_id, user_email)
+            await send_to_connection(websocket, response)
         else:
             error_response = create_error_response("Missing slot_id or auth in booking request")
-            await websocket.send_text(json.dumps(error_response))
+            await send_to_connection(websocket, error_response)
     
     elif message_type == "cancel_slot":
         slot_id = message_data.get("slot_id")
-        email = message_data.get("email")
-        password = message_data.get("password")
-        token = message_data.get("token")
         
-        if slot_id is not None and (token or (email and password)):
-            response = await handle_slot_cancellation(slot_id, email, password, token)
-            await websocket.send_text(json.dumps(response))
+        if slot_id is not None and has_message_auth(websocket, message_data):
+            user_email = await resolve_message_user(websocket, message_data)
+            response = await handle_slot_cancellation(slot_id, user_email)
+            await send_to_connection(websocket, response)
         else:
             error_response = create_error_response("Missing slot_id or auth in cancellation request")
-            await websocket.send_text(json.dumps(error_response))
+            await send_to_connection(websocket, error_response)
     
     elif message_type == "get_slots":
-        slots_message = await handle_get_slots()
-        await websocket.send_text(json.dumps(slots_message))
+        await handle_get_slots(websocket)
+    
+    elif message_type == "resync":
+        await handle_resync(websocket, message_data.get("version"))
     
     else:
         error_response = create_error_response(f"Unknown message type: {message_type}")
-        await websocket.send_text(json.dumps(error_response))
+        await send_to_connection(websocket, error_response)
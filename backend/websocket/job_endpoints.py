@@ -0,0 +1,68 @@
+"""WebSocket endpoint streaming compile/upload job progress and logs."""
+
+import json
+import logging
+from fastapi import WebSocket, WebSocketDisconnect
+
+from auth.jwt_utils import decode_access_token
+from device_handler.job_queue import job_queue
+
+logger = logging.getLogger(__name__)
+
+async def job_stream_websocket_endpoint(websocket: WebSocket, job_id: str):
+    """
+    Stream a job's status changes and arduino-cli output.
+
+    The client first sends {"token": "..."}; it then receives a "job" message
+    with the status and log so far, followed by "log" and "status" messages
+    until the job finishes.
+    """
+    await websocket.accept()
+
+    try:
+        auth_data = await websocket.receive_text()
+        try:
+            claims = decode_access_token(json.loads(auth_data).get("token") or "")
+            email = claims.get("sub")
+        except Exception:
+            email = None
+
+        info = await job_queue.get_job_info(job_id) if email else None
+        if info is None or info["user_email"] != email:
+            await websocket.send_text(json.dumps({
+                "type": "error",
+                "message": "Authentication failed" if not email else f"Job {job_id} not found"
+            }))
+            await websocket.close()
+            return
+
+        job = job_queue.get_active_job(job_id)
+        queue = job_queue.subscribe(job) if job is not None else None
+        try:
+            # Re-read after subscribing so no event falls between the snapshot and the stream
+            info = await job_queue.get_job_info(job_id)
+            info.pop("user_email", None)
+            await websocket.send_text(json.dumps({"type": "job", "job": info}))
+
+            while queue is not None and info["status"] in ("queued", "running"):
+                event = await queue.get()
+                if event["type"] == "resync":
+                    # We fell behind; send the full state again
+                    info = await job_queue.get_job_info(job_id)
+                    info.pop("user_email", None)
+                    await websocket.send_text(json.dumps({"type": "job", "job": info}))
+                    continue
+
+                await websocket.send_text(json.dumps(event))
+                if event["type"] == "status":
+                    info["status"] = event["status"]
+        finally:
+            if queue is not None:
+                job_queue.unsubscribe(job, queue)
+
+        await websocket.close()
+
+    except WebSocketDisconnect:
+        logger.info(f"Client disconnected from job {job_id} stream")
+    except Exception as e:
+        logger.error(f"WebSocket error for job {job_id} stream: {e}")
@@ -1,75 +1,262 @@
 """WebSocket connection management for the Slot Booking API."""
 
 import json
+import time
+import asyncio
 import logging
-from typing import Dict, List
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
 from fastapi import WebSocket
-from core.models import create_slots_message
-from core.slot_manager import get_slot_summary
+from core.config import WEBSOCKET_CONFIG
+from core.models import create_slot_changed_message
+from core.slot_manager import get_slot_changes_since, get_loaded_version, get_current_version
+from core.snapshot_cache import snapshot_cache, encode_json
 
 logger = logging.getLogger(__name__)
 
-# Global state for active connections (kept in memory for real-time updates)
-active_connections: List[WebSocket] = []
+SLOW_CONSUMER_POLICIES = ("drop_oldest", "coalesce", "disconnect")
+
+class ClientConnection:
+    """
+    A registered WebSocket client with its own bounded outbound queue.
+
+    Frames are sent by a dedicated writer task, so enqueueing never awaits
+    the socket. When a client falls behind, the slow-consumer policy decides
+    what happens to queued broadcast frames; direct replies are never dropped.
+    Once the client completes the session handshake, user_email holds the
+    authenticated user until their token expires (session_expires_at).
+    """
+    
+    def __init__(self, websocket: WebSocket, queue_size: int, policy: str):
+        self.websocket = websocket
+        self.queue_size = queue_size
+        self.policy = policy
+        # Each entry is (text, is_broadcast)
+        self.queue: Deque[Tuple[str, bool]] = deque()
+        self.ready = asyncio.Event()
+        self.closed = False
+        self.dropped = 0
+        self.task: Optional[asyncio.Task] = None
+        self.user_email: Optional[str] = None
+        self.session_expires_at: Optional[float] = None
+    
+    def session_expired(self) -> bool:
+        """Whether the token the session was bound with has expired."""
+        return self.session_expires_at is not None and self.session_expires_at <= time.time()
+    
+    def start(self) -> None:
+        """Start the writer task."""
+        self.task = asyncio.create_task(self._writer())
+    
+    def enqueue(self, text: str, broadcast: bool = True,
+                snapshot_factory: Optional[Callable[[], str]] = None) -> None:
+        """Queue a frame for sending, applying the slow-consumer policy if full."""
+        if self.closed:
+            return
+        
+        if broadcast and len(self.queue) >= self.queue_size:
+            if self.policy == "disconnect":
+                logger.warning("Disconnecting slow WebSocket consumer")
+                self.dropped += len(self.queue)
+                self.close()
+                return
+            if self.policy == "coalesce" and snapshot_factory is not None:
+                # Replace every pending broadcast with one snapshot of the latest state
+                kept = deque(entry for entry in self.queue if not entry[1])
+                self.dropped += len(self.queue) - len(kept)
+                self.queue = kept
+                self.queue.append((snapshot_factory(), True))
+                self.ready.set()
+                return
+            # drop_oldest (also the coalesce fallback when no snapshot is available)
+            for entry in self.queue:
+                if entry[1]:
+                    self.queue.remove(entry)
+                    self.dropped += 1
+                    break
+        
+        self.queue.append((text, broadcast))
+        self.ready.set()
+    
+    def close(self) -> None:
+        """Stop sending and close the socket in the background."""
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.clear()
+        self.ready.set()
+        asyncio.create_task(self._close_socket())
+    
+    async def _close_socket(self) -> None:
+        """Close the underlying WebSocket, ignoring errors."""
+        try:
+            await self.websocket.close()
+        except Exception:
+            pass  # Connection might be already closed
+    
+    async def _writer(self) -> None:
+        """Send queued frames until the connection is closed."""
+        try:
+            while not self.closed:
+                if not self.queue:
+                    self.ready.clear()
+                    await self.ready.wait()
+                    continue
+                text, _ = self.queue.popleft()
+                await self.websocket.send_text(text)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"Error sending message to connection: {e}")
+        finally:
+            self.closed = True
+
+# Registry of active connections (kept in memory for real-time updates)
+connections: Dict[WebSocket, ClientConnection] = {}
+
+# Slot state version most recently broadcast to clients (None until the first broadcast)
+last_broadcast_version: Optional[int] = None
+
+# Frames dropped from queues of connections that have since closed
+dropped_frames_total = 0
 
 def get_active_connections() -> List[WebSocket]:
     """Get the list of active WebSocket connections."""
-    return active_connections
+    return list(connections)
 
 def get_connection_count() -> int:
     """Get the number of active connections."""
-    return len(active_connections)
+    return len(connections)
+
+def get_connection_stats() -> Dict:
+    """Get outbound queue statistics for monitoring."""
+    return {
+        "active_connections": len(connections),
+        "authenticated_connections": sum(1 for client in connections.values() if client.user_email),
+        "queued_frames": sum(len(client.queue) for client in connections.values()),
+        "dropped_frames": dropped_frames_total + sum(client.dropped for client in connections.values()),
+        "slow_consumer_policy": WEBSOCKET_CONFIG["slow_consumer_policy"]
+    }
 
 async def add_connection(websocket: WebSocket) -> None:
-    """Add a new WebSocket connection to active connections."""
-    active_connections.append(websocket)
-    logger.info(f"New connection added. Total connections: {len(active_connections)}")
+    """Register a new WebSocket connection and start its writer task."""
+    policy = WEBSOCKET_CONFIG["slow_consumer_policy"]
+    if policy not in SLOW_CONSUMER_POLICIES:
+        logger.warning(f"Unknown slow consumer policy '{policy}', using drop_oldest")
+        policy = "drop_oldest"
+    
+    client = ClientConnection(websocket, WEBSOCKET_CONFIG["send_queue_size"], policy)
+    connections[websocket] = client
+    client.start()
+    logger.info(f"New connection added. Total connections: {len(connections)}")
 
 async def remove_connection(websocket: WebSocket) -> None:
-    """Remove a WebSocket connection from active connections."""
-    if websocket in active_connections:
-        active_connections.remove(websocket)
-        logger.info(f"Connection removed. Total connections: {len(active_connections)}")
-
-async def broadcast_to_all_connections(message: Dict) -> None:
-    """Broadcast a message to all active WebSocket connections."""
-    if not active_connections:
+    """Unregister a WebSocket connection and stop its writer task."""
+    global dropped_frames_total
+    client = connections.pop(websocket, None)
+    if client is None:
         return
     
+    dropped_frames_total += client.dropped
+    client.closed = True
+    if client.task is not None:
+        client.task.cancel()
+    logger.info(f"Connection removed. Total connections: {len(connections)}")
+
+def bind_session(websocket: WebSocket, user_email: str, expires_at: Optional[float] = None) -> None:
+    """Attach an authenticated user to a connection until expires_at (a Unix timestamp)."""
+    client = connections.get(websocket)
+    if client is not None:
+        client.user_email = user_email
+        client.session_expires_at = expires_at
+
+def unbind_session(websocket: WebSocket) -> None:
+    """Detach the user from a connection, e.g. after a failed re-authentication."""
+    client = connections.get(websocket)
+    if client is not None:
+        client.user_email = None
+        client.session_expires_at = None
+
+def expire_session(websocket: WebSocket) -> bool:
+    """Unbind a connection whose token has expired. Returns True if it had."""
+    client = connections.get(websocket)
+    if client is None or client.user_email is None or not client.session_expired():
+        return False
+    logger.info(f"WebSocket session for {client.user_email} expired")
+    unbind_session(websocket)
+    return True
+
+def get_session_email(websocket: WebSocket) -> Optional[str]:
+    """Get the user a connection authenticated as, or None (also once their token has expired)."""
+    client = connections.get(websocket)
+    if client is None or client.session_expired():
+        return None
+    return client.user_email
+
+async def send_to_user(user_email: str, message: Dict) -> None:
+    """Send a direct message to every connection authenticated as a user."""
     message_json = json.dumps(message)
-    disconnected_connections = []
-    
-    for connection in active_connections:
-        try:
-            await connection.send_text(message_json)
-        except Exception as e:
-            logger.error(f"Error sending message to connection: {e}")
-            disconnected_connections.append(connection)
+    for client in list(connections.values()):
+        if client.user_email == user_email and not client.session_expired():
+            client.enqueue(message_json, broadcast=False)
+
+async def send_to_connection(websocket: WebSocket, message: Dict) -> None:
+    """Send a direct reply to one client, in order with its broadcasts."""
+    await send_text_to_connection(websocket, json.dumps(message))
+
+async def send_text_to_connection(websocket: WebSocket, text: str) -> None:
+    """Send a pre-encoded direct reply to one client."""
+    client = connections.get(websocket)
+    if client is None:
+        await websocket.send_text(text)
+        return
+    client.enqueue(text, broadcast=False)
+
+async def broadcast_to_all_connections(message: Dict) -> None:
+    """Queue a message for every active connection without awaiting any socket."""
+    await broadcast_text_to_all_connections(encode_json(message).decode("utf-8"))
+
+async def broadcast_text_to_all_connections(message_json: str) -> None:
+    """Queue a pre-encoded message for every active connection."""
+    if not connections:
+        return
     
-    # Remove disconnected connections
-    for connection in disconnected_connections:
-        await remove_connection(connection)
+    for client in list(connections.values()):
+        client.enqueue(message_json, snapshot_factory=snapshot_cache.get_message_text)
+
+async def send_snapshot(websocket: WebSocket) -> None:
+    """Send the cached slots_snapshot message to one client."""
+    await send_text_to_connection(websocket, snapshot_cache.get_message_text())
 
 async def send_initial_slots(websocket: WebSocket) -> None:
     """Send initial slot information to a newly connected client."""
     try:
-        slot_summary = get_slot_summary()
-        initial_message = create_slots_message(
-            slot_summary["slots"],
-            slot_summary["available_slots"],
-            slot_summary["booked_slots"]
-        )
-        await websocket.send_text(json.dumps(initial_message))
+        await send_snapshot(websocket)
         logger.info("Initial slots data sent to new connection")
     except Exception as e:
         logger.error(f"Error sending initial slots: {e}")
 
 async def broadcast_slot_update() -> None:
-    """Broadcast slot update to all active connections."""
-    slot_summary = get_slot_summary()
-    update_message = create_slots_message(
-        slot_summary["slots"],
-        slot_summary["available_slots"],
-        slot_summary["booked_slots"]
-    )
-    await broadcast_to_all_connections(update_message)
+    """
+    Broadcast slot changes since the last broadcast as slot_changed deltas.
+    Falls back to a full snapshot if the change log no longer covers the gap.
+    """
+    global last_broadcast_version
+    since_version = last_broadcast_version
+    if since_version is None:
+        # Nothing broadcast yet; clients were sent snapshots of the loaded state or later
+        since_version = get_loaded_version()
+    changes = get_slot_changes_since(since_version)
+    
+    if changes is None:
+        last_broadcast_version = get_current_version()
+        await broadcast_text_to_all_connections(snapshot_cache.get_message_text())
+        return
+    
+    if not changes:
+        return
+    
+    # Claim these versions before awaiting so concurrent broadcasts don't resend them
+    last_broadcast_version = changes[-1]["version"]
+    for change in changes:
+        await broadcast_to_all_connections(create_slot_changed_message(change["slot"], change["version"]))
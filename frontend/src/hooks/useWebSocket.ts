@@ -1,7 +1,16 @@
 import { useState, useEffect, useCallback, useRef } from 'react';
-import type { SlotsData, WebSocketMessage } from '../types';
+import type { SlotChange, SlotsData, WebSocketMessage } from '../types';
 import { BACKEND_URL } from '../URLs';
 
+const applySlotChange = (data: SlotsData, change: SlotChange): SlotsData => {
+  const slots = data.slots.map((slot) => (slot.id === change.id ? { ...slot, ...change } : slot));
+  return {
+    slots,
+    available_slots: slots.filter((slot) => !slot.is_booked).map((slot) => slot.id),
+    booked_slots: slots.filter((slot) => slot.is_booked).map((slot) => slot.id),
+  };
+};
+
 export const useWebSocket = () => {
   const [slotsData, setSlotsData] = useState<SlotsData | null>(null);
   const [isConnected, setIsConnected] = useState(false);
@@ -9,6 +18,23 @@ export const useWebSocket = () => {
   const ws = useRef<WebSocket | null>(null);
   const reconnectTimeoutRef = useRef<number | undefined>(undefined);
   const reconnectAttempts = useRef(0);
+  const slotsVersion = useRef<number | null>(null);
+  const sessionToken = useRef<string | null>(null);
+  const [mySlots, setMySlots] = useState<number[]>([]);
+
+  // Authenticate the connection once; booking messages then carry no credentials
+  const ensureSession = useCallback(() => {
+    const token = localStorage.getItem('auth_token');
+    if (!token || !ws.current || ws.current.readyState !== WebSocket.OPEN) {
+      return false;
+    }
+    if (sessionToken.current !== token) {
+      const message: WebSocketMessage = { type: 'authenticate', token };
+      ws.current.send(JSON.stringify(message));
+      sessionToken.current = token;
+    }
+    return true;
+  }, []);
 
   const connect = useCallback(() => {
     try {
@@ -20,14 +46,32 @@ export const useWebSocket = () => {
         setIsConnected(true);
         setError(null);
         reconnectAttempts.current = 0;
+        sessionToken.current = null;
+        ensureSession();
       };
 
       ws.current.onmessage = (event) => {
         try {
           const message: WebSocketMessage = JSON.parse(event.data);
           
-          if (message.type === 'slots_update' && message.data) {
+          if (message.type === 'slots_snapshot' && message.data) {
+            slotsVersion.current = message.version ?? null;
             setSlotsData(message.data);
+          } else if (message.type === 'slot_changed' && message.slot && message.version !== undefined) {
+            const current = slotsVersion.current;
+            if (current !== null && message.version <= current) {
+              return; // Already applied
+            }
+            if (current === null || message.version !== current + 1) {
+              // Missed an update; ask the server to fill the gap
+              ws.current?.send(JSON.stringify({ type: 'resync', version: current ?? 0 }));
+              return;
+            }
+            const change = message.slot;
+            slotsVersion.current = message.version;
+            setSlotsData((prev) => (prev ? applySlotChange(prev, change) : prev));
+          } else if ((message.type === 'session' || message.type === 'my_slots') && message.my_slots) {
+            setMySlots(message.my_slots);
           } else if (message.type === 'booking_response' || message.type === 'cancellation_response') {
             // Handle booking/cancellation responses
             console.log(`${message.type}:`, message.message);
@@ -61,7 +105,7 @@ export const useWebSocket = () => {
       console.error('Failed to create WebSocket connection:', err);
       setError('Failed to connect');
     }
-  }, []);
+  }, [ensureSession]);
 
   const disconnect = useCallback(() => {
     if (reconnectTimeoutRef.current) {
@@ -75,32 +119,24 @@ export const useWebSocket = () => {
   }, []);
 
   const bookSlot = useCallback((slotId: number) => {
-    const token = localStorage.getItem('auth_token');
-    const email = localStorage.getItem('user_email') || undefined;
-    if (ws.current && ws.current.readyState === WebSocket.OPEN && token) {
+    if (ensureSession()) {
       const message: WebSocketMessage = {
         type: 'book_slot',
         slot_id: slotId,
-        token,
-        email,
       };
-      ws.current.send(JSON.stringify(message));
+      ws.current?.send(JSON.stringify(message));
     }
-  }, []);
+  }, [ensureSession]);
 
   const cancelSlot = useCallback((slotId: number) => {
-    const token = localStorage.getItem('auth_token');
-    const email = localStorage.getItem('user_email') || undefined;
-    if (ws.current && ws.current.readyState === WebSocket.OPEN && token) {
+    if (ensureSession()) {
       const message: WebSocketMessage = {
         type: 'cancel_slot',
         slot_id: slotId,
-        token,
-        email,
       };
-      ws.current.send(JSON.stringify(message));
+      ws.current?.send(JSON.stringify(message));
     }
-  }, []);
+  }, [ensureSession]);
 
   const refreshSlots = useCallback(() => {
     if (ws.current && ws.current.readyState === WebSocket.OPEN) {
@@ -121,6 +157,7 @@ export const useWebSocket = () => {
 
   return {
     slotsData,
+    mySlots,
     isConnected,
     error,
     bookSlot,
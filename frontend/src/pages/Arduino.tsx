@@ -60,6 +60,10 @@ void loop() {
   const [isResizing, setIsResizing] = useState(false);
   
   const wsRef = useRef<WebSocket | null>(null);
+  
+  const serialOffsetRef = useRef(0);
+  // Artifacts from the last successful compile, reused by upload while the code is unchanged
+  const compiledRef = useRef<{ code: string; artifacts: Record<string, string> } | null>(null);
   const serialOutputRef = useRef<HTMLDivElement>(null);
   const containerRef = useRef<HTMLDivElement>(null);
 
@@ -170,15 +174,17 @@ void loop() {
         headers: {
           'Content-Type': 'application/json',
         },
-        body: JSON.stringify({ code }),
+        // Compile for every connected board model at once so each has an artifact ready to flash
+        body: JSON.stringify({ code, mode: 'parallel', connected_only: devices.length > 0 }),
       });
 
       const data = await response.json();
 
       if (response.ok && data.success) {
+        compiledRef.current = { code, artifacts: data.artifacts || {} };
         setSuccess('Code compiled successfully!');
       } else {
-        setError(data.message || 'Compilation failed');
+        setError(data.message || data.detail || 'Compilation failed');
       }
     } catch (err) {
       setError('Error connecting to server');
@@ -204,6 +210,10 @@ void loop() {
 
     try {
       const token = localStorage.getItem('auth_token');
+      const device = devices.find((d) => d.id.toString() === selectedDevice);
+      const artifactId = compiledRef.current?.code === code && device
+        ? compiledRef.current.artifacts[device.model]
+        : undefined;
 
       const response = await fetch(`${BACKEND_URL}/devices/upload/${selectedDevice}`, {
         method: 'POST',
@@ -211,10 +221,8 @@ void loop() {
           'Content-Type': 'application/json',
           'Authorization': `Bearer ${token}`,
         },
-        body: JSON.stringify({ 
-          code,
-          // body does not need credentials
-        }),
+        // Flash the already compiled artifact when possible; body does not need credentials
+        body: JSON.stringify(artifactId ? { artifact_id: artifactId } : { code }),
       });
 
       const data = await response.json();
@@ -255,6 +263,7 @@ void loop() {
       console.log('WebSocket connected for serial reading');
       setIsReadingSerial(true);
       setSerialOutput([]);
+      serialOffsetRef.current = 0;
       
       // Send authentication
   ws.send(JSON.stringify({ token }));
@@ -275,6 +284,13 @@ void loop() {
         }
         
         if (data.type === 'serial_output') {
+          // Output is streamed incrementally; skip chunks already covered by the backlog
+          if (typeof data.end_offset === 'number') {
+            if (data.end_offset <= serialOffsetRef.current) {
+              return;
+            }
+            serialOffsetRef.current = data.end_offset;
+          }
           const timestamp = new Date().toLocaleTimeString();
           if (data.output && data.output.trim()) {
             setSerialOutput(prev => [...prev, {
@@ -413,8 +429,8 @@ void loop() {
                 onChange={handleDeviceChange}
               >
                 {devices.map((device) => (
-                  <MenuItem key={devices.indexOf(device)} value={devices.indexOf(device).toString()}>
-                    Device {device.model} - {device.port}
+                  <MenuItem key={device.id} value={device.id.toString()}>
+                    {device.alias || `Device ${device.model}`} - {device.port}
                   </MenuItem>
                 ))}
               </Select>
@@ -3,7 +3,9 @@ export interface User {
 }
 
 export interface Device {
-  serial_number: number;
+  id: number;
+  alias: string | null;
+  serial_number: string | null;
   port: string;
   model: string;
 }
@@ -17,6 +19,13 @@ export interface Slot {
   booked_at: string | null;
 }
 
+export interface SlotChange {
+  id: number;
+  is_booked: boolean;
+  booked_by: string | null;
+  booked_at: string | null;
+}
+
 export interface SlotsData {
   slots: Slot[];
   available_slots: number[];
@@ -46,11 +55,15 @@ export interface CancellationRequest {
 }
 
 export interface WebSocketMessage {
-  type: 'book_slot' | 'cancel_slot' | 'get_slots' | 'slots_update' | 'booking_response' | 'cancellation_response' | 'error';
+  type: 'authenticate' | 'book_slot' | 'cancel_slot' | 'get_slots' | 'resync' | 'session' | 'my_slots' | 'slots_snapshot' | 'slot_changed' | 'booking_response' | 'cancellation_response' | 'error';
   slot_id?: number;
   email?: string;
   token?: string;
+  my_slots?: number[];
+  version?: number;
   data?: SlotsData;
+  slot?: SlotChange;
+  outcome?: string;
   success?: boolean;
   message?: string;
   timestamp?: string;